@@ -0,0 +1,90 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+"""
+Throughput of the CRAN provider against a local MRAN stand-in.
+
+Usage: PYTHONPATH=. python benchmarks/bench_cran.py [PACKAGES] [SNAPSHOTS]
+
+PACKAGES packages (2000 by default) are written in the latest of
+SNAPSHOTS snapshot dates (200 by default), served by a SnapshotServer.
+No Internet access is needed.
+"""
+
+import sys
+import time
+import shutil
+import logging
+import datetime
+import tempfile
+
+from rpackutils.providers.cran import CRAN
+from tests.snapshotserver import SnapshotServer
+
+PROCS = 10
+
+
+def create_fixtures(root, numpackages, numsnapshots):
+    packages = [{'Package': 'package{0}'.format(i),
+                 'Version': '1.{0}-{1}'.format(i % 13, i % 7),
+                 'Imports': 'package{0}'.format(i // 2),
+                 'License': 'GPL-3'}
+                for i in range(0, numpackages)]
+    first = datetime.date(2015, 1, 1)
+    dates = [str(first + datetime.timedelta(days=i))
+             for i in range(0, numsnapshots)]
+    for i, date in enumerate(dates[:-1]):
+        rversion = '3.{0}.0'.format(i * 5 // numsnapshots)
+        SnapshotServer.add_snapshot(root, date, rversion, [])
+    SnapshotServer.add_snapshot(root, dates[-1], '3.5.0', packages)
+    return dates[-1], [x['Package'] for x in packages]
+
+
+def timed(label, fn, count):
+    starttime = time.time()
+    fn()
+    elapsed = time.time() - starttime
+    print('{0:<32} {1:8.3f} s {2:10.1f} /s'
+          .format(label, elapsed, count / elapsed))
+
+
+def main():
+    numpackages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    numsnapshots = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    logging.basicConfig(level=logging.WARNING)
+    root = tempfile.mkdtemp()
+    dest = tempfile.mkdtemp()
+    date, names = create_fixtures(root, numpackages, numsnapshots)
+    with SnapshotServer(root) as server:
+        for usepackagesindex in [True, False]:
+            print('--- packages index: {0}'.format(usepackagesindex))
+            cran = CRAN(baseurl=server.baseurl, cachedir=None,
+                        usepackagesindex=usepackagesindex)
+            timed('ls', lambda: cran.ls(date), 1)
+            timed('find x{0}'.format(len(names)),
+                  lambda: [cran.find('{0}_*.tar.gz'.format(x), date)
+                           for x in names],
+                  len(names))
+            timed('download_multiple x{0}'.format(len(names)),
+                  lambda: cran.download_multiple(date, names, dest, PROCS),
+                  len(names))
+            shutil.rmtree(dest)
+            dest = tempfile.mkdtemp()
+            timed('download_tarballs x{0}'.format(len(names)),
+                  lambda: cran.download_tarballs(date, cran.ls(date), dest,
+                                                 PROCS),
+                  len(names))
+            shutil.rmtree(dest)
+            dest = tempfile.mkdtemp()
+        timed('ls_snapshots x{0}'.format(numsnapshots),
+              lambda: cran.ls_snapshots(PROCS), numsnapshots)
+        timed('bisect_snapshots',
+              lambda: cran.bisect_snapshots('3.2.0'), 1)
+    shutil.rmtree(dest)
+    shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+"""
+Time the extraction of the links of a CRAN directory page.
+
+Usage: PYTHONPATH=. python benchmarks/bench_htmllinks.py [PAGE]
+
+PAGE is a saved directory page, like the one of
+https://mran.revolutionanalytics.com/snapshot/2019-01-01/src/contrib/
+A page of 15000 packages is generated if none is given.
+"""
+
+import sys
+import timeit
+
+from rpackutils.htmllinks import HtmlLinks
+
+REPEAT = 5
+
+
+def generate_page(numpackages=15000):
+    lines = ['<html>',
+             '<head><title>Index of /src/contrib/</title></head>',
+             '<body><h1>Index of /src/contrib/</h1><hr><pre>',
+             '<a href="../">../</a>']
+    for i in range(0, numpackages):
+        tarball = 'package{0}_1.{1}-{2}.tar.gz'.format(i, i % 13, i % 7)
+        lines.append('<a href="{0}">{0}</a>{1}01-Jan-2019 02:46 {2:>8}'
+                     .format(tarball, ' ' * (50 - len(tarball)), 1000 + i))
+    lines.append('</pre><hr></body>')
+    lines.append('</html>')
+    return '\n'.join(lines)
+
+
+def bs4_hrefs(page):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(page, 'html.parser')
+    return [str(anchor['href']) for anchor in soup.find_all('a')]
+
+
+def best(fn, page):
+    return min(timeit.repeat(lambda: fn(page), number=1, repeat=REPEAT))
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'r', errors='ignore') as f:
+            page = f.read()
+    else:
+        page = generate_page()
+    hrefs = HtmlLinks.hrefs(page)
+    print('{0} links in a page of {1} bytes'.format(len(hrefs), len(page)))
+    regex = best(HtmlLinks.hrefs, page)
+    print('HtmlLinks.hrefs          {0:8.4f} s'.format(regex))
+    try:
+        import bs4  # noqa: F401
+    except ImportError:
+        print('BeautifulSoup is not installed, skipping the comparison')
+        return
+    assert(bs4_hrefs(page) == hrefs)
+    soup = best(bs4_hrefs, page)
+    print('BeautifulSoup html.parser {0:8.4f} s'.format(soup))
+    print('speedup                  {0:8.1f} x'.format(soup / regex))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# consecutive failed requests opening the circuit
+FAILURE_THRESHOLD = 3
+# seconds before a server known to be down is probed again
+OPEN_TTL_SEC = 30
+
+
+class CircuitBreaker(object):
+    """
+    Health of a server shared by all the requests sent to it.
+
+    The circuit is closed while the requests succeed: no connection
+    check is needed, the outcome of the real requests is recorded
+    instead. It opens after a number of consecutive failures, the
+    server is then considered down and a single probe is allowed every
+    ttl seconds until a request succeeds again.
+    """
+
+    def __init__(self, name, threshold=FAILURE_THRESHOLD, ttl=OPEN_TTL_SEC):
+        """
+        :param name: name of the server, for the log messages
+        :param threshold: number of consecutive failures opening the
+            circuit
+        :param ttl: number of seconds the circuit stays open before a
+            probe is allowed
+        """
+        self.name = name
+        self.threshold = threshold
+        self.ttl = ttl
+        self.failures = 0
+        self._openedat = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._openedat is not None
+
+    def record_success(self):
+        with self._lock:
+            if self._openedat is not None:
+                logger.info('Connection to {} restored.'.format(self.name))
+            self.failures = 0
+            self._openedat = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self._openedat is None:
+                    logger.error('{} consecutive failures, {} is '
+                                 'considered down.'
+                                 .format(self.failures, self.name))
+                # wait another ttl before the next probe
+                self._openedat = time.monotonic()
+
+    def probe_due(self):
+        """
+        True if the circuit is open for more than ttl seconds, the
+        caller should then probe the server. The next probe is only due
+        ttl seconds later, whatever the outcome of this one.
+        """
+        with self._lock:
+            if self._openedat is None:
+                return False
+            if time.monotonic() - self._openedat < self.ttl:
+                return False
+            self._openedat = time.monotonic()
+            return True
@@ -10,6 +10,7 @@ import time
 from ..config import Config
 from ..depsmanager import DepsManager
 from ..depsmanager import PackNode
+from ..packinfo import PackStatus
 from ..reposconfig import ReposConfig
 
 # logging.basicConfig(format='[%(levelname)s] %(message)s', level=logging.INFO)
@@ -55,6 +56,15 @@ def rpacks_clone():
         help=('Overwrite already installed packages. '
               'By default, nothing gets overwritten.'),
     ) and None
+    parser.add_argument(
+        '--procs',
+        dest='procs',
+        action='store',
+        default='1',
+        type=int,
+        help=('Number of concurrent installations, each one in its '
+              'own staging library, default=1'),
+    ) and None
     parser.add_argument(
         '--config',
         dest='config',
@@ -110,16 +120,41 @@ def rpacks_clone():
         logger.info('Nothing to do! Could not find any none-base package '
                     'installed on the input R environment.')
         exit(-1)
-    dm = DepsManager(
-        repo,
-        renvoutput.install,
-        {'overwrite': overwrite}
-    )
-    for packagename in packagenames:
-        n = PackNode(packagename)
-        dm.processnode(n)
+    if args.procs > 1:
+        # resolve all dependencies first, then install concurrently
+        packnodes = []
+        dm = DepsManager(repo, packnodes.append, keeptempfiles=True)
+        for packagename in packagenames:
+            n = PackNode(packagename)
+            dm.processnode(n)
+        try:
+            statuses = renvoutput.install_multiple(packnodes,
+                                                   overwrite,
+                                                   None, args.procs)
+        finally:
+            dm.cleanup()
+        installfailed = [n.idt for n, status
+                         in zip(packnodes, statuses)
+                         if status == PackStatus.DEPLOY_FAILED]
+    else:
+        installfailed = []
+
+        def install(node, **kwargs):
+            status = renvoutput.install(node, **kwargs)
+            if status == PackStatus.DEPLOY_FAILED:
+                installfailed.append(node.idt)
+            return status
+
+        dm = DepsManager(
+            repo,
+            install,
+            {'overwrite': overwrite}
+        )
+        for packagename in packagenames:
+            n = PackNode(packagename)
+            dm.processnode(n)
     logger.info("============================================================")
-    if dm.errors:
+    if dm.errors or installfailed:
         logger.error('Some error(s) occured.')
         if dm.notfound:
             logger.error('Some packages were not found: {}'
@@ -127,11 +162,17 @@ def rpacks_clone():
         if dm.downloadfailed:
             logger.error('Some packages could not be downloaded: {}'
                          .format(str(dm.downloadfailed)))
+        if installfailed:
+            logger.error('Some packages could not be installed: {}'
+                         .format(str(installfailed)))
     logger.info('Packages: {} processed | {} errors '
-                '({} not found, {} download failed)'
+                '({} not found, {} download failed, {} install failed)'
                 .format(len(dm.processed),
-                        len(dm.errors),
+                        len(dm.errors) + len(installfailed),
                         len(dm.notfound),
-                        len(dm.downloadfailed)))
+                        len(dm.downloadfailed),
+                        len(installfailed)))
     endtime = time.time()
     logger.info('Time elapsed: {0:.3f} seconds.'.format(endtime - starttime))
+    if dm.errors or installfailed:
+        exit(-1)
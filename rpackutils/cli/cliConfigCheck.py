@@ -37,5 +37,10 @@ def rpacks_config_check():
     reposConfig = ReposConfig(config)
     # get all repository instances
     reposConfig.repository_instances
+    # the CRAN-like repositories are only reached when used
+    for name in reposConfig.cranlike_instances:
+        if not reposConfig.cranlike_instance(name).check_connection():
+            logger.error('Cannot read the packages index of the '
+                         'CRAN-like repository \"{0}\"'.format(name))
     endtime = time.time()
     logger.info('Time elapsed: {0:.3f} seconds.'.format(endtime - starttime))
@@ -14,6 +14,7 @@ from ..config import Config
 from ..providers.artifactory import Artifactory
 from ..providers.bioconductor import Bioconductor
 from ..providers.cran import CRAN
+from ..providers.cran import CRAN_CACHE_DIR
 from ..providers.localrepository import LocalRepository
 from ..providers.renvironment import REnvironment
 from ..reposconfig import ReposConfig
@@ -99,7 +100,7 @@ def rpacks_deps_graph():
     out = args.out
     starttime = time.time()
     if repo == 'cran':
-        repository = CRAN()
+        repository = CRAN(cachedir=CRAN_CACHE_DIR)
         if args.config is not None:
             logger.warning('Ignoring the --conf argument '
                            'since CRAN will be used.')
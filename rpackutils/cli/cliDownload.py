@@ -12,6 +12,7 @@ from ..config import Config
 from ..depsmanager import DepsManager
 from ..depsmanager import PackNode
 from ..reposconfig import ReposConfig
+from ..providers.renvironment import DRYRUN_FORMATS
 
 # logging.basicConfig(format='[%(levelname)s] %(message)s', level=logging.INFO)
 logging.basicConfig(format='%(message)s', level=logging.INFO)
@@ -75,6 +76,18 @@ def rpacks_download():
               'that are already installed. '
               'By default, nothing gets overwritten.'),
     ) and None
+    parser.add_argument(
+        '--format',
+        dest='outputformat',
+        action='store',
+        default='script',
+        choices=DRYRUN_FORMATS,
+        required=False,
+        help=('Format of the installation instructions written to the '
+              'destination folder: \"script\" for a sequential install.sh '
+              'or \"makefile\" for a Makefile to run with \"make -j N\", '
+              'default=script'),
+    ) and None
     parser.add_argument(
         '--config',
         dest='config',
@@ -132,7 +145,8 @@ def rpacks_download():
         repo,
         renv.install_dryrun,
         {'dest': dest, 'overwrite': overwrite,
-         'overwritepackages': overwritepackages}
+         'overwritepackages': overwritepackages,
+         'outputformat': args.outputformat}
     )
     for package in packages:
         n = PackNode(package)
@@ -10,6 +10,7 @@ import time
 from ..config import Config
 from ..depsmanager import DepsManager
 from ..depsmanager import PackNode
+from ..packinfo import PackStatus
 from ..reposconfig import ReposConfig
 
 # logging.basicConfig(format='[%(levelname)s] %(message)s', level=logging.INFO)
@@ -64,6 +65,15 @@ def rpacks_install():
               'that are already installed. '
               'By default, nothing gets overwritten.'),
     ) and None
+    parser.add_argument(
+        '--procs',
+        dest='procs',
+        action='store',
+        default='1',
+        type=int,
+        help=('Number of concurrent installations, each one in its '
+              'own staging library, default=1'),
+    ) and None
     parser.add_argument(
         '--config',
         dest='config',
@@ -110,17 +120,42 @@ def rpacks_install():
                 .format(renv.name, renv.baseurl))
     logger.info('Using the package repository: {} at {} with folders: {}'
                 .format(repo.name, repo.baseurl, ",".join(repo.repos)))
-    dm = DepsManager(
-        repo,
-        renv.install,
-        {'overwrite': overwrite,
-         'overwritepackages': overwritepackages}
-    )
-    for package in packages:
-        n = PackNode(package)
-        dm.processnode(n)
+    if args.procs > 1:
+        # resolve all dependencies first, then install concurrently
+        packnodes = []
+        dm = DepsManager(repo, packnodes.append, keeptempfiles=True)
+        for package in packages:
+            n = PackNode(package)
+            dm.processnode(n)
+        try:
+            statuses = renv.install_multiple(packnodes, overwrite,
+                                             overwritepackages,
+                                             args.procs)
+        finally:
+            dm.cleanup()
+        installfailed = [n.idt for n, status
+                         in zip(packnodes, statuses)
+                         if status == PackStatus.DEPLOY_FAILED]
+    else:
+        installfailed = []
+
+        def install(node, **kwargs):
+            status = renv.install(node, **kwargs)
+            if status == PackStatus.DEPLOY_FAILED:
+                installfailed.append(node.idt)
+            return status
+
+        dm = DepsManager(
+            repo,
+            install,
+            {'overwrite': overwrite,
+             'overwritepackages': overwritepackages}
+        )
+        for package in packages:
+            n = PackNode(package)
+            dm.processnode(n)
     logger.info("============================================================")
-    if dm.errors:
+    if dm.errors or installfailed:
         logger.error('Some error(s) occured.')
         if dm.notfound:
             logger.error('Some packages were not found: {}'
@@ -128,11 +163,17 @@ def rpacks_install():
         if dm.downloadfailed:
             logger.error('Some packages could not be downloaded: {}'
                          .format(str(dm.downloadfailed)))
+        if installfailed:
+            logger.error('Some packages could not be installed: {}'
+                         .format(str(installfailed)))
     logger.info('Packages: {} processed | {} errors '
-                '({} not found, {} download failed)'
+                '({} not found, {} download failed, {} install failed)'
                 .format(len(dm.processed),
-                        len(dm.errors),
+                        len(dm.errors) + len(installfailed),
                         len(dm.notfound),
-                        len(dm.downloadfailed)))
+                        len(dm.downloadfailed),
+                        len(installfailed)))
     endtime = time.time()
     logger.info('Time elapsed: {0:.3f} seconds.'.format(endtime - starttime))
+    if dm.errors or installfailed:
+        exit(-1)
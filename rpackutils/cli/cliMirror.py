@@ -17,8 +17,11 @@ from ..providers.artifactory import Artifactory
 from ..providers.bioconductor import Bioconductor
 from ..providers.localrepository import LocalRepository
 from ..providers.cran import CRAN
+from ..providers.cran import CRAN_CACHE_DIR
+from ..providers.cranlike import CRANLike
 from ..reposconfig import ReposConfig
 from ..utils import Utils
+from .. import transfer
 
 # logging.basicConfig(format='[%(levelname)s] %(message)s', level=logging.INFO)
 logging.basicConfig(format='%(message)s', level=logging.INFO)
@@ -37,7 +40,7 @@ def rpacks_mirror():
         default='',
         help=('The type of public R repository to mirror, '
               'possible values: \"cran\", \"bioc\" '
-              'or the name of a Local repository')
+              'or the name of a Local or CRAN-like repository')
     ) and None
     parser.add_argument(
         '--inputrepoparam',
@@ -47,6 +50,25 @@ def rpacks_mirror():
         required=False,
         help='The release of Bioconductor or the snapshot date of CRAN'
     ) and None
+    parser.add_argument(
+        '--since',
+        dest='since',
+        action='store',
+        default=None,
+        required=False,
+        help=('When mirroring CRAN only: the snapshot date already '
+              'mirrored, only the packages added or changed since are '
+              'transferred')
+    ) and None
+    parser.add_argument(
+        '--report-removed',
+        dest='reportremoved',
+        action='store_true',
+        default=False,
+        required=False,
+        help=('When mirroring CRAN with --since: list the packages '
+              'removed since that snapshot')
+    ) and None
     parser.add_argument(
         '--biocview',
         dest='biocview',
@@ -90,6 +112,15 @@ def rpacks_mirror():
         required=False,
         help=('Keep downloaded files'),
     ) and None
+    parser.add_argument(
+        '--overwrite',
+        dest='overwrite',
+        action='store_true',
+        default=False,
+        required=False,
+        help=('Overwrite the packages already deployed with another '
+              'content. By default, they are kept.'),
+    ) and None
     parser.add_argument(
         '--procs',
         dest='procs',
@@ -98,6 +129,23 @@ def rpacks_mirror():
         type=int,
         help='Number of parallel downloads and uploads, default=10',
     ) and None
+    parser.add_argument(
+        '--host-limit',
+        dest='hostlimit',
+        action='store',
+        default=None,
+        type=int,
+        help='Maximum number of parallel transfers per host, default=procs',
+    ) and None
+    parser.add_argument(
+        '--bandwidth',
+        dest='bandwidth',
+        action='store',
+        default=None,
+        type=int,
+        help=('Maximum bandwidth used by all the transfers in KB/s, '
+              'unlimited by default'),
+    ) and None
     parser.add_argument(
         '--config',
         dest='config',
@@ -110,6 +158,9 @@ def rpacks_mirror():
     if args.inputrepo in ['cran', 'bioc'] and not args.inputrepoparam:
         logger.error('Version or snapshot date not provided')
         sys.exit(-1)
+    if args.since and args.inputrepo != 'cran':
+        logger.error('The --since parameter only applies to CRAN')
+        sys.exit(-1)
     if not args.outputrepo:
         logger.error('Output Repository not provided')
         sys.exit(-1)
@@ -144,20 +195,46 @@ def rpacks_mirror():
     logger.info('I will use {0} parallel processes for '
                 'parsing, downloads and uploads.'
                 .format(procs))
+    # one connection per parallel upload
+    repository.poolsize = procs
+    transfer.configure(workers=procs,
+                       hostlimit=args.hostlimit,
+                       bandwidth=args.bandwidth * 1024
+                       if args.bandwidth else None)
     mirror = None
     # lsargs = None
     # packinfoargs = None
     filepaths = []
+    # packages replaced even without --overwrite
+    overwritepackages = None
     if args.inputrepo == "cran":
-        mirror = CRAN()
+        mirror = CRAN(cachedir=CRAN_CACHE_DIR)
         snapshot_date = args.inputrepoparam
         # get the list of packages
-        packagenames = mirror.ls(snapshot_date, packagenamesonly=True)
-        # download them all
-        statusDownloads = mirror.download_multiple(snapshot_date,
-                                                   packagenames,
+        if args.since:
+            tarballs, removed = mirror.delta(args.since, snapshot_date)
+            if args.reportremoved:
+                for tarball in removed:
+                    logger.info('Removed since {0}: {1}'
+                                .format(args.since, tarball))
+        else:
+            tarballs = mirror.ls(snapshot_date)
+        # download them all, straight from the listed tarballs
+        statusDownloads = mirror.download_tarballs(snapshot_date,
+                                                   tarballs,
                                                    dest, procs)
-        filepaths = glob.glob(os.path.join(dest, '*.tar.gz'))
+        if args.since:
+            # only the delta, whatever the content of dest
+            filepaths = [os.path.join(dest, x) for x in tarballs
+                         if os.path.exists(os.path.join(dest, x))]
+            if not tarballs:
+                logger.info('No package added or changed since {0}.'
+                            .format(args.since))
+            # a changed package keeps its tarball name, the deployed
+            # one with the previous content has to be replaced
+            overwritepackages = [x.split('_')[0] for x in tarballs]
+        else:
+            filepaths = glob.glob(os.path.join(dest, '*.tar.gz'))
     if args.inputrepo == 'bioc':
         mirror = Bioconductor()
         bioc_release = args.inputrepoparam
@@ -188,21 +265,29 @@ def rpacks_mirror():
         if inputrepository is None:
             logger.error('Exiting due to previous error.')
             exit(-1)
-        if not isinstance(inputrepository, LocalRepository):
+        if isinstance(inputrepository, CRANLike):
+            # the tarballs listed in the packages indexes
+            inputrepository.download_multiple(inputrepository.ls(),
+                                              dest, procs)
+            filepaths = glob.glob(os.path.join(dest, '*.tar.gz'))
+        elif isinstance(inputrepository, LocalRepository):
+            ifiles = inputrepository.ls()
+            ibaseurl = inputrepository.baseurl
+            filepaths = [Utils.concatpaths(ibaseurl, f) for f in ifiles]
+        else:
             logger.error('The input repository \"{}\" '
-                         'is not a LocalRepository one.'
-                         .format(repository.name))
+                         'is not a LocalRepository or CRANLike one.'
+                         .format(inputrepository.name))
             exit(-1)
-        ifiles = inputrepository.ls()
-        ibaseurl = inputrepository.baseurl
-        filepaths = [Utils.concatpaths(ibaseurl, f) for f in ifiles]
     if filepaths:
         # upload them to the output repository (Artifactory)
         logger.info('Preparing to upload {} packages '
                     'to the output repository '
                     '{} ...'.format(len(filepaths), repository.name))
-        repository.upload_multiple(filepaths, args.outputrepofolder, procs)
-    else:
+        repository.upload_multiple(filepaths, args.outputrepofolder, procs,
+                                   overwrite=args.overwrite,
+                                   overwritepackages=overwritepackages)
+    elif not args.since:
         logger.error('No package found in the '
                      '{} repository.'.format(args.inputrepo))
     if args.keep:
@@ -9,6 +9,8 @@ import time
 
 from ..json_serializer import JSONSerializer
 from ..providers.cran import CRAN
+from ..snapshotdb import SnapshotDB
+from ..snapshotdb import SNAPSHOT_DB_PATH
 
 # logging.basicConfig(format='[%(levelname)s] %(message)s', level=logging.INFO)
 logging.basicConfig(format='%(message)s', level=logging.INFO)
@@ -49,20 +51,94 @@ def rpacks_mran():
         default=None,
         help='a file where to read the results from',
     ) and None
+    parser.add_argument(
+        '--db',
+        dest='dbfilepath',
+        action='store',
+        default=SNAPSHOT_DB_PATH,
+        help=('The database recording the R version of the snapshots, '
+              'only the snapshots it does not know are fetched, '
+              'default={0}'.format(SNAPSHOT_DB_PATH)),
+    ) and None
+    parser.add_argument(
+        '--nodb',
+        dest='nodb',
+        action='store_true',
+        default=False,
+        required=False,
+        help='Fetch all the snapshots without using the database',
+    ) and None
+    parser.add_argument(
+        '--offline',
+        dest='offline',
+        action='store_true',
+        default=False,
+        required=False,
+        help=('Query the database without fetching '
+              'the new snapshots'),
+    ) and None
+    parser.add_argument(
+        '--from',
+        dest='fromdate',
+        action='store',
+        default=None,
+        help='Only list the snapshots from this date, as "YYYY-MM-DD"',
+    ) and None
+    parser.add_argument(
+        '--to',
+        dest='todate',
+        action='store',
+        default=None,
+        help='Only list the snapshots until this date, as "YYYY-MM-DD"',
+    ) and None
+    parser.add_argument(
+        '--bisect',
+        dest='bisect',
+        action='store_true',
+        default=False,
+        required=False,
+        help=('Search the first and last snapshots of the R version '
+              'given by --Rversion instead of fetching all the snapshots'),
+    ) and None
     args = parser.parse_args()
     if args.dumpfilepath is not None and args.restorefromfilepath is not None:
         logger.error("Please choose either dump or restore, "
                      "they are exclusive!")
         exit(-1)
+    if args.nodb and args.offline:
+        logger.error("The --offline query needs the database, "
+                     "please remove --nodb!")
+        exit(-1)
+    if args.bisect and args.rversion is None:
+        logger.error("The --bisect search needs an R version, "
+                     "please provide --Rversion!")
+        exit(-1)
     snapshots = None
     starttime = time.time()
     if args.restorefromfilepath is None:
-        logger.info("I will use {0} parallel processes to parse "
-                    "the R version from snapshots dates."
-                    .format(args.procs))
-        logger.info("Fetching available MRAN snapshots from the Internet...")
-        cran = CRAN()
-        snapshots = cran.ls_snapshots(args.procs, args.rversion)
+        db = None if args.nodb else SnapshotDB(args.dbfilepath)
+        if args.offline:
+            logger.info("Reading available MRAN snapshots "
+                        "from {0}...".format(args.dbfilepath))
+            snapshots = db.versions(args.rversion,
+                                    args.fromdate,
+                                    args.todate)
+        else:
+            logger.info("I will use {0} parallel processes to parse "
+                        "the R version from snapshots dates."
+                        .format(args.procs))
+            logger.info("Fetching available MRAN snapshots "
+                        "from the Internet...")
+            cran = CRAN()
+            if args.bisect:
+                snapshots = cran.bisect_snapshots(args.rversion, db,
+                                                  args.fromdate,
+                                                  args.todate)
+            else:
+                snapshots = cran.ls_snapshots(args.procs, args.rversion, db,
+                                              args.fromdate, args.todate)
+        if db is not None:
+            db.close()
     else:
         if args.rversion is not None:
             logger.warning('Ignoring the --Rversion parameter '
@@ -8,58 +8,154 @@ import signal
 import logging
 import subprocess
 import threading
+from collections import deque
 
 logger = logging.getLogger(__name__)
 
+# number of trailing lines kept in memory for each stream
+TAIL_LINES = 100
+# maximum number of lines matching a marker kept in memory
+MAX_MATCHES = 50
+# delay granted to the process group to exit after SIGTERM
+KILL_GRACE_SEC = 10
+
 
 class Command(object):
     """
     Create subprocess with timeout support.
+
+    The standard output and error are read line by line, written to an
+    optional log file and scanned for failure markers as they arrive.
+    Only the lines matching a marker and the last lines of each stream
+    are kept in memory.
     """
 
-    def __init__(self, cmd):
+    def __init__(self, cmd, logfile=None, markers=None, env=None,
+                 taillines=TAIL_LINES):
+        """
+        :param cmd: the command as a list of arguments
+        :param logfile: path of the file where to write the whole output
+        :param markers: list of strings denoting a failure
+        :param env: environment variables of the process
+        :param taillines: number of trailing lines to keep per stream
+        """
         self.cmd = cmd
+        self.logfile = logfile
+        self.markers = markers if markers else []
+        self.env = env
         self.process = None
         self.stdout = None
         self.stderr = None
         self.returncode = None
+        self.timedout = False
+        self._tails = {'stdout': deque(maxlen=taillines),
+                       'stderr': deque(maxlen=taillines)}
+        self._matches = {'stdout': [], 'stderr': []}
+        self._lock = threading.Lock()
+
+    @property
+    def matches(self):
+        """
+        Lines matching a failure marker as a list of (stream, line).
+        """
+        return [(stream, line)
+                for stream in ['stdout', 'stderr']
+                for line in self._matches[stream]]
 
-    def kill(self, signal=signal.SIGINT):
+    def kill(self, signal=signal.SIGTERM):
+        """
+        Kill the running process and all its children
+        :param signal: os.signal, default=os.signal.SIGTERM
         """
-        Kill the runnin process
-        :param signal: os.signal, default=os.signal.SIGINT
+        try:
+            os.killpg(os.getpgid(self.process.pid), signal)
+        except ProcessLookupError:
+            pass
+
+    def _consume(self, stream, name, logf):
+        for rawline in iter(stream.readline, b''):
+            line = rawline.decode('utf-8', errors='replace').rstrip('\n')
+            with self._lock:
+                if logf and not logf.closed:
+                    logf.write(line + '\n')
+                self._tails[name].append(line)
+                if len(self._matches[name]) < MAX_MATCHES:
+                    for marker in self.markers:
+                        if marker in line:
+                            logger.debug('Marker \"{}\" found on {}: {}'
+                                         .format(marker, name, line))
+                            self._matches[name].append(line)
+                            break
+        stream.close()
+
+    def _collect(self, name):
+        with self._lock:
+            lines = list(self._tails[name])
+            # keep the matching lines which are not part of the tail anymore
+            lines = [m for m in self._matches[name]
+                     if m not in lines] + lines
+        if not lines:
+            return None
+        return '\n'.join(lines)
+
+    def run(self, timeout=None):
         """
-        os.kill(self.process.pid, signal.SIGINT)
+        Run the command and wait for its completion.
 
-    def run(self, timeout):
-        def target():
+        :param timeout: seconds after which the process group is killed,
+                        None to wait forever
+        :return: (returncode, stdout, stderr)
+        """
+        logf = None
+        if self.logfile:
+            logf = open(self.logfile, 'w', encoding='utf-8')
+        try:
             self.process = subprocess.Popen(
                 self.cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                shell=False)
+                env=self.env,
+                shell=False,
+                start_new_session=True)
             logger.info('Waiting for process {} to complete...'
                         .format(self.process.pid))
-            for stdout_line in iter(self.process.stdout.readline, ""):
-                print(stdout_line)
-            self.process.stdout.close()
-            (self.stdout, self.stderr) = self.process.communicate()
-            # decode stdout and stderr
-            if(self.stdout):
-                self.stdout = self.stdout.decode()
-            if(self.stderr):
-                self.stderr = self.stderr.decode()
-            self.returncode = self.process.returncode
-        thread = threading.Thread(target=target)
-        thread.start()
-        thread.join(timeout)
-        if thread.is_alive():
-            logger.error('The process {} is taking too long, '
-                         'terminating it'
-                         .format(self.process.pid))
-            self.kill()
-            thread.join()
+            readers = [
+                threading.Thread(target=self._consume,
+                                 args=(self.process.stdout, 'stdout', logf)),
+                threading.Thread(target=self._consume,
+                                 args=(self.process.stderr, 'stderr', logf))
+            ]
+            for reader in readers:
+                reader.daemon = True
+                reader.start()
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                logger.error('The process {} is taking too long, '
+                             'terminating it'
+                             .format(self.process.pid))
+                self.timedout = True
+                self.kill(signal.SIGTERM)
+                try:
+                    self.process.wait(KILL_GRACE_SEC)
+                except subprocess.TimeoutExpired:
+                    self.kill(signal.SIGKILL)
+                    self.process.wait()
+            # a detached grandchild may keep the pipes open, do not
+            # wait for it forever
+            for reader in readers:
+                reader.join(KILL_GRACE_SEC)
+        finally:
+            if logf:
+                with self._lock:
+                    logf.close()
+        self.stdout = self._collect('stdout')
+        self.stderr = self._collect('stderr')
+        self.returncode = self.process.returncode
+        if self.timedout:
             self.returncode = -1
-            self.stderr = 'The process is taking too long, ' \
-                          'RPackUtils killed it!'
+            message = 'The process is taking too long, ' \
+                      'RPackUtils killed it!'
+            self.stderr = message if not self.stderr \
+                else '{}\n{}'.format(self.stderr, message)
         return (self.returncode, self.stdout, self.stderr)
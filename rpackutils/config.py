@@ -39,3 +39,14 @@ class Config:
     def getboolean(self, section, option):
         return self._environment_config.getboolean(
             section, option, fallback=False)
+
+    def getint(self, section, option, fallback=None):
+        return self._environment_config.getint(
+            section, option, fallback=fallback)
+
+    def getfloat(self, section, option, fallback=None):
+        return self._environment_config.getfloat(
+            section, option, fallback=fallback)
+
+    def has_option(self, section, option):
+        return self._environment_config.has_option(section, option)
@@ -26,6 +26,7 @@ from .provider import AbstractPackageRepository
 from .provider import AbstractREnvironment
 from .providers.artifactory import Artifactory
 from .providers.localrepository import LocalRepository
+from .providers.cranlike import CRANLike
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +38,8 @@ class PackNode(Node):
         self._status = None
         self._packurl = None
         self.reponame = None
+        self.packagepath = None
+        self.dependencies = []
 
     @property
     def packurl(self):
@@ -76,15 +79,25 @@ class PackNode(Node):
 
 
 class DepsManager(object):
-    def __init__(self, repo, fun=None, funargs=None):
+    def __init__(self, repo, fun=None, funargs=None, keeptempfiles=False):
+        """
+        :param repo: the repository where to get packages
+        :param fun: function called on each node once its
+                    dependencies are processed
+        :param funargs: dict of additional parameters for fun
+        :param keeptempfiles: keep the downloaded packages once fun is
+                              called, cleanup() removes them
+        """
         self._repo = repo
         self._processed = []
         self._notfound = []
         self._downloadfailed = []
         self._fun = fun
         self._funargs = funargs
-        assert self._repoIsSupported(), 'Only Artifactory ' \
-            'or LocalRepository instances are supported!'
+        self._keeptempfiles = keeptempfiles
+        self._tempdirs = []
+        assert self._repoIsSupported(), 'Only Artifactory, ' \
+            'LocalRepository or CRANLike instances are supported!'
 
     def _repoIsSupported(self):
         return(
@@ -93,6 +106,8 @@ class DepsManager(object):
                 isinstance(self._repo, Artifactory)
                 or
                 isinstance(self._repo, LocalRepository)
+                or
+                isinstance(self._repo, CRANLike)
             )
         )
 
@@ -134,8 +149,17 @@ class DepsManager(object):
            and os.path.exists(packinfo.tempdir):
             shutil.rmtree(packinfo.tempdir)
 
+    def cleanup(self):
+        """
+        Remove the downloaded packages kept while processing nodes.
+        """
+        for tempdir in self._tempdirs:
+            if os.path.exists(tempdir):
+                shutil.rmtree(tempdir)
+        self._tempdirs = []
+
     def processnode(self, node):
-        if node.idt in RBasePackages.getnames():
+        if RBasePackages.isbase(node.idt):
             logger.info(
                 'Package: {} is already installed '
                 '(part of the base packages)'
@@ -173,6 +197,7 @@ class DepsManager(object):
             node.version = packinfo.version
             node.packagepath = packinfo.packagepath
             deps = packinfo.dependencies(withBasePackages=False)
+            node.dependencies = deps
             for dep in deps:
                 depnode = PackNode(dep)
                 self.processnode(depnode)
@@ -181,6 +206,10 @@ class DepsManager(object):
                 self._fun(node, **self._funargs)
             else:
                 self._fun(node)
-            # we remove the temp files
-            self._removePackInfoTempDir(packinfo)
+            # we remove the temp files unless asked to keep them
+            if self._keeptempfiles:
+                if getattr(packinfo, 'tempdir', None):
+                    self._tempdirs.append(packinfo.tempdir)
+            else:
+                self._removePackInfoTempDir(packinfo)
             self._processed.append(node.idt)
@@ -0,0 +1,377 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import re
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from . import transfer
+
+logger = logging.getLogger(__name__)
+
+# first bytes of any gzip file, R package tarballs are gzipped
+GZIP_MAGIC = b'\x1f\x8b'
+# checksum headers sent by Artifactory along with the artifacts
+CHECKSUM_HEADERS = {'md5': 'X-Checksum-Md5',
+                    'sha1': 'X-Checksum-Sha1',
+                    'sha256': 'X-Checksum-Sha256'}
+# bounds of the read buffer, sized after the length of the download
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+# number of times an interrupted download is resumed
+RESUME_RETRIES = 5
+# files larger than this are downloaded in parallel ranged segments
+SEGMENT_THRESHOLD = 512 * 1024 * 1024
+SEGMENTS = 4
+
+
+class DownloadError(RuntimeError):
+    '''raise this when a downloaded file is invalid'''
+
+
+class DownloadSink(object):
+    """
+    Write a download to a partial file next to its target and move it
+    to the target only once it is complete and valid.
+
+    The checksums are computed while writing, the file is never read
+    again. A file not starting with the gzip magic bytes, like an error
+    page, a file whose size or checksums differ from the expected ones
+    never reaches the target path.
+    The partial file of an interrupted download is kept so that the
+    download can be resumed, even by a later run.
+    """
+
+    def __init__(self, targetpath, checksums=None, size=None,
+                 checkgzip=True):
+        """
+        :param targetpath: path of the downloaded file
+        :param checksums: expected checksums as {'md5': '...', ...}, the
+            'md5', 'sha1' and 'sha256' algorithms are supported
+        :param size: expected size in bytes
+        :param checkgzip: whether the file has to be a gzip file
+        """
+        self.targetpath = targetpath
+        self.checksums = {k: v.lower() for k, v in (checksums or {}).items()
+                          if v and k in CHECKSUM_HEADERS}
+        self.size = size
+        self.checkgzip = checkgzip
+        self.temppath = DownloadSink.partialpath(targetpath)
+        self._hashes = {k: hashlib.new(k) for k in self.checksums}
+        self._head = b''
+        self.written = 0
+        if os.path.exists(self.temppath):
+            # resume the download of a previous run, the content
+            # written so far is hashed once
+            with open(self.temppath, 'rb') as f:
+                for block in iter(lambda: f.read(MAX_CHUNK_SIZE), b''):
+                    self._update(block)
+        self._f = open(self.temppath, 'ab')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort(keep=not issubclass(exc_type, DownloadError))
+        return False
+
+    @staticmethod
+    def partialpath(targetpath):
+        """
+        Path of the partial file of a download.
+        """
+        return os.path.join(os.path.dirname(targetpath),
+                            '.{}.part'.format(os.path.basename(targetpath)))
+
+    @staticmethod
+    def chunk_size(size):
+        """
+        Read buffer size for a download of size bytes: large files are
+        read by large chunks, small ones do not hold much memory.
+        """
+        if not size:
+            return MIN_CHUNK_SIZE
+        return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, size // 64))
+
+    def _update(self, chunk):
+        if len(self._head) < len(GZIP_MAGIC):
+            self._head += chunk[:len(GZIP_MAGIC) - len(self._head)]
+        self.written += len(chunk)
+        for h in self._hashes.values():
+            h.update(chunk)
+
+    def write(self, chunk):
+        self._update(chunk)
+        if self.checkgzip and not GZIP_MAGIC.startswith(self._head):
+            raise DownloadError('{} is not a gzip file'
+                                .format(self.targetpath))
+        self._f.write(chunk)
+
+    def reset(self):
+        """
+        Drop the content written so far, the server sends the whole
+        file again.
+        """
+        self._f.seek(0)
+        self._f.truncate()
+        self._hashes = {k: hashlib.new(k) for k in self.checksums}
+        self._head = b''
+        self.written = 0
+
+    def consume(self, response):
+        """
+        Write the content of a response.
+        """
+        for chunk in response.iter_content(
+                chunk_size=DownloadSink.chunk_size(self.size)):
+            if chunk:  # filter out keep-alive new chunks
+                transfer.throttle(len(chunk))
+                self.write(chunk)
+
+    def verify(self):
+        """
+        Raise a DownloadError if the written content is not the
+        expected one.
+        """
+        if self.written == 0:
+            raise DownloadError('{} is empty'.format(self.targetpath))
+        if self.checkgzip and self._head != GZIP_MAGIC:
+            raise DownloadError('{} is not a gzip file'
+                                .format(self.targetpath))
+        if self.size is not None and self.written != self.size:
+            raise DownloadError('{} is incomplete: {} bytes out of {}'
+                                .format(self.targetpath,
+                                        self.written,
+                                        self.size))
+        for algorithm, expected in self.checksums.items():
+            actual = self._hashes[algorithm].hexdigest()
+            if actual != expected:
+                raise DownloadError('{} {} checksum {} does not match {}'
+                                    .format(self.targetpath,
+                                            algorithm,
+                                            actual,
+                                            expected))
+
+    def commit(self):
+        """
+        Verify the content and move it to the target path.
+        """
+        self._f.close()
+        try:
+            self.verify()
+        except Exception:
+            self.abort()
+            raise
+        os.replace(self.temppath, self.targetpath)
+
+    def abort(self, keep=False):
+        """
+        Stop writing, the partial file is removed unless keep is True.
+        """
+        self._f.close()
+        if keep:
+            logger.info('Keeping {} bytes of {} to resume the download'
+                        .format(self.written, self.targetpath))
+            return
+        try:
+            os.remove(self.temppath)
+        except OSError:
+            pass
+
+    @staticmethod
+    def header_checksums(headers):
+        """
+        Checksums announced in the headers of a response.
+        """
+        return {k: headers.get(v) for k, v in CHECKSUM_HEADERS.items()
+                if headers.get(v)}
+
+    @staticmethod
+    def content_length(response):
+        """
+        Size of the whole file sent by a response, None if unknown or
+        if the content is encoded.
+        """
+        headers = response.headers
+        if headers.get('Content-Encoding'):
+            return None
+        # "bytes 100-199/1234" for a partial content
+        m = re.match(r'bytes \d+-\d+/(\d+)',
+                     headers.get('Content-Range', ''))
+        if m:
+            return int(m.group(1))
+        try:
+            return int(headers['Content-Length'])
+        except (KeyError, ValueError):
+            return None
+
+    @staticmethod
+    def save(response, targetpath, checksums=None, checkgzip=True):
+        """
+        Stream the content of a response to targetpath, see DownloadSink.
+        The checksums of the response headers are verified along with
+        the given ones.
+        """
+        if response.status_code != 200:
+            raise DownloadError('http {} while downloading {}'
+                                .format(response.status_code, targetpath))
+        expected = DownloadSink.header_checksums(response.headers)
+        expected.update(checksums or {})
+        with DownloadSink(targetpath,
+                          checksums=expected,
+                          size=DownloadSink.content_length(response),
+                          checkgzip=checkgzip) as sink:
+            sink.reset()
+            sink.consume(response)
+        return sink
+
+    @staticmethod
+    def fetch(get, url, targetpath, checksums=None, checkgzip=True,
+              retries=RESUME_RETRIES, segments=SEGMENTS,
+              segmentthreshold=SEGMENT_THRESHOLD):
+        """
+        Download url to targetpath, resuming with Range requests after
+        an interruption and from the partial file of a previous run.
+
+        :param get: function (url, headers) returning a streamed
+            requests response
+        :param checksums: expected checksums, along with the ones of the
+            response headers
+        :param retries: number of times an interrupted download is
+            resumed
+        :param segments: number of parallel ranged requests used for the
+            files larger than segmentthreshold bytes, 1 to disable
+        """
+        partial = os.path.exists(DownloadSink.partialpath(targetpath))
+        headers = {'Range': 'bytes={}-'.format(os.path.getsize(
+            DownloadSink.partialpath(targetpath)))} if partial else None
+        r = get(url, headers)
+        if r.status_code == 416:
+            # the partial file does not match the remote one
+            os.remove(DownloadSink.partialpath(targetpath))
+            r = get(url, None)
+        if r.status_code not in [200, 206]:
+            raise DownloadError('http {} while downloading {}'
+                                .format(r.status_code, targetpath))
+        expected = DownloadSink.header_checksums(r.headers)
+        expected.update(checksums or {})
+        size = DownloadSink.content_length(r)
+        if r.status_code == 200 and segments > 1 and size and \
+                size >= segmentthreshold and \
+                r.headers.get('Accept-Ranges') == 'bytes':
+            r.close()
+            return DownloadSink._fetch_segments(
+                get, url, targetpath, expected, size, checkgzip, retries,
+                segments)
+        sink = DownloadSink(targetpath, expected, size, checkgzip)
+        attempt = 0
+        while True:
+            try:
+                if r is None:
+                    r = get(url, {'Range': 'bytes={}-'.format(sink.written)})
+                if r.status_code == 200:
+                    sink.reset()
+                elif r.status_code != 206:
+                    raise DownloadError('http {} while resuming {}'
+                                        .format(r.status_code, targetpath))
+                sink.consume(r)
+                if sink.size is None or sink.written >= sink.size:
+                    break
+                error = 'connection closed'
+            except requests.RequestException as e:
+                error = e
+            except Exception:
+                sink.abort()
+                raise
+            r = None
+            attempt += 1
+            if attempt > retries:
+                sink.abort(keep=True)
+                raise DownloadError('Download of {} interrupted at byte {} '
+                                    'after {} retries: {}'
+                                    .format(targetpath, sink.written,
+                                            retries, error))
+            logger.warning('Download of {} interrupted at byte {}, '
+                           'resuming: {}'
+                           .format(targetpath, sink.written, error))
+        sink.commit()
+        return sink
+
+    @staticmethod
+    def _fetch_segments(get, url, targetpath, checksums, size, checkgzip,
+                        retries, segments):
+        """
+        Download a large file with parallel ranged requests written at
+        their offset in the partial file. The checksums can only be
+        computed once all the segments are written.
+        """
+        temppath = DownloadSink.partialpath(targetpath)
+        with open(temppath, 'wb') as f:
+            f.truncate(size)
+        segmentsize = -(-size // segments)
+        ranges = [(start, min(start + segmentsize, size) - 1)
+                  for start in range(0, size, segmentsize)]
+        logger.info('Downloading {} in {} segments'
+                    .format(targetpath, len(ranges)))
+        fd = os.open(temppath, os.O_WRONLY)
+
+        def segment(start, end):
+            position = start
+            attempt = 0
+            while position <= end:
+                try:
+                    r = get(url, {'Range': 'bytes={}-{}'
+                                  .format(position, end)})
+                    if r.status_code != 206:
+                        raise DownloadError('http {} while downloading a '
+                                            'segment of {}'
+                                            .format(r.status_code,
+                                                    targetpath))
+                    for chunk in r.iter_content(
+                            chunk_size=DownloadSink.chunk_size(size)):
+                        if chunk:
+                            chunk = chunk[:end + 1 - position]
+                            transfer.throttle(len(chunk))
+                            os.pwrite(fd, chunk, position)
+                            position += len(chunk)
+                    if position > end:
+                        break
+                except requests.RequestException as e:
+                    logger.debug('Segment of {} interrupted at byte {}: {}'
+                                 .format(targetpath, position, e))
+                attempt += 1
+                if attempt > retries:
+                    break
+            return position - start
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+                written = sum(executor.map(transfer.bound(lambda x:
+                                                          segment(*x)),
+                                           ranges))
+        except Exception:
+            os.close(fd)
+            os.remove(temppath)
+            raise
+        os.close(fd)
+        sink = DownloadSink(targetpath, checksums, size, checkgzip)
+        sink._f.close()
+        try:
+            if written != size:
+                raise DownloadError('{} is incomplete: {} bytes out of {}'
+                                    .format(targetpath, written, size))
+            sink.verify()
+        except Exception:
+            sink.abort()
+            raise
+        os.replace(temppath, targetpath)
+        return sink
@@ -0,0 +1,65 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import re
+import html
+import logging
+
+logger = logging.getLogger(__name__)
+
+# <a ... href="target" ...>text</a>
+ANCHOR = re.compile(
+    r'<a\s[^>]*?\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))[^>]*>'
+    r'(.*?)</a\s*>',
+    re.IGNORECASE | re.DOTALL)
+# href="target" only, when the text of the anchors is not needed
+HREF = re.compile(
+    r'<a\s[^>]*?\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))',
+    re.IGNORECASE)
+TAG = re.compile(r'<[^>]*>')
+
+
+class HtmlLinks(object):
+    """
+    Extraction of the links of the HTML pages of the repositories, like
+    the directory listings of CRAN: a compiled regular expression is
+    run over the page instead of building its whole tree.
+
+    The pages are generated by the servers and well formed, links in
+    comments or scripts are not told apart.
+    """
+
+    @staticmethod
+    def _text(fragment):
+        return html.unescape(TAG.sub('', fragment)).strip()
+
+    @staticmethod
+    def hrefs(page):
+        """
+        List of the targets of the anchors of a page, in order.
+        """
+        return [html.unescape(m.group(1) or m.group(2) or m.group(3) or '')
+                for m in HREF.finditer(page)]
+
+    @staticmethod
+    def anchors(page):
+        """
+        List of the anchors of a page as (target, text) tuples, in
+        order. The tags nested in the text are removed.
+        """
+        return [(html.unescape(m.group(1) or m.group(2) or m.group(3) or ''),
+                 HtmlLinks._text(m.group(4)))
+                for m in ANCHOR.finditer(page)]
+
+    @staticmethod
+    def texts(page, tag):
+        """
+        List of the texts of the elements of a page with the given tag,
+        like the titles of <h3>...</h3>.
+        """
+        regex = re.compile(r'<{0}(?:\s[^>]*)?>(.*?)</{0}\s*>'
+                           .format(re.escape(tag)),
+                           re.IGNORECASE | re.DOTALL)
+        return [HtmlLinks._text(m.group(1)) for m in regex.finditer(page)]
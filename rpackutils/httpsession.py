@@ -0,0 +1,144 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# number of connections kept alive per host
+POOL_SIZE = 10
+# seconds to wait for the connection and between two received bytes
+CONNECT_TIMEOUT_SEC = 10
+READ_TIMEOUT_SEC = 300
+# retries on connection errors and on the following http status codes
+RETRIES = 3
+RETRY_BACKOFF_SEC = 0.5
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# methods retried by the session, the requests sending a body are not:
+# their body may have been read already, see retry_delays()
+RETRY_METHODS = ['HEAD', 'GET', 'OPTIONS']
+
+
+class HttpSession(object):
+    """
+    Connection pooled HTTP session with keep-alive and retries.
+
+    The underlying requests.Session is created lazily and once per
+    process: an instance copied to a worker process (fork or pickle)
+    opens its own connections instead of sharing the sockets of its
+    parent.
+    """
+
+    def __init__(self, auth=None, verify=True, poolsize=POOL_SIZE,
+                 timeout=None, retries=RETRIES, backoff=RETRY_BACKOFF_SEC):
+        """
+        :param auth: username and password as ('john', 'secret')
+        :param verify: path to the SSL certificate, False to bypass
+            the verification
+        :param poolsize: number of connections kept alive per host,
+            it should match the number of parallel requests
+        :param timeout: default timeout in seconds, either a number
+            or a (connect, read) tuple
+        :param retries: number of retries on connection errors and
+            on 429 and 5xx responses
+        :param backoff: backoff factor in seconds between retries
+        """
+        self.auth = auth
+        self.verify = verify
+        self.poolsize = max(1, poolsize) if poolsize else POOL_SIZE
+        self.timeout = timeout if timeout \
+            else (CONNECT_TIMEOUT_SEC, READ_TIMEOUT_SEC)
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_session'] = None
+        state['_pid'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _create_session(self):
+        session = requests.Session()
+        session.auth = self.auth
+        session.verify = self.verify
+        retry = Retry(total=self.retries,
+                      backoff_factor=self.backoff,
+                      status_forcelist=RETRY_STATUS_CODES,
+                      allowed_methods=RETRY_METHODS,
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=self.poolsize,
+                              pool_maxsize=self.poolsize,
+                              pool_block=False,
+                              max_retries=retry)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @property
+    def session(self):
+        """
+        The requests.Session of the current process.
+        """
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                logger.debug('Opening a HTTP session in process {}'
+                             .format(os.getpid()))
+                self._session = self._create_session()
+                self._pid = os.getpid()
+            return self._session
+
+    def resize(self, poolsize):
+        """
+        Change the number of connections kept alive per host.
+        """
+        if poolsize and poolsize != self.poolsize:
+            self.close()
+            self.poolsize = max(1, poolsize)
+
+    def close(self):
+        """
+        Close the connections of the current process.
+        """
+        with self._lock:
+            if self._session is not None and self._pid == os.getpid():
+                self._session.close()
+            self._session = None
+            self._pid = None
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """
+        Send a request, the default timeout applies unless one is given.
+        """
+        return self.session.request(
+            method,
+            url,
+            timeout=timeout if timeout else self.timeout,
+            **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('get', url, **kwargs)
+
+    def retry_delays(self):
+        """
+        Seconds to wait before each retry of a request the session does
+        not retry itself, like an upload which body has to be opened
+        again: 0 for the first attempt, then the backoff delays.
+        """
+        return [0] + [self.backoff * (2 ** i)
+                      for i in range(self.retries if self.retries else 0)]
@@ -0,0 +1,86 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import re
+import json
+import codecs
+import logging
+
+logger = logging.getLogger(__name__)
+
+# size of the chunks read from a JSON response
+JSON_CHUNK_SIZE = 256 * 1024
+# what may separate two items of an array
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+class JSONStream(object):
+    """
+    Incremental parsing of large JSON documents: the items of an array
+    are decoded one by one as the chunks of the document arrive, the
+    whole document is never held in memory.
+    """
+
+    @staticmethod
+    def iter_array(chunks, keys):
+        """
+        Yield the items of the array stored under one of keys in a JSON
+        object received by chunks, like the 'files' of
+        {"uri": "...", "files": [{...}, {...}]}.
+
+        The members preceding the array are skipped without being
+        decoded. Raises a ValueError if the array is not found or if
+        the document is truncated.
+
+        :param chunks: iterable of bytes (UTF-8) or str chunks
+        :param keys: names of the members that may hold the array
+        """
+        decoder = json.JSONDecoder()
+        utf8 = codecs.getincrementaldecoder('utf-8')()
+        start = re.compile(r'"(?:{})"\s*:\s*\['.format(
+            '|'.join([re.escape(k) for k in keys])))
+        chunks = iter(chunks)
+        buf = ''
+        pos = None
+        eof = False
+        while True:
+            if pos is None:
+                m = start.search(buf)
+                if m:
+                    pos = m.end()
+            if pos is not None:
+                # decode the complete items of the buffer
+                while True:
+                    pos = SEPARATORS.match(buf, pos).end()
+                    if pos < len(buf) and buf[pos] == ']':
+                        return
+                    try:
+                        item, end = decoder.raw_decode(buf, pos)
+                    except ValueError:
+                        break
+                    # a number may continue in the next chunk
+                    if end == len(buf) and not eof:
+                        break
+                    yield item
+                    pos = end
+            if eof:
+                if pos is None:
+                    raise ValueError('None of the members {} found'
+                                     .format(', '.join(keys)))
+                raise ValueError('Truncated JSON document')
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                eof = True
+                buf += utf8.decode(b'', final=True)
+                continue
+            if isinstance(chunk, bytes):
+                chunk = utf8.decode(chunk)
+            # drop what was already decoded
+            if pos is not None:
+                buf = buf[pos:] + chunk
+                pos = 0
+            else:
+                buf += chunk
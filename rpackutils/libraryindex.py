@@ -0,0 +1,118 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import logging
+import threading
+
+from .packinfo import PackInfo
+from .rbasepackages import RBasePackages
+
+logger = logging.getLogger(__name__)
+
+
+class LibraryIndex(object):
+    """
+    Index of the packages installed in a R library.
+
+    The library folder is scanned once with os.scandir and the
+    DESCRIPTION file of each package is parsed. The index is rebuilt
+    only when the modification time of the library folder changes,
+    which happens whenever a package folder is added, removed or
+    replaced. DESCRIPTION files whose modification time and size did
+    not change are not parsed again.
+    """
+
+    def __init__(self, librarypath):
+        """
+        :param librarypath: full path to the R library folder
+        """
+        self.librarypath = librarypath
+        self._mtime = None
+        # name -> PackInfo
+        self._packages = {}
+        # name -> (mtime, size) of the DESCRIPTION file
+        self._stamps = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """
+        Force a new scan of the library on the next access.
+        """
+        with self._lock:
+            self._mtime = None
+
+    def _scan(self):
+        packages = {}
+        stamps = {}
+        with os.scandir(self.librarypath) as entries:
+            for entry in entries:
+                # hidden folders are staging libraries or locks
+                if entry.name.startswith('.') or entry.name.startswith('00'):
+                    continue
+                if not entry.is_dir():
+                    continue
+                descriptionfilepath = os.path.join(entry.path, 'DESCRIPTION')
+                try:
+                    st = os.stat(descriptionfilepath)
+                except OSError:
+                    continue
+                stamp = (st.st_mtime_ns, st.st_size)
+                if self._stamps.get(entry.name) == stamp:
+                    packages[entry.name] = self._packages[entry.name]
+                    stamps[entry.name] = stamp
+                    continue
+                try:
+                    packinfo = PackInfo(entry.path)
+                except Exception as e:
+                    logger.warning('Cannot parse {}: {}'
+                                   .format(descriptionfilepath, e))
+                    continue
+                packages[entry.name] = packinfo
+                stamps[entry.name] = stamp
+        self._packages = packages
+        self._stamps = stamps
+
+    @property
+    def packages(self):
+        """
+        Installed packages as a dictionary name -> PackInfo.
+        """
+        with self._lock:
+            mtime = os.stat(self.librarypath).st_mtime_ns
+            if mtime != self._mtime:
+                logger.debug('Indexing the R library {}'
+                             .format(self.librarypath))
+                self._scan()
+                self._mtime = mtime
+            return self._packages
+
+    def names(self, withBasePackages=False):
+        """
+        Sorted names of the installed packages.
+
+        :param withBasePackages: if False, remove all R base packages
+        """
+        return sorted([x for x in self.packages
+                       if withBasePackages or not RBasePackages.isbase(x)])
+
+    def get(self, packagename):
+        """
+        PackInfo of an installed package, None if not installed.
+        """
+        return self.packages.get(packagename)
+
+    def version(self, packagename):
+        """
+        Installed version of a package, None if not installed.
+        """
+        packinfo = self.get(packagename)
+        return packinfo.version if packinfo else None
+
+    def __contains__(self, packagename):
+        return packagename in self.packages
+
+    def __len__(self):
+        return len(self.packages)
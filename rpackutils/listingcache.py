@@ -0,0 +1,169 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# seconds during which a listing stored on disk is considered valid
+LISTING_TTL_SEC = 600
+
+
+class ListingCache(object):
+    """
+    Cache of repository listings.
+
+    The listings are kept in memory for the lifetime of the instance and
+    optionally stored as JSON files in a cache folder, where they remain
+    valid for ttl seconds. The disk cache lets consecutive runs share
+    the listings of large repositories.
+    """
+
+    def __init__(self, cachedir=None, ttl=LISTING_TTL_SEC):
+        """
+        :param cachedir: folder where to store the listings, None to
+            only cache them in memory
+        :param ttl: number of seconds a listing stored on disk is valid,
+            None for listings that never change
+        """
+        self.cachedir = cachedir
+        self.ttl = ttl
+        self._listings = {}
+        # key -> {uri: position of the entry in the listing}, built on
+        # the first lookup of a listing
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _cachefilepath(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cachedir, '{}.json'.format(digest))
+
+    def _read(self, key):
+        cachefilepath = self._cachefilepath(key)
+        try:
+            if self.ttl is not None and \
+                    time.time() - os.path.getmtime(cachefilepath) > self.ttl:
+                return None
+            with open(cachefilepath, 'r') as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if content.get('key') != key:
+            return None
+        logger.debug('Listing of {} read from {}'
+                     .format(key, cachefilepath))
+        return content.get('entries')
+
+    def _write(self, key, entries):
+        try:
+            os.makedirs(self.cachedir, exist_ok=True)
+            fd, tmpfilepath = tempfile.mkstemp(dir=self.cachedir,
+                                               suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'key': key, 'entries': entries}, f)
+            os.replace(tmpfilepath, self._cachefilepath(key))
+        except OSError as e:
+            logger.warning('Cannot write the listing cache in {}: {}'
+                           .format(self.cachedir, e))
+
+    def get(self, key):
+        """
+        Return the cached listing, None if there is none.
+        """
+        with self._lock:
+            entries = self._listings.get(key)
+            if entries is None and self.cachedir:
+                entries = self._read(key)
+                if entries is not None:
+                    self._listings[key] = entries
+                    self._indexes.pop(key, None)
+            return entries
+
+    def _index(self, key):
+        # to be called with the lock held
+        index = self._indexes.get(key)
+        if index is None:
+            index = dict([(x['uri'], i)
+                          for i, x in enumerate(self._listings[key])])
+            self._indexes[key] = index
+        return index
+
+    def entry(self, key, uri):
+        """
+        Return the entry of a cached listing with the given uri, None if
+        there is none or if the listing is not cached. The entries are
+        indexed by uri on the first lookup.
+        """
+        if self.get(key) is None:
+            return None
+        with self._lock:
+            entries = self._listings.get(key)
+            if entries is None:
+                return None
+            i = self._index(key).get(uri)
+            return entries[i] if i is not None else None
+
+    def put(self, key, entries):
+        """
+        Store a listing.
+        """
+        with self._lock:
+            self._listings[key] = list(entries)
+            self._indexes.pop(key, None)
+            if self.cachedir:
+                self._write(key, entries)
+
+    def update(self, key, entry):
+        """
+        Add or replace an entry, identified by its uri, in a cached
+        listing. The listing stored on disk is dropped rather than
+        written again, the next run lists the repository.
+        """
+        with self._lock:
+            entries = self._listings.get(key)
+            if entries is not None:
+                # replaced or appended in place through the uri index
+                index = self._index(key)
+                i = index.get(entry['uri'])
+                if i is None:
+                    index[entry['uri']] = len(entries)
+                    entries.append(entry)
+                else:
+                    entries[i] = entry
+        if self.cachedir:
+            try:
+                os.remove(self._cachefilepath(key))
+            except OSError:
+                pass
+
+    def invalidate(self, key=None):
+        """
+        Forget a listing, or all of them if no key is given.
+        """
+        with self._lock:
+            keys = [key] if key else list(self._listings.keys())
+            for k in keys:
+                self._listings.pop(k, None)
+                self._indexes.pop(k, None)
+                if self.cachedir:
+                    try:
+                        os.remove(self._cachefilepath(k))
+                    except OSError:
+                        pass
@@ -0,0 +1,122 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import gzip
+import logging
+
+from .packinfo import PackInfo
+from .packinfo import PackStatus
+
+logger = logging.getLogger(__name__)
+
+# fields of the PACKAGES index kept in the table
+PACKAGES_FIELDS = ['Package', 'Version', 'Depends', 'Imports', 'LinkingTo',
+                   'Suggests', 'License', 'MD5sum']
+
+
+class PackagesIndex(object):
+    """
+    In-memory table of the packages of a CRAN-like repository, read
+    from its PACKAGES index (src/contrib/PACKAGES.gz): one record per
+    package with its version, dependencies, license and MD5 checksum.
+    """
+
+    def __init__(self, records):
+        """
+        :param records: list of dictionaries field -> value, as
+            returned by parse()
+        """
+        self.records = records
+        self._byname = {r['Package']: r for r in records if 'Package' in r}
+
+    def __contains__(self, name):
+        return name in self._byname
+
+    def __len__(self):
+        return len(self._byname)
+
+    @staticmethod
+    def parse(text):
+        """
+        Parse a PACKAGES index written in the Debian control file
+        format: records separated by blank lines, fields as
+        "Name: value" and continuation lines indented.
+        """
+        records = []
+        record = {}
+        field = None
+        for line in text.splitlines():
+            if not line.strip():
+                if record:
+                    records.append(record)
+                record = {}
+                field = None
+            elif line[0] in ' \t':
+                if field is not None:
+                    record[field] += ' ' + line.strip()
+            else:
+                name, _, value = line.partition(':')
+                field = name.strip()
+                if field in PACKAGES_FIELDS:
+                    record[field] = value.strip()
+                else:
+                    field = None
+        if record:
+            records.append(record)
+        return records
+
+    @staticmethod
+    def fromcontent(content):
+        """
+        Construct the table from the content of PACKAGES or PACKAGES.gz.
+        """
+        if content[:2] == b'\x1f\x8b':
+            content = gzip.decompress(content)
+        return PackagesIndex(PackagesIndex.parse(
+            content.decode('utf-8', errors='ignore')))
+
+    def names(self):
+        return list(self._byname.keys())
+
+    def get(self, name):
+        """
+        Record of a package, None if it is not in the index.
+        """
+        return self._byname.get(name)
+
+    def tarball(self, name):
+        record = self._byname.get(name)
+        if record is None or 'Version' not in record:
+            return None
+        return '{0}_{1}.tar.gz'.format(name, record['Version'])
+
+    @property
+    def tarballs(self):
+        return [self.tarball(name) for name in self._byname
+                if self.tarball(name)]
+
+    def md5sum(self, name):
+        record = self._byname.get(name)
+        return record.get('MD5sum') if record else None
+
+    def packinfo(self, name):
+        """
+        PackInfo of a package built from its record, None if the
+        package is not in the index.
+        """
+        record = self._byname.get(name)
+        if record is None:
+            return None
+        packinfo = PackInfo(name)
+        packinfo._set_fields(
+            name,
+            record.get('Version'),
+            PackInfo._clean_children(record.get('Depends')),
+            PackInfo._clean_children(record.get('Imports')),
+            PackInfo._clean_children(record.get('Suggests')),
+            PackInfo._clean_children(record.get('LinkingTo')),
+            record.get('License'))
+        packinfo.status = PackStatus.PARSED
+        return packinfo
@@ -143,7 +143,7 @@ class PackInfo(object):
         """
         all = self.importslist + self.dependslist + self.linkingtolist
         if not withBasePackages:
-            all = [x for x in all if x not in RBasePackages.getnames()]
+            all = [x for x in all if not RBasePackages.isbase(x)]
         return all
 
     @property
@@ -239,19 +239,71 @@ class PackInfo(object):
             'license': None
         }
         self._read_desc_line_recurse(d, context, cleanlines, 0)
-        self.name = d['package']
-        self.depends = PackInfo._clean_children(d['depends'])
-        self.imports = PackInfo._clean_children(d['imports'])
-        self.suggests = PackInfo._clean_children(d['suggests'])
-        self.linkingto = PackInfo._clean_children(d['linkingto'])
-        self.version = d['version']
-        self.license = d['license']
+        self._set_fields(d['package'],
+                         d['version'],
+                         PackInfo._clean_children(d['depends']),
+                         PackInfo._clean_children(d['imports']),
+                         PackInfo._clean_children(d['suggests']),
+                         PackInfo._clean_children(d['linkingto']),
+                         d['license'])
+
+    def _set_fields(self, name, version, depends, imports, suggests,
+                    linkingto, license):
+        self.name = name
+        self.depends = depends
+        self.imports = imports
+        self.suggests = suggests
+        self.linkingto = linkingto
+        self.version = version
+        self.license = license
         # compute the license-class
-        lic = License(d['license'])
+        lic = License(license)
         self.licenseclass = lic.license_class
         self.installationisallowed = lic.installation_is_allowed
         self.installationwarning = lic.installation_warning
 
+    @property
+    def properties(self):
+        """
+        DESCRIPTION fields as repository properties, each property
+        having a list of values.
+        """
+        properties = {
+            'r.name': [self.name],
+            'r.version': [self.version],
+            'r.depends': self.dependslist,
+            'r.imports': self.importslist,
+            'r.linkingto': self.linkingtolist,
+            'r.suggests': self.suggestslist,
+            'r.license': [self.license],
+        }
+        return {k: v for k, v in properties.items()
+                if v and None not in v}
+
+    @staticmethod
+    def fromproperties(properties):
+        """
+        Construct a PackInfo from repository properties as returned by
+        the properties attribute, None if the name, the version or the
+        license is missing.
+        """
+        def values(key):
+            return [x for x in properties.get(key, []) if x]
+
+        if not all([values(k) for k in ['r.name', 'r.version',
+                                        'r.license']]):
+            return None
+        packinfo = PackInfo(values('r.name')[0])
+        packinfo._set_fields(values('r.name')[0],
+                             values('r.version')[0],
+                             values('r.depends'),
+                             values('r.imports'),
+                             values('r.suggests'),
+                             values('r.linkingto'),
+                             values('r.license')[0])
+        packinfo.status = PackStatus.PARSED
+        return packinfo
+
     @staticmethod
     def _clean_children(s):
         if s:
@@ -4,6 +4,8 @@
 #######################################
 
 import os
+import json
+import urllib.parse
 from distutils.version import LooseVersion
 import errno
 import sys
@@ -16,22 +18,43 @@ import datetime
 import logging
 import glob
 import re
-from bs4 import BeautifulSoup
-import multiprocessing
 import time
 import fnmatch
-import magic
 
 from ..provider import AbstractPackageRepository
 from ..packinfo import PackInfo
 from ..packinfo import PackStatus
 from ..utils import Utils
+from .. import transfer
+from ..downloadsink import DownloadSink
+from ..downloadsink import DownloadError
+from ..jsonstream import JSONStream
+from ..jsonstream import JSON_CHUNK_SIZE
+from ..httpsession import HttpSession
+from ..httpsession import POOL_SIZE
+from ..httpsession import RETRIES
+from ..httpsession import RETRY_BACKOFF_SEC
+from ..httpsession import RETRY_STATUS_CODES
+from ..listingcache import ListingCache
+from ..listingcache import LISTING_TTL_SEC
 
 logger = logging.getLogger(__name__)
 
+# use of the Artifactory Query Language for searches: 'auto' tries it
+# once and falls back to the repository listings if it is not available
+AQL_MODES = ['auto', 'true', 'false']
+# maximum number of name patterns sent in a single AQL query
+AQL_BATCH_SIZE = 100
+AQL_FIELDS = ['name', 'repo', 'path', 'size', 'actual_sha1', 'modified',
+              'property.*']
+# characters escaped with a backslash in the properties matrix
+PROPERTIES_SPECIAL_CHARS = ['\\', ',', '|', '=', ';']
+
 
 class Artifactory(AbstractPackageRepository):
-    def __init__(self, baseurl, repos, auth, verify):
+    def __init__(self, baseurl, repos, auth, verify, poolsize=POOL_SIZE,
+                 timeout=None, retries=RETRIES, backoff=RETRY_BACKOFF_SEC,
+                 cachedir=None, cachettl=LISTING_TTL_SEC, aql='auto'):
         """
         Artifactory repository client.
 
@@ -39,10 +62,36 @@ class Artifactory(AbstractPackageRepository):
         :param repos: list of repository names
         :param auth: username and password as ('john', 'secret')
         :param verify: path to the SSL certificate, False to bypass the verification
+        :param poolsize: number of connections kept alive
+        :param timeout: default timeout of the requests in seconds
+        :param retries: number of retries on connection errors, 429 and 5xx
+        :param backoff: backoff factor in seconds between retries
+        :param cachedir: folder where to cache the repository listings
+            between runs, None to cache them in memory only
+        :param cachettl: seconds during which a cached listing is valid
+        :param aql: one of 'auto', 'true' or 'false', whether to search
+            with the Artifactory Query Language instead of the listings
         """
         super().__init__('artifactory', baseurl, repos)
         self.auth = auth
         self.verify = verify
+        self._http = HttpSession(auth=auth,
+                                 verify=verify,
+                                 poolsize=poolsize,
+                                 timeout=timeout,
+                                 retries=retries,
+                                 backoff=backoff)
+        self._listingcache = ListingCache(cachedir, cachettl)
+        if aql not in AQL_MODES:
+            raise ValueError('Unexpected AQL mode \"{}\", expected one of {}'
+                             .format(aql, ', '.join(AQL_MODES)))
+        # None until the server support is known
+        self._aqlsupported = None if aql == 'auto' else (aql == 'true')
+        self._aqlforced = (aql == 'true')
+        # (repo, pattern) -> list of matching files details
+        self._searchcache = {}
+        # (repo, filename) -> properties of the artifact
+        self._propertiescache = {}
         if not self.check_connection(numtries=3):
             raise FileNotFoundError(errno.ENOENT,
                                     os.strerror(errno.ENOENT),
@@ -88,12 +137,27 @@ class Artifactory(AbstractPackageRepository):
             self.baseurl,
             "/api/storage/{0}".format(repo))
 
-    def _do_request(self, url, stream=False):
-        r = requests.get(
+    @property
+    def poolsize(self):
+        """
+        Number of connections kept alive, it should match the number of
+        parallel downloads or uploads.
+        """
+        return self._http.poolsize
+
+    @poolsize.setter
+    def poolsize(self, poolsize):
+        self._http.resize(poolsize)
+
+    def _do_request(self, url, stream=False, method='get', data=None,
+                    headers=None, timeout=None):
+        r = self._http.request(
+            method,
             url,
-            auth=self.auth,
-            verify=self.verify,
-            stream=stream)
+            stream=stream,
+            data=data,
+            headers=headers,
+            timeout=timeout)
         return r
 
     def ls(self, repo=None, packagenamesonly=False):
@@ -115,28 +179,289 @@ class Artifactory(AbstractPackageRepository):
                               for match in matches])
             return files
 
-    def ls_repo(self, repo):
-        """
-        List available files given a repository name.
+    def _get_list_url(self, repo):
+        # File List API, the files of the repository root with their
+        # size and checksums in a single request
+        return '{0}?list&deep=1&depth=1&listFolders=0'.format(
+            self._get_api_url(repo))
 
-        The returned filepaths won't be prefixed by their
-        repository name.
+    @staticmethod
+    def _parse_entry(x):
+        # the folder info API 'children' lack the sizes and checksums
+        return {'uri': x['uri'][1:],
+                'size': x.get('size'),
+                'sha1': x.get('sha1'),
+                'sha256': x.get('sha2'),
+                'lastModified': x.get('lastModified')}
+
+    def _stream_listing(self, repo):
+        """
+        Request the listing of a repository and return a generator of
+        its files details parsed as the response arrives, None if the
+        repository cannot be listed.
         """
-        r = self._do_request(self._get_api_url(repo))
+        r = self._do_request(self._get_list_url(repo), stream=True)
         if r.status_code == 200:
-            content = r.json()
-            if 'children' not in content:
-                logger.error('Not well formated JSON response')
-                return []
-            return [x['uri'][1:] for x in content['children'] if not x['folder']]
+            items = JSONStream.iter_array(
+                r.iter_content(chunk_size=JSON_CHUNK_SIZE),
+                ['files', 'children'])
+            return (Artifactory._parse_entry(x) for x in items
+                    if not x.get('folder', False))
         if r.status_code == 404:
             logger.error('Repository {} does not exist!'.format(repo))
-            return []
         else:
             logger.error('Unexpected http {0} while trying'
                          ' to access the repository {1} '
                          .format(r.status_code, repo))
+        return None
+
+    def ls_repo_details(self, repo):
+        """
+        List available files given a repository name along with
+        their size, checksums and modification date.
+
+        The listing is requested once and then served from the cache.
+        """
+        key = Utils.concaturls(self.baseurl, repo)
+        entries = self._listingcache.get(key)
+        if entries is not None:
+            return entries
+        stream = self._stream_listing(repo)
+        if stream is None:
+            return []
+        try:
+            entries = list(stream)
+        except ValueError as e:
+            logger.error('Not well formated JSON response: {}'.format(e))
             return []
+        self._listingcache.put(key, entries)
+        return entries
+
+    def ils_repo_details(self, repo):
+        """
+        Generator version of ls_repo_details(): the files details are
+        yielded while the listing is received, in constant memory.
+        A cached listing is used if any, a streamed one is not cached.
+        """
+        entries = self._listingcache.get(Utils.concaturls(self.baseurl, repo))
+        if entries is not None:
+            yield from entries
+            return
+        stream = self._stream_listing(repo)
+        if stream is None:
+            return
+        try:
+            yield from stream
+        except ValueError as e:
+            logger.error('Not well formated JSON response: {}'.format(e))
+
+    def ils(self, repo=None):
+        """
+        Generator version of ls(): the files of a repository, or of all
+        the defined repositories prefixed with their name.
+        """
+        if repo is not None:
+            for entry in self.ils_repo_details(repo):
+                yield entry['uri']
+            return
+        for repo in self.repos:
+            for entry in self.ils_repo_details(repo):
+                yield Utils.concaturls(repo, entry['uri'])
+
+    def ifind(self, pattern):
+        """
+        Generator version of find(): the files of the defined
+        repositories matching pattern, yielded as they are listed.
+        """
+        for repo in self.repos:
+            for match in self.ifind_repo(repo, pattern):
+                yield Utils.concaturls(repo, match)
+
+    def ifind_repo(self, repo, pattern):
+        """
+        Generator version of find_repo().
+        """
+        if self._use_aql(repo, [pattern]):
+            found = self.search_repo(repo, [pattern])
+            if found is not None:
+                for x in found[pattern]:
+                    yield x['uri']
+                return
+        for entry in self.ils_repo_details(repo):
+            if fnmatch.fnmatch(entry['uri'], pattern):
+                yield entry['uri']
+
+    def ls_repo(self, repo):
+        """
+        List available files given a repository name.
+
+        The returned filepaths won't be prefixed by their
+        repository name.
+        """
+        return [x['uri'] for x in self.ls_repo_details(repo)]
+
+    def invalidate_cache(self, repo=None):
+        """
+        Forget the cached listing of a repository, or of all of them.
+        """
+        if repo is None:
+            self._listingcache.invalidate()
+            self._searchcache = {}
+            self._propertiescache = {}
+        else:
+            self._listingcache.invalidate(
+                Utils.concaturls(self.baseurl, repo))
+            self._searchcache = {k: v for k, v in self._searchcache.items()
+                                 if k[0] != repo}
+            self._propertiescache = {
+                k: v for k, v in self._propertiescache.items()
+                if k[0] != repo}
+
+    def _record_deployed(self, repo, filename, checksums, size):
+        """
+        Add a deployed file to the cached listing of its repository
+        rather than listing the repository again.
+        """
+        self._listingcache.update(
+            Utils.concaturls(self.baseurl, repo),
+            {'uri': filename,
+             'size': size,
+             'sha1': checksums['sha1'],
+             'sha256': checksums['sha256'],
+             'lastModified': None})
+        self._searchcache = {k: v for k, v in self._searchcache.items()
+                             if k[0] != repo}
+        self._propertiescache.pop((repo, filename), None)
+
+    @property
+    def aql_enabled(self):
+        """
+        False once the server is known not to support AQL searches.
+        """
+        return self._aqlsupported is not False
+
+    def _do_aql(self, query):
+        """
+        Run an AQL query and return its results, None if the query
+        could not be run.
+        """
+        url = Utils.concaturls(self.baseurl, '/api/search/aql')
+        content = None
+        try:
+            r = self._do_request(url,
+                                 method='post',
+                                 data=query,
+                                 headers={'Content-Type': 'text/plain'})
+            if r.status_code == 200:
+                content = r.json()
+            else:
+                logger.debug('AQL query failed with http {}: {}'
+                             .format(r.status_code, r.text))
+        except Exception as e:
+            logger.debug('AQL query failed: {}'.format(e))
+        if not isinstance(content, dict) or 'results' not in content:
+            if self._aqlforced:
+                logger.error('The AQL search failed on {}, falling back '
+                             'to the repository listing'
+                             .format(self.baseurl))
+            elif self._aqlsupported is None:
+                logger.warning('AQL is not available on {}, searches will '
+                               'use the repository listings'
+                               .format(self.baseurl))
+                self._aqlsupported = False
+            return None
+        self._aqlsupported = True
+        return content['results']
+
+    @staticmethod
+    def _aql_query(repo, patterns):
+        repokey, _, path = repo.strip('/').partition('/')
+        criteria = {'repo': repokey,
+                    'path': path if path else '.',
+                    'type': 'file'}
+        if len(patterns) == 1:
+            criteria['name'] = {'$match': patterns[0]}
+        else:
+            criteria['$or'] = [{'name': {'$match': p}} for p in patterns]
+        return 'items.find({0}).include({1})'.format(
+            json.dumps(criteria),
+            ','.join([json.dumps(f) for f in AQL_FIELDS]))
+
+    @staticmethod
+    def _parse_aql_result(result):
+        return {'uri': result['name'],
+                'size': result.get('size'),
+                'sha1': result.get('actual_sha1'),
+                'sha256': None,
+                'lastModified': result.get('modified'),
+                'properties': Artifactory._aql_properties(
+                    result.get('properties', []))}
+
+    @staticmethod
+    def _aql_properties(properties):
+        # multiple values of a property are returned as several items
+        d = {}
+        for p in properties:
+            d.setdefault(p['key'], []).append(p.get('value'))
+        return d
+
+    def search_repo(self, repo, patterns):
+        """
+        Search files matching name patterns in a repository with AQL,
+        the patterns are sent by batches in a single round trip each.
+
+        Only the '*' and '?' wildcards are supported.
+        Returns a dictionary pattern -> list of files details (see
+        ls_repo_details()) along with their properties, None if AQL
+        is not available.
+        """
+        if not self.aql_enabled:
+            return None
+        found = {p: self._searchcache[(repo, p)] for p in patterns
+                 if (repo, p) in self._searchcache}
+        missing = [p for p in patterns if p not in found]
+        for i in range(0, len(missing), AQL_BATCH_SIZE):
+            batch = missing[i:i + AQL_BATCH_SIZE]
+            results = self._do_aql(Artifactory._aql_query(repo, batch))
+            if results is None:
+                return None
+            entries = [Artifactory._parse_aql_result(x) for x in results]
+            for entry in entries:
+                self._propertiescache[(repo, entry['uri'])] = \
+                    entry['properties']
+            for pattern in batch:
+                matches = [x for x in entries
+                           if fnmatch.fnmatchcase(x['uri'], pattern)]
+                self._searchcache[(repo, pattern)] = matches
+                found[pattern] = matches
+        return found
+
+    def find_packages(self, repo, packagenames):
+        """
+        Return a dictionary packagename -> list of the tarballs of this
+        package in a repository, resolved with a single AQL query per
+        batch of names or with the repository listing.
+        """
+        patterns = ['{0}_*.tar.gz'.format(x) for x in packagenames]
+        found = None
+        if self._use_aql(repo, patterns):
+            found = self.search_repo(repo, patterns)
+        if found is None:
+            entries = self.ls_repo_details(repo)
+            found = {p: [x for x in entries if fnmatch.fnmatch(x['uri'], p)]
+                     for p in patterns}
+        return {name: [x['uri'] for x in found[pattern]]
+                for name, pattern in zip(packagenames, patterns)}
+
+    def _use_aql(self, repo, patterns):
+        # a cached listing is cheaper than any request, AQL does not
+        # support the [] wildcards
+        if not self.aql_enabled:
+            return False
+        if any(['[' in p for p in patterns]):
+            return False
+        key = Utils.concaturls(self.baseurl, repo)
+        return self._listingcache.get(key) is None
 
     def find(self, pattern):
         """
@@ -162,6 +487,10 @@ class Artifactory(AbstractPackageRepository):
         dot are special cases that are not matched by '*' and '?'
         patterns.
         """
+        if self._use_aql(repo, [pattern]):
+            found = self.search_repo(repo, [pattern])
+            if found is not None:
+                return [x['uri'] for x in found[pattern]]
         matches = []
         files = self.ls_repo(repo)
         for entry in files:
@@ -194,41 +523,41 @@ class Artifactory(AbstractPackageRepository):
         package_tarball = os.path.basename(url)
         targetpath = Utils.concaturls(dest, package_tarball)
         try:
-            r = self._do_request(url, stream=True)
-            with open(targetpath, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=1024):
-                    if chunk:  # filter out keep-alive new chunks
-                        f.write(chunk)
+            DownloadSink.fetch(
+                lambda u, h: self._do_request(u, stream=True, headers=h),
+                url,
+                targetpath,
+                self._listed_checksums(repo, fullpackagename))
             logger.info('Done downloading R package: {0}'
                         .format(fullpackagename))
             retVal = PackStatus.DOWNLOADED
+        except DownloadError as e:
+            logger.error('Error downloading R package: {0}\nURL: {1}\n{2}'
+                         .format(fullpackagename, url, e))
+            retVal = PackStatus.DOWNLOAD_FAILED
         except Exception:
-            error_message = "Error downloading R package: "
-            "{0}\n{1}\n{2}\n{3}".format(
-                fullpackagename,
-                url,
-                sys.exc_info()[0],
-                traceback.extract_tb(sys.exc_info()[2]))
+            error_message = "Error downloading R package: " \
+                "{0}\n{1}\n{2}\n{3}".format(
+                    fullpackagename,
+                    url,
+                    sys.exc_info()[0],
+                    traceback.extract_tb(sys.exc_info()[2]))
             logger.error(error_message)
             retVal = PackStatus.DOWNLOAD_FAILED
-        if retVal == PackStatus.DOWNLOADED:
-            # check tarball size
-            if os.path.getsize(targetpath) == 0:
-                retVal = PackStatus.DOWNLOAD_FAILED
-                error_message = "The downloaded package has a zero size: " \
-                                "{0}\nURL: {1}" \
-                                .format(targetpath, url)
-                logger.error(error_message)
-            # check file type
-            if(magic.from_file(targetpath) == 'ASCII text'):
-                retVal = PackStatus.DOWNLOAD_FAILED
-                error_message = "Artifactory returned a status message " \
-                                "instead of the package: " \
-                                "{0}\nURL: {1}" \
-                                .format(targetpath, url)
-                logger.error(error_message)
         return retVal
 
+    def _listed_checksums(self, repo, filename):
+        """
+        Checksums of a file from the cached listing of its repository,
+        the repository is not listed if it is not cached.
+        """
+        entry = self._listingcache.entry(
+            Utils.concaturls(self.baseurl, repo), filename)
+        if entry is None:
+            return None
+        return {'sha1': entry.get('sha1'),
+                'sha256': entry.get('sha256')}
+
     def download_single(self, repo, packagename, dest):
         """
         Download a R package to the specified dest folder
@@ -284,30 +613,34 @@ class Artifactory(AbstractPackageRepository):
                                                    dest)
             return retVal
 
-    def download_multiple(self, repos, packagenames, dest, procs=20):
+    def download_multiple(self, repos, packagenames, dest, procs=20,
+                          callback=None):
         """
         Download R packages given their names and repository location.
 
         Multiple downloads can be launched in parrallel with
         the procs parameter.
+        :param callback: function called with the index of a package and
+            its PackStatus as soon as its download is done
         """
         starttime = time.time()
         totalnumofpacks = len(packagenames)
         totaldownloaded = 0
         logger.info('preparing to download {0} packages'
                     .format(totalnumofpacks))
-        # multiprocessing.cpu_count()
-        pool = multiprocessing.Pool(processes=procs)
-        # submit all processes at once and retrieve the results
-        # as soon as they are finished
-        results = [pool.apply_async(self.download_single,
-                                    args=(repos[i],
-                                          packagenames[i],
-                                          dest))
-                   for i in range(0, totalnumofpacks)]
-        retVals = [res.get() for res in results]
-        # avoid zombies and release the memory
-        pool.close()
+        # search the packages of each repository at once, the
+        # transfers then share the search and listing caches
+        for repo in set(repos):
+            self.find_packages(repo, [packagenames[i]
+                                      for i in range(0, totalnumofpacks)
+                                      if repos[i] == repo])
+        retVals = transfer.engine().run(
+            self.download_single,
+            [(repos[i], packagenames[i], dest)
+             for i in range(0, totalnumofpacks)],
+            hosts=transfer.TransferEngine.host(self.baseurl),
+            callback=callback,
+            workers=procs)
         for retVal in retVals:
             # if retVal == 'ok':
             if retVal == PackStatus.DOWNLOADED:
@@ -322,81 +655,258 @@ class Artifactory(AbstractPackageRepository):
             logger.error('Failed to download all R packages')
         return retVals
 
+    @staticmethod
+    def _response_errors(r):
+        """
+        Error messages of an Artifactory response.
+        """
+        try:
+            content = r.json()
+            return '; '.join(['{} {}'.format(e.get('status'),
+                                             e.get('message'))
+                              for e in content.get('errors', [])])
+        except Exception:
+            return r.text
+
+    def _deployed_entry(self, repo, filename):
+        """
+        Details of a file already present in a repository, None if
+        there is none.
+        """
+        # list the repository if it is not cached yet
+        self.ls_repo_details(repo)
+        return self._listingcache.entry(
+            Utils.concaturls(self.baseurl, repo), filename)
+
+    def _deploy_request(self, url, checksums, filepath=None):
+        """
+        Send a PUT request with the checksums of the artifact.
+        Without filepath, only the checksums are sent and Artifactory
+        reuses the content it already stores with the same checksum.
+        """
+        headers = {'X-Checksum-Md5': checksums['md5'],
+                   'X-Checksum-Sha1': checksums['sha1'],
+                   'X-Checksum-Sha256': checksums['sha256']}
+        if filepath is None:
+            headers['X-Checksum-Deploy'] = 'true'
+        else:
+            headers['Content-Type'] = 'application/octet-stream'
+        # the session does not retry the PUT requests, they are retried
+        # here with the file opened again
+        delays = self._http.retry_delays()
+        for attempt, delay in enumerate(delays):
+            time.sleep(delay)
+            last = (attempt == len(delays) - 1)
+            try:
+                if filepath is None:
+                    r = self._do_request(url, method='put', headers=headers)
+                else:
+                    with open(filepath, 'rb') as f:
+                        r = self._do_request(
+                            url,
+                            method='put',
+                            data=transfer.throttled(
+                                f, os.path.getsize(filepath)),
+                            headers=headers)
+            except requests.ConnectionError as e:
+                if last:
+                    raise
+                logger.warning('Retrying the deployment to {}: {}'
+                               .format(url, e))
+                continue
+            if last or r.status_code not in RETRY_STATUS_CODES:
+                return r
+            logger.warning('Retrying the deployment to {}: http {}'
+                           .format(url, r.status_code))
+
+    @staticmethod
+    def _properties_matrix(properties):
+        """
+        Properties as matrix parameters, a property may have a list
+        of values.
+        https://www.jfrog.com/confluence/display/RTF/Using+Properties+in+Deployment+and+Resolution
+        """
+        def escape(value):
+            value = str(value)
+            for c in PROPERTIES_SPECIAL_CHARS:
+                value = value.replace(c, '\\' + c)
+            return urllib.parse.quote(value, safe='')
+
+        properties_matrix = ""
+        for k in properties.keys():
+            values = properties[k]
+            if not isinstance(values, list):
+                values = [values]
+            properties_matrix += ";"
+            properties_matrix += "{0}={1}".format(
+                escape(k), ",".join([escape(v) for v in values]))
+        return properties_matrix
+
+    @staticmethod
+    def _description_properties(filepath):
+        """
+        DESCRIPTION fields of a package tarball as properties, None if
+        the file is not a valid package.
+        """
+        if not filepath.endswith('.tar.gz'):
+            return None
+        try:
+            packinfo = PackInfo(filepath)
+        except Exception as e:
+            logger.warning('Cannot read the DESCRIPTION file of {}: {}'
+                           .format(filepath, e))
+            return None
+        if packinfo.status == PackStatus.INVALID or not packinfo.version:
+            return None
+        return packinfo.properties
+
+    def _artifact_properties(self, repo, filename):
+        """
+        Properties of an artifact, an empty dictionary if it has none.
+        """
+        if (repo, filename) in self._propertiescache:
+            return self._propertiescache[(repo, filename)]
+        url = '{0}?properties'.format(
+            Utils.concaturls(self._get_api_url(repo), filename))
+        properties = {}
+        try:
+            r = self._do_request(url)
+            if r.status_code == 200:
+                properties = r.json().get('properties', {})
+        except Exception as e:
+            logger.debug('Cannot get the properties of {}: {}'
+                         .format(url, e))
+        self._propertiescache[(repo, filename)] = properties
+        return properties
+
+    def _packinfo_from_properties(self, fullpackagenames, repo=None):
+        """
+        PackInfo of the most recent package among fullpackagenames built
+        from the artifacts properties, None if any of them lacks them.
+        """
+        packinfos = []
+        for fullpackagename in fullpackagenames:
+            name, packagerepo = self._get_name_and_repo(fullpackagename)
+            if not packagerepo:
+                packagerepo = repo
+            packinfo = PackInfo.fromproperties(
+                self._artifact_properties(packagerepo, name))
+            if packinfo is None:
+                return None
+            packinfo.repos = [packagerepo]
+            packinfos.append(packinfo)
+        return max(packinfos, key=lambda x: Utils.versionkey(x.version))
+
     def upload_single(self, filepath, repo, properties=None,
                       overwrite=False, overwritepackages=None):
+        """
+        Deploy a file to a repository.
+
+        A file already present in the repository with the same checksum
+        is skipped. A file present with another checksum is replaced
+        only if overwrite is True or if its package name is in
+        overwritepackages.
+        The content is sent only if Artifactory does not store any
+        artifact with the same checksum (checksum deploy), otherwise it
+        is streamed with a PUT request. The checksums of the file are
+        sent along so that Artifactory verifies the uploaded content,
+        and the checksums it computed are checked against them.
+        returns:
+        PackStatus.DEPLOYED upon success
+        PackStatus.DEPLOY_FAILED if any error occured
+        """
         logger.info('Deploying artifact: {0}'.format(filepath))
-        # construct the url with the credentials, repo and file
-        url = self.baseurl.replace(
-            '://', '://{0}:{1}@'.format(self.auth[0],
-                                        self.auth[1]))
+        if overwritepackages is None:
+            overwritepackages = []
+        filename = os.path.basename(filepath)
         url = Utils.concaturls(
-            Utils.concaturls(url, repo),
-            os.path.basename(filepath))
-        # append the properties if any
-        if properties:
-            # https://www.jfrog.com/confluence/display/RTF/Using+Properties+in+Deployment+and+Resolution
-            properties_matrix = ""
-            for k in properties.keys():
-                properties_matrix += ";"
-                properties_matrix += "{0}={1}".format(k, properties[k])
-            url += properties_matrix
-        cmd = None
-        if self.verify:
-            cmd = 'curl --cacert {0} -X PUT {1} -T {2}'.format(
-                self.verify, url, filepath)
-        else:
-            cmd = 'curl -k -XPUT {0} -T {1}'.format(
-                url, filepath)
-        # launch the system command
-        # res = subprocess.call(cmd, shell=True)
-        res, out, err = Utils.subprocesscall(cmd)
-        # curl doesn't return a none-zero return code
-        # while getting any http status error code so we are checking
-        # the output content
-        if res != 0:
-            logger.error('Failed to deploy file: {}'.format(filepath))
-            logger.error('COMMAND: {}'.format(cmd))
-            logger.error('STDOUT: {}'.format(out))
-            logger.error('STDERR: {}'.format(err))
+            Utils.concaturls(self.baseurl, repo),
+            filename)
+        try:
+            # the headers are sent before the content, the checksums
+            # have to be computed beforehand
+            checksums = Utils.checksums(filepath)
+            existing = self._deployed_entry(repo, filename)
+            if existing:
+                if existing.get('sha1') == checksums['sha1']:
+                    logger.info('The artifact {} is already deployed to '
+                                'repository {}'.format(filename, repo))
+                    return PackStatus.DEPLOYED
+                packagename = filename.split('_')[0]
+                if not (overwrite or packagename in overwritepackages):
+                    logger.warning('The artifact {} is already deployed '
+                                   'to repository {} with another content '
+                                   'and overwritting is disabled'
+                                   .format(filename, repo))
+                    return PackStatus.DEPLOYED
+            # attach the DESCRIPTION fields by default, the tarball is
+            # only read once it is known to be deployed
+            if properties is None:
+                properties = Artifactory._description_properties(filepath)
+            # append the properties if any
+            if properties:
+                url += Artifactory._properties_matrix(properties)
+            r = self._deploy_request(url, checksums)
+            if r.status_code in [200, 201]:
+                logger.info('Deployed {} by checksum'.format(filename))
+            else:
+                # the content is unknown to Artifactory
+                r = self._deploy_request(url, checksums, filepath)
+        except Exception as e:
+            logger.error('Failed to deploy file: {}: {}'
+                         .format(filepath, e))
+            return PackStatus.DEPLOY_FAILED
+        if r.status_code not in [200, 201]:
+            logger.error('Failed to deploy file: {}: http {}: {}'
+                         .format(filepath,
+                                 r.status_code,
+                                 Artifactory._response_errors(r)))
+            return PackStatus.DEPLOY_FAILED
+        try:
+            deployed = r.json().get('checksums', {})
+        except Exception:
+            deployed = {}
+        if deployed.get('sha1') and deployed['sha1'] != checksums['sha1']:
+            logger.error('Failed to deploy file: {}: the checksum of the '
+                         'deployed artifact {} does not match {}'
+                         .format(filepath,
+                                 deployed['sha1'],
+                                 checksums['sha1']))
             return PackStatus.DEPLOY_FAILED
-        if out is not None:
-            if b'<html>' in out or b'status' in out:
-                logger.error('Failed to deploy file: {}'.format(filepath))
-                logger.error('COMMAND: {}'.format(cmd))
-                logger.error('STDOUT: {}'.format(out))
-                logger.error('STDERR: {}'.format(err))
-                return PackStatus.DEPLOY_FAILED
         logger.info('Successfully deployed file: {} '
                     'to repository {}'.format(filepath, repo))
+        self._record_deployed(repo, filename, checksums,
+                              os.path.getsize(filepath))
         return PackStatus.DEPLOYED
 
     def upload_multiple(self, filepaths, repo, procs=20, properties=None,
                         overwrite=False,
-                        overwritepackages=None):
+                        overwritepackages=None,
+                        callback=None):
+        """
+        Deploy files to a repository, see upload_single().
+
+        Multiple uploads can be launched in parrallel with
+        the procs parameter.
+        :param callback: function called with the index of a file and
+            its PackStatus as soon as its upload is done
+        """
         starttime = time.time()
         totalnumoffiles = len(filepaths)
         totaldeployed = 0
-        # multiprocessing.cpu_count()
-        pool = multiprocessing.Pool(processes=procs)
-        # submit all processes at once and retrieve the results
-        # as soon as they are finished
-        results = None
-        if properties:
-            results = [pool.apply_async(self.upload_single,
-                                        args=(filepaths[i],
-                                              repo,
-                                              properties[i],
-                                              overwrite))
-                       for i in range(0, totalnumoffiles)]
-        else:
-            results = [pool.apply_async(self.upload_single,
-                                        args=(filepaths[i],
-                                              repo,
-                                              overwrite))
-                       for i in range(0, totalnumoffiles)]
-        retVals = [res.get() for res in results]
-        # avoid zombies and release the memory
-        pool.close()
+        # list the repository once to skip the files already deployed
+        self.ls_repo_details(repo)
+        retVals = transfer.engine().run(
+            self.upload_single,
+            [(filepaths[i],
+              repo,
+              properties[i] if properties else None,
+              overwrite,
+              overwritepackages)
+             for i in range(0, totalnumoffiles)],
+            hosts=transfer.TransferEngine.host(self.baseurl),
+            callback=callback,
+            workers=procs)
         endtime = time.time()
         timeelapsed = endtime - starttime
         for retVal in retVals:
@@ -448,6 +958,12 @@ class Artifactory(AbstractPackageRepository):
                         '{0}_*.tar.gz'.format(packagename))
         else:
             fullpackagenames = self._get_fullpackagenames(packagename, repo)
+        if fullpackagenames and not keeptempfiles:
+            # the tarball is not needed if the metadata are available
+            packinfo = self._packinfo_from_properties(fullpackagenames, repo)
+            if packinfo is not None:
+                logger.debug("PACKINFO: " + str(packinfo.as_dict))
+                return packinfo
         if len(fullpackagenames) == 0:
             if repo:
                 logger.error('Package {0} not FOUND in Artifactory '
@@ -15,8 +15,6 @@ import datetime
 import logging
 import glob
 import re
-from bs4 import BeautifulSoup
-import multiprocessing
 import time
 import fnmatch
 import json
@@ -25,6 +23,10 @@ from ..provider import AbstractPackageRepository
 from ..packinfo import PackInfo
 from ..packinfo import PackStatus
 from ..utils import Utils
+from .. import transfer
+from ..downloadsink import DownloadSink
+from ..downloadsink import DownloadError
+from ..htmllinks import HtmlLinks
 
 logger = logging.getLogger(__name__)
 
@@ -165,10 +167,7 @@ class Bioconductor(AbstractPackageRepository):
                     "url": package_page_url,
                     "full_package_name": None,
                     "name": package_name}
-        soup = BeautifulSoup(r.text, 'html.parser')
-        anchors = soup.findAll('a')
-        hrefs = [anchor['href'] for anchor in anchors
-                 if 'href' in anchor.attrs.keys()]
+        hrefs = HtmlLinks.hrefs(r.text)
         package_source_link = [href for href in hrefs
                                if '.tar.gz' in href]
         # example result: ['../src/contrib/ABAData_1.4.0.tar.gz']
@@ -195,10 +194,8 @@ class Bioconductor(AbstractPackageRepository):
             logger.error("Cannot open BIOC checkResults URL, "
                          "HTTP status code {0}: {1}"
                          .format(r1.status_code, self.bioc_chkres_url))
-        soup = BeautifulSoup(r1.text, 'html.parser')
         # <h3>Bioconductor X.Y (release)</h3>
-        anchors = soup.findAll('h3')
-        releases = [str(anchor.contents[0]) for anchor in anchors]
+        releases = HtmlLinks.texts(r1.text, 'h3')
         return releases
 
     def ls(self, bioc_release, view, procs=10):
@@ -243,15 +240,12 @@ class Bioconductor(AbstractPackageRepository):
         rjs.close()
         totalNumOfPackages = len(packageNames)
         logger.info("{0} {1} pakages found.".format(totalNumOfPackages, view))
-        pool = multiprocessing.Pool(processes=procs)
-        # submit all processes at once and retrieve the results
-        # as soon as they are finished
-        results = [pool.apply_async(self._get_full_package_name,
-                                    args=(bioc_release, view, packageNames[i]))
-                   for i in range(0, totalNumOfPackages)]
-        retVals = [res.get() for res in results]
-        # avoid zombies and release the memory
-        pool.close()
+        retVals = transfer.engine().run(
+            self._get_full_package_name,
+            [(bioc_release, view, packageNames[i])
+             for i in range(0, totalNumOfPackages)],
+            hosts=transfer.TransferEngine.host(self.baseurl),
+            workers=procs)
         totalprocessed = 0
         totalerrors = 0
         packageFullNames = []
@@ -323,14 +317,17 @@ class Bioconductor(AbstractPackageRepository):
         package_tarball = os.path.basename(url)
         targetpath = os.path.join(dest, package_tarball)
         try:
-            r = requests.get(url, stream=True)
-            with open(targetpath, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=1024):
-                    if chunk:  # filter out keep-alive new chunks
-                        f.write(chunk)
+            DownloadSink.fetch(
+                lambda u, h: requests.get(u, stream=True, headers=h),
+                url,
+                targetpath)
             logger.info('Done downloading BIOC R {0}: {1}'
                         .format(view, packagename))
             retVal = PackStatus.DOWNLOADED
+        except DownloadError as e:
+            logger.error('Error downloading R {0}: {1}\nURL: {2}\n{3}'
+                         .format(view, packagename, url, e))
+            retVal = PackStatus.DOWNLOAD_FAILED
         except Exception:
             error_message = 'Error downloading R {0}: {1}\n{2}\n{3}' \
                 .format(view,
@@ -340,37 +337,28 @@ class Bioconductor(AbstractPackageRepository):
             logger.error(error_message)
             # retVal = error_message
             retVal = PackStatus.DOWNLOAD_FAILED
-        # check tarball size
-        if retVal == PackStatus.DOWNLOADED:
-            if os.path.getsize(targetpath) == 0:
-                retVal = PackStatus.DOWNLOAD_FAILED
-                error_message = "The downloaded package has a zero size: " \
-                                "{0}\nURL: {1}" \
-                                .format(targetpath, url)
-                logger.error(error_message)
         return retVal
 
     def download_multiple(self, packagenames, bioc_release, view, dest,
-                          procs=10):
+                          procs=10, callback=None):
         """
         Download R packages given their names.
 
         Multiple downloads can be launched in parrallel with
         the procs parameter.
+        :param callback: function called with the index of a package and
+            its PackStatus as soon as its download is done
         """
         starttime = time.time()
         totalnumofpacks = len(packagenames)
         totaldownloaded = 0
-        pool = multiprocessing.Pool(processes=procs)
-        # submit all processes at once and retrieve the results
-        # as soon as they are finished
-        results = [pool.apply_async(self.download_single,
-                                    args=(packagenames[i], bioc_release,
-                                          view, dest))
-                   for i in range(0, totalnumofpacks)]
-        retVals = [res.get() for res in results]
-        # avoid zombies and release the memory
-        pool.close()
+        retVals = transfer.engine().run(
+            self.download_single,
+            [(packagenames[i], bioc_release, view, dest)
+             for i in range(0, totalnumofpacks)],
+            hosts=transfer.TransferEngine.host(self.baseurl),
+            callback=callback,
+            workers=procs)
         for retVal in retVals:
             # if retVal == 'ok':
             if retVal == PackStatus.DOWNLOADED:
@@ -15,8 +15,6 @@ import datetime
 import logging
 import glob
 import re
-from bs4 import BeautifulSoup
-import multiprocessing
 import time
 import fnmatch
 
@@ -24,32 +22,83 @@ from ..provider import AbstractPackageRepository
 from ..packinfo import PackInfo
 from ..packinfo import PackStatus
 from ..utils import Utils
+from .. import transfer
+from ..downloadsink import DownloadSink
+from ..downloadsink import DownloadError
+from ..httpsession import HttpSession
+from ..httpsession import POOL_SIZE
+from ..httpsession import RETRIES
+from ..httpsession import RETRY_BACKOFF_SEC
+from ..listingcache import ListingCache
+from ..packagesindex import PackagesIndex
+from ..circuitbreaker import CircuitBreaker
+from ..htmllinks import HtmlLinks
 
 logger = logging.getLogger(__name__)
 
 MRAN_BASE_URL = 'https://mran.revolutionanalytics.com'
+# the snapshots never change, the commands cache their listings for good
+# in this folder
+CRAN_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache',
+                              'rpackutils', 'cran')
+# link to the sources of R in the banner of a snapshot
+R_TARBALL = re.compile(r'(?:^|/)R-([^/]+)\.tar\.gz$')
 
 
 class CRAN(AbstractPackageRepository):
     def __init__(self,
-                 baseurl=MRAN_BASE_URL):
+                 baseurl=MRAN_BASE_URL,
+                 cachedir=None,
+                 usepackagesindex=True,
+                 poolsize=POOL_SIZE,
+                 timeout=None,
+                 retries=RETRIES,
+                 backoff=RETRY_BACKOFF_SEC):
         """
         Create a MRAN R packages repository.
         :param baseurl: Default 'https://mran.revolutionanalytics.com'
+        :param cachedir: folder where to cache the snapshots listings
+            for good, like CRAN_CACHE_DIR, None to cache them in memory
+            only
+        :param usepackagesindex: read the packages, their versions and
+            dependencies from the PACKAGES index of the snapshots rather
+            than from the html pages and the tarballs
+        :param poolsize: number of connections kept alive
+        :param timeout: default timeout of the requests in seconds
+        :param retries: number of retries on connection errors, 429 and 5xx
+        :param backoff: backoff factor in seconds between retries
         """
         super().__init__('cran', baseurl, [])
+        self.usepackagesindex = usepackagesindex
+        self._http = HttpSession(poolsize=poolsize,
+                                 timeout=timeout,
+                                 retries=retries,
+                                 backoff=backoff)
+        self._listingcache = ListingCache(cachedir, ttl=None)
+        # snapshot date -> package name -> tarballs
+        self._tarballsbyname = {}
+        # snapshot date -> PackagesIndex, False if it is not available
+        self._packagesindexes = {}
+        # health of the server, updated by the requests
+        self._health = CircuitBreaker(baseurl)
         if not self.check_connection(numtries=3):
             raise FileNotFoundError(errno.ENOENT,
                                     os.strerror(errno.ENOENT),
                                     baseurl)
 
-    def check_connection_mran_snapshot(self, numtries=3, verbose=True):
-        """
-        Returns True if the connection to mran_snapshots_url is successful.
-        False otherwise.
+    @property
+    def poolsize(self):
+        return self._http.poolsize
 
-        A max number of numtries will be done.
-        Please note numtries must be >= 1.
+    @poolsize.setter
+    def poolsize(self, poolsize):
+        self._http.resize(poolsize)
+
+    def _check_url(self, url, numtries, verbose):
+        """
+        Returns True if url answers with a 200 status code within
+        numtries tries. False otherwise. The session already waits
+        between its retries on connection errors.
         """
         if numtries < 1:
             logger.warning('The \"numtries\" parameter in check_connection() '
@@ -61,22 +110,72 @@ class CRAN(AbstractPackageRepository):
             try:
                 if(verbose):
                     logger.info('Checking connection to {0} ...'
-                                .format(self.mran_snapshots_url))
-                retVal = (requests.get(self.mran_snapshots_url)
-                          .status_code == 200)
+                                .format(url))
+                retVal = (self._http.get(url).status_code == 200)
             except Exception as e:
                 retVal = False
                 logger.error('FATAL: Cannot connect to {0}: {1}'
-                             .format(self.mran_snapshots_url, e))
-                time.sleep(3)
+                             .format(url, e))
                 continue
             break
         if retVal:
             if(verbose):
                 logger.info('Connection to {0} established.'
-                            .format(self.mran_snapshots_url))
+                            .format(url))
         return retVal
 
+    def check_connection(self, numtries=3, verbose=True):
+        """
+        Returns True if the connection to baseurl is successful.
+        False otherwise.
+
+        A max number of numtries will be done.
+        Please note numtries must be >= 1.
+        """
+        return self._check_url(self.baseurl, numtries, verbose)
+
+    def check_connection_mran_snapshot(self, numtries=3, verbose=True):
+        """
+        Returns True if the connection to mran_snapshots_url is successful.
+        False otherwise.
+
+        A max number of numtries will be done.
+        Please note numtries must be >= 1.
+        """
+        return self._check_url(self.mran_snapshots_url, numtries, verbose)
+
+    def _get(self, url, **kwargs):
+        """
+        Send a GET request and record its outcome in the health of the
+        server.
+        """
+        try:
+            r = self._http.get(url, **kwargs)
+        except requests.RequestException:
+            self._health.record_failure()
+            raise
+        if r.status_code >= 500:
+            self._health.record_failure()
+        else:
+            self._health.record_success()
+        return r
+
+    def _ensure_connection(self):
+        """
+        Raise a FileNotFoundError if the server is known to be down.
+        While the requests succeed nothing is sent, the server is only
+        probed once in a while after consecutive failures.
+        """
+        if not self._health.is_open:
+            return
+        if self._health.probe_due() and \
+                self.check_connection(numtries=1, verbose=False):
+            self._health.record_success()
+            return
+        raise FileNotFoundError(errno.ENOENT,
+                                os.strerror(errno.ENOENT),
+                                self.baseurl)
+
     @property
     def mran_snapshots_url(self):
         return Utils.concaturls(self.baseurl, 'snapshot')
@@ -91,48 +190,83 @@ class CRAN(AbstractPackageRepository):
             self.get_mran_packages_url(snapshot_date),
             package_name)
 
+    def get_mran_packages_index_url(self, snapshot_date):
+        return Utils.concaturls(
+            self.get_mran_packages_url(snapshot_date),
+            'PACKAGES.gz')
+
     @property
     def as_dict(self):
         return self.__dict__
 
-    def ls_snapshots(self, procs=10, rversion=None):
-        starttime = time.time()
-        if not self.check_connection(numtries=3, verbose=False):
-            raise FileNotFoundError(errno.ENOENT,
-                                    os.strerror(errno.ENOENT),
-                                    self.baseurl)
-        # store "R version to snapshot date"
-        version2dates = dict()
-        # fetch the snapshot dates list
-        r1 = requests.get(self.mran_snapshots_url)
+    def _snapshot_dates(self):
+        """
+        List of the snapshot dates with the URL of their banner, fetched
+        from the index of the snapshots. None if it cannot be fetched.
+        """
+        r1 = self._get(self.mran_snapshots_url)
         if not r1.status_code == 200:
             logger.error(
                 "Cannot open MRAN snapshots URL, "
                 "HTTP status code {0}: {1}"
                 .format(r1.status_code, self.mran_snapshots_url))
-        soup = BeautifulSoup(r1.text, 'html.parser')
+            return None
         # example of 1 anchor:
         # "<a href="2014-08-18_0233/">2014-08-18_0233/</a>"
-        anchors = soup.findAll('a')
+        # we skip the 1st one which is "../"
+        anchors = HtmlLinks.anchors(r1.text)[1:]
         # example of 1 href:
         # u'https://mran.revolutionanalytics.com/snapshot/2014-09-08/'
-        # we skip the 1st one which is "../"
         hrefs = [Utils.concaturls(
-            Utils.concaturls(self.mran_snapshots_url, anchor['href']),
+            Utils.concaturls(self.mran_snapshots_url, href),
             "banner.shtml"
-        ) for anchor in anchors][1:]
-        dates = [str(anchor.contents[0]).replace('/', '')
-                 for anchor in anchors][1:]
+        ) for href, text in anchors]
+        dates = [text.replace('/', '') for href, text in anchors]
         logger.info("{0} snapshot dates found.".format(len(dates)))
-        pool = multiprocessing.Pool(processes=procs)
-        # submit all processes at once and retrieve the results
-        # as soon as they are finished
-        results = [pool.apply_async(self._ls_snapshot,
-                                    args=(hrefs[i], rversion, dates[i]))
-                   for i in range(0, len(hrefs))]
-        retVals = [res.get() for res in results]
-        # avoid zombies and release the memory
-        pool.close()
+        return list(zip(dates, hrefs))
+
+    @staticmethod
+    def _in_range(date, fromdate, todate):
+        # dates may be followed by a time like "2014-08-18_0233"
+        return (fromdate is None or date >= fromdate) and \
+            (todate is None or date[:10] <= todate)
+
+    def ls_snapshots(self, procs=10, rversion=None, db=None,
+                     fromdate=None, todate=None):
+        """
+        Dictionary R version -> list of snapshot dates.
+
+        :param procs: number of banners fetched in parallel
+        :param rversion: only list the snapshots of this R version
+        :param db: SnapshotDB recording the R version of the snapshots,
+            only the banners of the dates it does not know are fetched
+        :param fromdate: only list the snapshots from this date
+        :param todate: only list the snapshots until this date
+        """
+        starttime = time.time()
+        self._ensure_connection()
+        # store "R version to snapshot date"
+        version2dates = dict()
+        # fetch the snapshot dates list
+        snapshots = self._snapshot_dates()
+        if snapshots is None:
+            snapshots = []
+        if db is not None:
+            known = db.dates()
+            snapshots = [x for x in snapshots if x[0] not in known]
+            logger.info("{0} snapshot dates not recorded yet."
+                        .format(len(snapshots)))
+            # record all the R versions, the query is done by the db
+            bannerrversion = None
+        else:
+            snapshots = [x for x in snapshots
+                         if CRAN._in_range(x[0], fromdate, todate)]
+            bannerrversion = rversion
+        retVals = transfer.engine().run(
+            self._ls_snapshot,
+            [(href, bannerrversion, date) for date, href in snapshots],
+            hosts=transfer.TransferEngine.host(self.baseurl),
+            workers=procs)
         totalprocessed = 0
         totalskipped = 0
         totalerrors = 0
@@ -151,30 +285,109 @@ class CRAN(AbstractPackageRepository):
                     .format(totalprocessed,
                             totalskipped,
                             totalerrors))
+        if db is not None:
+            # the dates in error are fetched again by the next run
+            db.record({retVal['date']: retVal['version']
+                       for retVal in retVals if retVal['status'] == 'ok'})
+            version2dates = db.versions(rversion, fromdate, todate)
+        endtime = time.time()
+        timeelapsed = endtime - starttime
+        logger.info('Time elapsed: {0:.3f} seconds.'.format(timeelapsed))
+        return version2dates
+
+    def bisect_snapshots(self, rversion, db=None, fromdate=None,
+                         todate=None):
+        """
+        Dictionary R version -> list of snapshot dates, for a single R
+        version.
+
+        The R version of the snapshots only grows with their date: the
+        first and last snapshots of the version are found by binary
+        search over the sorted dates, fetching a few dozen banners
+        instead of all of them.
+
+        :param rversion: the version of R, as "x.y.z"
+        :param db: SnapshotDB of the already known R versions, the
+            banners fetched are recorded in it
+        :param fromdate: only search the snapshots from this date
+        :param todate: only search the snapshots until this date
+        """
+        starttime = time.time()
+        self._ensure_connection()
+        snapshots = self._snapshot_dates()
+        if snapshots is None:
+            snapshots = []
+        snapshots = sorted([x for x in snapshots
+                            if CRAN._in_range(x[0], fromdate, todate)])
+        date2version = dict()
+        if db is not None:
+            for version, dates in db.versions(fromdate=fromdate,
+                                              todate=todate).items():
+                for date in dates:
+                    date2version[date] = version
+        fetched = dict()
+        target = Utils.versionkey(rversion)
+
+        def versionat(i):
+            date, href = snapshots[i]
+            if date not in date2version:
+                retVal = self._ls_snapshot(href, None, date)
+                if retVal['status'] == 'ok':
+                    date2version[date] = retVal['version']
+                    fetched[date] = retVal['version']
+                else:
+                    date2version[date] = None
+            return date2version[date]
+
+        def bound(strict):
+            # first snapshot whose R version is after (strict) or not
+            # before the searched one
+            lo = 0
+            hi = len(snapshots)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                # skip the snapshots whose banner cannot be parsed
+                i = mid
+                while i < hi and versionat(i) is None:
+                    i = i + 1
+                if i == hi:
+                    hi = mid
+                    continue
+                key = Utils.versionkey(versionat(i))
+                if key > target or (not strict and key == target):
+                    hi = i
+                else:
+                    lo = i + 1
+            return lo
+
+        first = bound(False)
+        last = bound(True)
+        version2dates = dict()
+        if first < last:
+            version2dates[rversion] = [date for date, href
+                                       in snapshots[first:last]]
+        logger.info("{0} snapshot banners fetched out of {1} dates."
+                    .format(len(fetched), len(snapshots)))
+        if db is not None:
+            db.record(fetched)
         endtime = time.time()
         timeelapsed = endtime - starttime
         logger.info('Time elapsed: {0:.3f} seconds.'.format(timeelapsed))
         return version2dates
 
     def _ls_snapshot(self, href, rversion, date):
-        r2 = requests.get(href)
-        soup2 = BeautifulSoup(r2.text, 'html.parser')
-        anchors2 = soup2.findAll('a')
-        regex = re.compile(".*(R-).*(.tar.gz)")
+        r2 = self._get(href)
         # example of matches:
-        # ['<a href="src/base/R-3/R-3.1.1.tar.gz">R-3.1.1.tar.gz']
-        matches = [m.group(0) for l in anchors2
-                   for m in [regex.search(str(l))] if m]
+        # ['3.1.1'] from <a href="src/base/R-3/R-3.1.1.tar.gz">
+        matches = [m.group(1) for link in HtmlLinks.hrefs(r2.text)
+                   for m in [R_TARBALL.search(link)] if m]
         if not len(matches) == 1:
             logger.info("Snapshot \"{0}\": "
                         "Could not parse the R version number "
                         "from the html page!".format(date))
             sys.stdout.flush()
             return {"status": "error", "version": "?", "date": date}
-        soup3 = BeautifulSoup(matches[0], 'html.parser')
-        version_full = str(soup3.findAll('a')[0].contents[0])
-        # remove "R-" and ".tar.gz" from "R-X.Y.Z.tar.gz"
-        version = version_full.replace("R-", "").replace(".tar.gz", "")
+        version = matches[0]
         if version == rversion or rversion is None:
             return {"status": "ok", "version": version, "date": date}
         else:
@@ -182,28 +395,21 @@ class CRAN(AbstractPackageRepository):
             #           .format(date, version))
             return {"status": "skipped", "version": version, "date": date}
 
-    def ls(self, snapshot_date, packagenamesonly=False):
+    def _fetch_tarballs(self, snapshot_date):
         """
-        List available packages (tarballs) given a MRAN snapshot date.
-        The list of valid snapshot dates can be fetched with ls_snapshots().
-        Return a list of tarballs by default.
-        If packagenamesonly is set to True, only names are returned.
+        Parse the tarballs out of the packages page of a snapshot,
+        None if the page cannot be fetched.
         """
-        if not self.check_connection(numtries=3, verbose=False):
-            raise FileNotFoundError(errno.ENOENT,
-                                    os.strerror(errno.ENOENT),
-                                    self.baseurl)
-        r = requests.get(self.get_mran_packages_url(snapshot_date))
+        self._ensure_connection()
+        r = self._get(self.get_mran_packages_url(snapshot_date))
         if not r.status_code == 200:
             logger.error(
                 "Cannot open MRAN packages URL, "
                 "HTTP status code {0}: {1}"
                 .format(r.status_code,
                         self.get_mran_packages_url(snapshot_date)))
-        soup = BeautifulSoup(r.text, 'html.parser')
-        tarballs = []
-        anchors = soup.findAll('a')
-        allhrefs = [str(anchor['href']) for anchor in anchors][1:]
+            return None
+        allhrefs = HtmlLinks.hrefs(r.text)[1:]
         # select tarballs only (R packages)
         regex = re.compile(".*(.tar.gz)")
         tarballs = [m.group(0) for l in allhrefs
@@ -212,6 +418,85 @@ class CRAN(AbstractPackageRepository):
             logger.error(
                 "Could not parse the R package names "
                 "(tarballs) from the html page!")
+            return None
+        return tarballs
+
+    def _fetch_packages_index(self, snapshot_date):
+        """
+        Records of the PACKAGES index of a snapshot, None if the index
+        cannot be fetched.
+        """
+        url = self.get_mran_packages_index_url(snapshot_date)
+        try:
+            r = self._get(url)
+            if r.status_code == 200:
+                return PackagesIndex.fromcontent(r.content).records
+            logger.warning('Cannot open the MRAN packages index, '
+                           'HTTP status code {0}: {1}'
+                           .format(r.status_code, url))
+        except Exception as e:
+            logger.warning('Cannot read the MRAN packages index {0}: {1}'
+                           .format(url, e))
+        return None
+
+    def packages_index(self, snapshot_date):
+        """
+        PackagesIndex of a snapshot, downloaded once and then served
+        from the cache. None if the index is not used or not available,
+        the html pages and the tarballs are parsed instead.
+        """
+        if not self.usepackagesindex:
+            return None
+        index = self._packagesindexes.get(snapshot_date)
+        if index is None:
+            key = self.get_mran_packages_index_url(snapshot_date)
+            records = self._listingcache.get(key)
+            if records is None:
+                records = self._fetch_packages_index(snapshot_date)
+                if records:
+                    self._listingcache.put(key, records)
+            index = PackagesIndex(records) if records else False
+            self._packagesindexes[snapshot_date] = index
+        return index if index else None
+
+    def _snapshot_tarballs(self, snapshot_date):
+        """
+        Tarballs of a snapshot, the packages index or the packages page
+        is parsed once and then served from the cache.
+        """
+        index = self.packages_index(snapshot_date)
+        if index is not None:
+            return index.tarballs
+        key = self.get_mran_packages_url(snapshot_date)
+        tarballs = self._listingcache.get(key)
+        if tarballs is None:
+            tarballs = self._fetch_tarballs(snapshot_date)
+            if tarballs is None:
+                return []
+            self._listingcache.put(key, tarballs)
+        return tarballs
+
+    def _snapshot_index(self, snapshot_date):
+        """
+        Dictionary package name -> tarballs of a snapshot.
+        """
+        index = self._tarballsbyname.get(snapshot_date)
+        if index is None:
+            index = {}
+            for tarball in self._snapshot_tarballs(snapshot_date):
+                index.setdefault(tarball.split('_')[0], []).append(tarball)
+            if index:
+                self._tarballsbyname[snapshot_date] = index
+        return index
+
+    def ls(self, snapshot_date, packagenamesonly=False):
+        """
+        List available packages (tarballs) given a MRAN snapshot date.
+        The list of valid snapshot dates can be fetched with ls_snapshots().
+        Return a list of tarballs by default.
+        If packagenamesonly is set to True, only names are returned.
+        """
+        tarballs = self._snapshot_tarballs(snapshot_date)
         logger.info("Number of R packages available: {0}"
                     .format(len(tarballs)))
         if packagenamesonly:
@@ -220,7 +505,7 @@ class CRAN(AbstractPackageRepository):
                      for p in tarballs]
             return names
         else:
-            return tarballs
+            return list(tarballs)
 
     def find(self, pattern, snapshot_date):
         """
@@ -233,16 +518,47 @@ class CRAN(AbstractPackageRepository):
         dot are special cases that are not matched by '*' and '?'
         patterns.
         """
-        if not self.check_connection(numtries=3, verbose=False):
-            raise FileNotFoundError(errno.ENOENT,
-                                    os.strerror(errno.ENOENT),
-                                    self.baseurl)
-        matches = []
-        files = self.ls(snapshot_date)
-        for entry in files:
-            if fnmatch.fnmatch(entry, pattern):
-                matches.append(entry)
-        return matches
+        # "name_*.tar.gz" and exact tarball names are looked up by
+        # package name
+        m = re.match(r'^([^*?\[\]_]+)(_\*\.tar\.gz|_[^*?\[\]]+)$', pattern)
+        if m:
+            tarballs = self._snapshot_index(snapshot_date).get(
+                m.group(1), [])
+            return [x for x in tarballs if fnmatch.fnmatch(x, pattern)]
+        return [x for x in self._snapshot_tarballs(snapshot_date)
+                if fnmatch.fnmatch(x, pattern)]
+
+    def delta(self, fromdate, todate):
+        """
+        Tarballs added or changed between two snapshots, and tarballs
+        removed. The tarballs of a new version have another name, the
+        checksums of the packages indexes catch the ones rebuilt under
+        the same name.
+
+        :param fromdate: the snapshot date already mirrored
+        :param todate: the snapshot date to mirror
+        returns:
+        a tuple (tarballs of todate to transfer, tarballs of fromdate
+        which are not in todate)
+        """
+        oldtarballs = set(self.ls(fromdate))
+        newtarballs = self.ls(todate)
+        oldindex = self.packages_index(fromdate)
+        newindex = self.packages_index(todate)
+        changed = []
+        for tarball in newtarballs:
+            if tarball not in oldtarballs:
+                changed.append(tarball)
+            elif oldindex is not None and newindex is not None:
+                name = tarball.split('_')[0]
+                if oldindex.md5sum(name) != newindex.md5sum(name):
+                    changed.append(tarball)
+        newtarballs = set(newtarballs)
+        removed = sorted([x for x in oldtarballs if x not in newtarballs])
+        logger.info('Snapshot {0} since {1}: {2} packages added or changed, '
+                    '{3} removed.'
+                    .format(todate, fromdate, len(changed), len(removed)))
+        return changed, removed
 
     def _get_package_download_url(self, snapshot_date, packagename):
         tarballs = []
@@ -266,6 +582,16 @@ class CRAN(AbstractPackageRepository):
         else:
             return self.get_mran_package_url(snapshot_date, tarballs[0])
 
+    def _index_checksums(self, snapshot_date, tarball):
+        """
+        Checksums of a tarball from the packages index, None if unknown.
+        """
+        index = self.packages_index(snapshot_date)
+        name = tarball.split('_')[0]
+        if index is None or index.tarball(name) != tarball:
+            return None
+        return {'md5': index.md5sum(name)}
+
     def download_single(self, snapshot_date, packagename, dest):
         """
         Download a R package to the specified dest folder
@@ -275,25 +601,34 @@ class CRAN(AbstractPackageRepository):
         PackStatus.DOWNLOAD_FAILED if any download error occured
         PackStatus.NOT_FOUND if the package could not be found
         """
-        logger.info('Downloading R package: {0}'.format(packagename))
-        retVal = PackStatus.DOWNLOADED
-        url = self._get_package_download_url(snapshot_date, packagename)
+        try:
+            url = self._get_package_download_url(snapshot_date, packagename)
+        except FileNotFoundError as e:
+            logger.error('Cannot look up R package {0}: {1}'
+                         .format(packagename, e))
+            return PackStatus.DOWNLOAD_FAILED
         if url is None:
             return PackStatus.DOWNLOAD_FAILED
+        return self._download(snapshot_date, packagename, url, dest)
+
+    def _download(self, snapshot_date, packagename, url, dest):
+        logger.info('Downloading R package: {0}'.format(packagename))
+        retVal = PackStatus.DOWNLOADED
         package_tarball = os.path.basename(url)
         targetpath = os.path.join(dest, package_tarball)
-        if not self.check_connection(numtries=3, verbose=False):
-            raise FileNotFoundError(errno.ENOENT,
-                                    os.strerror(errno.ENOENT),
-                                    self.baseurl)
         try:
-            r = requests.get(url, stream=True)
-            with open(targetpath, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=1024):
-                    if chunk:  # filter out keep-alive new chunks
-                        f.write(chunk)
+            self._ensure_connection()
+            DownloadSink.fetch(
+                lambda u, h: self._get(u, stream=True, headers=h),
+                url,
+                targetpath,
+                self._index_checksums(snapshot_date, package_tarball))
             logger.info('Done downloading R package: {0}'.format(packagename))
             retVal = PackStatus.DOWNLOADED
+        except DownloadError as e:
+            logger.error('Error downloading R package: {0}\nURL: {1}\n{2}'
+                         .format(packagename, url, e))
+            retVal = PackStatus.DOWNLOAD_FAILED
         except Exception:
             error_message = 'Error downloading R package: {0}\n{1}\n{2}\n{3}' \
                 .format(packagename,
@@ -303,45 +638,62 @@ class CRAN(AbstractPackageRepository):
             logger.error(error_message)
             # retVal = error_message
             retVal = PackStatus.DOWNLOAD_FAILED
-        # check tarball size
-        if retVal == PackStatus.DOWNLOADED:
-            if os.path.getsize(targetpath) == 0:
-                retVal = PackStatus.DOWNLOAD_FAILED
-                error_message = "The downloaded package has a zero size: " \
-                                "{0}\nURL: {1}" \
-                                .format(targetpath, url)
-                logger.error(error_message)
         return retVal
 
-    def download_multiple(self, snapshot_date, packagenames, dest, procs=10):
+    def download_multiple(self, snapshot_date, packagenames, dest, procs=10,
+                          callback=None):
         """
         Download R packages given their names.
 
         Multiple downloads can be launched in parrallel with
         the procs parameter.
+        :param callback: function called with the index of a package and
+            its PackStatus as soon as its download is done
+        """
+        logger.info('Selecting the MRAN snapchot: {0}'.format(snapshot_date))
+        # parse the snapshot listing once before the downloads share it
+        self._snapshot_index(snapshot_date)
+        return self._download_all(
+            self.download_single,
+            [(snapshot_date, packagename, dest)
+             for packagename in packagenames],
+            procs,
+            callback)
+
+    def download_tarballs(self, snapshot_date, tarballs, dest, procs=10,
+                          callback=None):
+        """
+        Download R packages given their tarball names, as listed by
+        ls(). The download URLs are built directly, without looking the
+        packages up in the listing of the snapshot.
+
+        :param callback: function called with the index of a tarball and
+            its PackStatus as soon as its download is done
         """
+        logger.info('Selecting the MRAN snapchot: {0}'.format(snapshot_date))
+        # fetch the packages index once before the downloads share
+        # its checksums
+        self.packages_index(snapshot_date)
+        return self._download_all(
+            self._download,
+            [(snapshot_date,
+              tarball,
+              self.get_mran_package_url(snapshot_date, tarball),
+              dest)
+             for tarball in tarballs],
+            procs,
+            callback)
+
+    def _download_all(self, fn, argslist, procs, callback):
         starttime = time.time()
-        totalnumofpacks = len(packagenames)
+        totalnumofpacks = len(argslist)
         totaldownloaded = 0
-        # urls = []
-        targetpaths = []
-        snapshot_dates = []
-        logger.info('Selecting the MRAN snapchot: {0}'.format(snapshot_date))
-        for idx, packagename in enumerate(packagenames):
-            targetpaths.append(dest)
-            snapshot_dates.append(snapshot_date)
-        # multiprocessing.cpu_count()
-        pool = multiprocessing.Pool(processes=procs)
-        # submit all processes at once and retrieve the results
-        # as soon as they are finished
-        results = [pool.apply_async(self.download_single,
-                                    args=(snapshot_dates[i],
-                                          packagenames[i],
-                                          targetpaths[i]))
-                   for i in range(0, totalnumofpacks)]
-        retVals = [res.get() for res in results]
-        # avoid zombies and release the memory
-        pool.close()
+        retVals = transfer.engine().run(
+            fn,
+            argslist,
+            hosts=transfer.TransferEngine.host(self.baseurl),
+            callback=callback,
+            workers=procs)
         for retVal in retVals:
             # if retVal == 'ok':
             if retVal == PackStatus.DOWNLOADED:
@@ -364,6 +716,16 @@ class CRAN(AbstractPackageRepository):
         raise NotImplementedError('Uploading is not implemented for CRAN')
 
     def packinfo(self, packagename, snapshot_date, keeptempfiles=False):
+        index = self.packages_index(snapshot_date)
+        if index is not None and not keeptempfiles:
+            # no tarball is downloaded
+            tarballs = self.find(packagename if ".tar.gz" in packagename
+                                 else "{}_*.tar.gz".format(packagename),
+                                 snapshot_date)
+            if len(tarballs) == 1:
+                packinfo = index.packinfo(tarballs[0].split('_')[0])
+                logger.debug("PACKINFO: " + str(packinfo.as_dict))
+                return packinfo
         tarballs = None
         # TODO this can be done in a smarter way
         if ".tar.gz" in packagename:
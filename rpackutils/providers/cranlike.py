@@ -0,0 +1,467 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import re
+import errno
+import sys
+import shutil
+import logging
+import tempfile
+import fnmatch
+import traceback
+import requests
+
+from ..provider import AbstractPackageRepository
+from ..packinfo import PackInfo
+from ..packinfo import PackStatus
+from ..utils import Utils
+from .. import transfer
+from ..downloadsink import DownloadSink
+from ..downloadsink import DownloadError
+from ..httpsession import HttpSession
+from ..httpsession import POOL_SIZE
+from ..httpsession import RETRIES
+from ..httpsession import RETRY_BACKOFF_SEC
+from ..listingcache import ListingCache
+from ..listingcache import LISTING_TTL_SEC
+from ..packagesindex import PackagesIndex
+from ..circuitbreaker import CircuitBreaker
+from ..htmllinks import HtmlLinks
+
+logger = logging.getLogger(__name__)
+
+# path of the packages sources below baseurl/repo
+CONTRIB_PATH = 'src/contrib'
+# folder of the previous versions of the packages, below the contrib one
+ARCHIVE_FOLDER = 'Archive'
+PACKAGES_INDEXES = ['PACKAGES.gz', 'PACKAGES']
+TARBALL = re.compile(r'^([^_/]+)_([^_/]+)\.tar\.gz$')
+
+
+class CRANLike(AbstractPackageRepository):
+    def __init__(self, baseurl, repos=None, contribpath=CONTRIB_PATH,
+                 verify=True, poolsize=POOL_SIZE, timeout=None,
+                 retries=RETRIES, backoff=RETRY_BACKOFF_SEC,
+                 cachedir=None, cachettl=LISTING_TTL_SEC):
+        """
+        Any CRAN-like repository: a CRAN mirror, a Posit Package
+        Manager snapshot or an internal mirror. The packages are read
+        from the PACKAGES index of baseurl/repo/contribpath, their
+        previous versions from its Archive/<package>/ folders.
+
+        :param baseurl: example 'https://packagemanager.posit.co/cran'
+        :param repos: list of the folders below baseurl, like the
+            snapshot dates '2023-01-03' or 'latest', None or an empty
+            list if baseurl holds the contrib folder itself
+        :param contribpath: path of the contrib folder below
+            baseurl/repo, empty if it is baseurl/repo itself
+        :param verify: path to the SSL certificate, False to bypass the
+            verification
+        :param poolsize: number of connections kept alive
+        :param timeout: default timeout of the requests in seconds
+        :param retries: number of retries on connection errors, 429 and 5xx
+        :param backoff: backoff factor in seconds between retries
+        :param cachedir: folder where to cache the packages indexes
+            between runs, None to cache them in memory only
+        :param cachettl: seconds during which a cached index is valid
+        """
+        super().__init__('cranlike', baseurl, repos if repos else [])
+        self.contribpath = contribpath.strip('/') if contribpath else ''
+        self.verify = verify
+        self._http = HttpSession(verify=verify,
+                                 poolsize=poolsize,
+                                 timeout=timeout,
+                                 retries=retries,
+                                 backoff=backoff)
+        self._listingcache = ListingCache(cachedir, cachettl)
+        # repo -> PackagesIndex, False if it is not available
+        self._packagesindexes = {}
+        # health of the server, updated by the requests
+        self._health = CircuitBreaker(baseurl)
+
+    @property
+    def as_dict(self):
+        return self.__dict__
+
+    @property
+    def poolsize(self):
+        return self._http.poolsize
+
+    @poolsize.setter
+    def poolsize(self, poolsize):
+        self._http.resize(poolsize)
+
+    def _get(self, url, **kwargs):
+        """
+        Send a GET request and record its outcome in the health of the
+        server. Raise a FileNotFoundError if the server is known to be
+        down and no probe is due.
+        """
+        if self._health.is_open and not self._health.probe_due():
+            raise FileNotFoundError(errno.ENOENT,
+                                    os.strerror(errno.ENOENT),
+                                    self.baseurl)
+        try:
+            r = self._http.get(url, **kwargs)
+        except requests.RequestException:
+            self._health.record_failure()
+            raise
+        if r.status_code >= 500:
+            self._health.record_failure()
+        else:
+            self._health.record_success()
+        return r
+
+    def check_connection(self, numtries=3, verbose=True):
+        """
+        Returns True if the contrib folder of every repository can be
+        reached. False otherwise.
+        """
+        for repo in self._repos():
+            try:
+                if verbose:
+                    logger.info('Checking connection to {0} ...'
+                                .format(self.contrib_url(repo)))
+                if self.packages_index(repo) is None:
+                    return False
+            except Exception as e:
+                logger.error('FATAL: Cannot connect to {0}: {1}'
+                             .format(self.contrib_url(repo), e))
+                return False
+            if verbose:
+                logger.info('Connection to {0} established.'
+                            .format(self.contrib_url(repo)))
+        return True
+
+    def _repos(self):
+        return self.repos if self.repos else ['']
+
+    def contrib_url(self, repo=''):
+        """
+        URL of the contrib folder of a repository, with a trailing /.
+        """
+        url = Utils.concaturls(self.baseurl, repo) if repo else self.baseurl
+        if self.contribpath:
+            url = Utils.concaturls(url, self.contribpath)
+        return url.rstrip('/') + '/'
+
+    @staticmethod
+    def _path(repo, relpath):
+        return Utils.concaturls(repo, relpath) if repo else relpath
+
+    def _split(self, path):
+        """
+        Repository and path below its contrib folder of a path returned
+        by ls() or find().
+        """
+        for repo in sorted(self.repos, key=len, reverse=True):
+            if path.startswith(repo + '/'):
+                return repo, path[len(repo) + 1:]
+        return self._repos()[0], path
+
+    def _fetch_packages_index(self, repo):
+        """
+        Records of the PACKAGES index of a repository, None if the index
+        cannot be fetched.
+        """
+        status_code = None
+        for filename in PACKAGES_INDEXES:
+            url = Utils.concaturls(self.contrib_url(repo), filename)
+            try:
+                r = self._get(url)
+                status_code = r.status_code
+                if r.status_code == 200:
+                    index = PackagesIndex.fromcontent(r.content)
+                    logger.info('{0} packages listed in {1}'
+                                .format(len(index), url))
+                    return index.records
+            except Exception as e:
+                # a corrupt index, the next one may still be read
+                logger.error('Cannot read the packages index {0}: {1}'
+                             .format(url, e))
+                continue
+        logger.error('Cannot fetch the packages index of {0}, '
+                     'HTTP status code {1}'
+                     .format(self.contrib_url(repo), status_code))
+        return None
+
+    def packages_index(self, repo=''):
+        """
+        PackagesIndex of a repository, downloaded once and then served
+        from the cache. None if it is not available.
+        """
+        index = self._packagesindexes.get(repo)
+        if index is None:
+            key = Utils.concaturls(self.contrib_url(repo),
+                                   PACKAGES_INDEXES[0])
+            records = self._listingcache.get(key)
+            if records is None:
+                records = self._fetch_packages_index(repo)
+                if records:
+                    self._listingcache.put(key, records)
+            index = PackagesIndex(records) if records else False
+            self._packagesindexes[repo] = index
+        return index if index else None
+
+    def invalidate_cache(self, repo=None):
+        """
+        Forget the packages indexes, of a repository or of all of them.
+        """
+        repos = [repo] if repo is not None else self._repos()
+        for r in repos:
+            self._packagesindexes.pop(r, None)
+            self._listingcache.invalidate(Utils.concaturls(
+                self.contrib_url(r), PACKAGES_INDEXES[0]))
+
+    def ls(self, packagenamesonly=False):
+        """
+        List the current packages (tarballs) of all the repositories,
+        prefixed with their repository name.
+        """
+        if packagenamesonly:
+            names = []
+            for repo in self._repos():
+                index = self.packages_index(repo)
+                names.extend(index.names() if index else [])
+            return names
+        tarballs = []
+        for repo in self._repos():
+            index = self.packages_index(repo)
+            tarballs.extend([CRANLike._path(repo, x)
+                             for x in (index.tarballs if index else [])])
+        return tarballs
+
+    def archive(self, packagename, repo=''):
+        """
+        Tarballs of the previous versions of a package, from the
+        Archive/<package>/ folder of a repository, prefixed with the
+        repository name.
+        """
+        relpath = '{0}/{1}/'.format(ARCHIVE_FOLDER, packagename)
+        url = Utils.concaturls(self.contrib_url(repo), relpath)
+        tarballs = self._listingcache.get(url)
+        if tarballs is None:
+            try:
+                r = self._get(url)
+            except Exception as e:
+                logger.error('Cannot list the archive of {0}: {1}'
+                             .format(packagename, e))
+                return []
+            if r.status_code != 200:
+                logger.debug('No archive for {0}, HTTP status code {1}'
+                             .format(packagename, r.status_code))
+                return []
+            tarballs = [x for x in HtmlLinks.hrefs(r.text)
+                        for m in [TARBALL.match(x)]
+                        if m and m.group(1) == packagename]
+            self._listingcache.put(url, tarballs)
+        return [CRANLike._path(repo, relpath + x) for x in tarballs]
+
+    def find(self, pattern):
+        """
+        Return a list of repository paths matching a filename pattern,
+        prefixed with their repository name. The pattern may contain
+        shell-style wildcards a la fnmatch.
+
+        Wildcards only match the current packages of the indexes, an
+        exact tarball name which is not current is looked up in the
+        Archive folder of the package.
+        """
+        m = TARBALL.match(pattern)
+        matches = []
+        for repo in self._repos():
+            index = self.packages_index(repo)
+            if index is None:
+                continue
+            if m and not re.search(r'[*?\[\]]', pattern):
+                name = m.group(1)
+                if index.tarball(name) == pattern:
+                    matches.append(CRANLike._path(repo, pattern))
+                else:
+                    matches.extend([x for x in self.archive(name, repo)
+                                    if x.endswith('/' + pattern)])
+                continue
+            m2 = re.match(r'^([^*?\[\]_]+)_\*\.tar\.gz$', pattern)
+            if m2:
+                # "name_*.tar.gz" is looked up by package name
+                tarball = index.tarball(m2.group(1))
+                if tarball:
+                    matches.append(CRANLike._path(repo, tarball))
+                continue
+            matches.extend([CRANLike._path(repo, x) for x in index.tarballs
+                            if fnmatch.fnmatch(x, pattern)])
+        return matches
+
+    def _resolve(self, packagename):
+        """
+        Path of a package given as "name", "name_1.0.tar.gz" or as a
+        path returned by find(). The most recent version is taken when
+        several repositories hold it. None if it is not found.
+        """
+        if TARBALL.match(os.path.basename(packagename)) and \
+                '/' in packagename:
+            return packagename
+        if '.tar.gz' in packagename:
+            paths = self.find(packagename)
+        else:
+            paths = self.find('{0}_*.tar.gz'.format(packagename))
+        if not paths:
+            return None
+        return max(paths, key=lambda x: Utils.versionkey(
+            TARBALL.match(os.path.basename(x)).group(2)))
+
+    def _checksums(self, repo, relpath):
+        """
+        Checksums of a current tarball from the packages index, None
+        for the archived ones.
+        """
+        m = TARBALL.match(relpath)
+        index = self.packages_index(repo)
+        if m is None or index is None or \
+                index.tarball(m.group(1)) != relpath:
+            return None
+        md5 = index.md5sum(m.group(1))
+        return {'md5': md5} if md5 else None
+
+    def download_single(self, packagename, dest):
+        """
+        Download a R package to the specified dest folder.
+        returns:
+        PackStatus.DOWNLOADED upon success
+        PackStatus.DOWNLOAD_FAILED if any download error occured
+        PackStatus.NOT_FOUND if the package could not be found
+        """
+        path = self._resolve(packagename)
+        if path is None:
+            logger.error('Package {0} not found!'.format(packagename))
+            return PackStatus.NOT_FOUND
+        logger.info('Downloading R package: {0}'.format(packagename))
+        repo, relpath = self._split(path)
+        url = Utils.concaturls(self.contrib_url(repo), relpath)
+        targetpath = os.path.join(dest, os.path.basename(relpath))
+        try:
+            DownloadSink.fetch(
+                lambda u, h: self._get(u, stream=True, headers=h),
+                url,
+                targetpath,
+                self._checksums(repo, relpath))
+            logger.info('Done downloading R package: {0}'.format(packagename))
+            retVal = PackStatus.DOWNLOADED
+        except DownloadError as e:
+            logger.error('Error downloading R package: {0}\nURL: {1}\n{2}'
+                         .format(packagename, url, e))
+            retVal = PackStatus.DOWNLOAD_FAILED
+        except Exception:
+            error_message = 'Error downloading R package: {0}\n{1}\n{2}\n{3}' \
+                .format(packagename,
+                        url,
+                        sys.exc_info()[0],
+                        traceback.extract_tb(sys.exc_info()[2]))
+            logger.error(error_message)
+            retVal = PackStatus.DOWNLOAD_FAILED
+        return retVal
+
+    def download_multiple(self, packagenames, dest, procs=10,
+                          callback=None):
+        """
+        Download R packages given their names, tarball names or paths.
+        The same tarball listed in several repositories is downloaded
+        once, from the first of them, its status is returned for each.
+
+        :param callback: function called with the index of a package and
+            its PackStatus as soon as its download is done
+        """
+        # read the indexes once before the downloads share them
+        for repo in self._repos():
+            self.packages_index(repo)
+        # the downloads of a same file would write the same target
+        unique = []
+        # index in unique -> indexes in packagenames
+        duplicates = {}
+        firsts = {}
+        for i, packagename in enumerate(packagenames):
+            basename = os.path.basename(packagename)
+            if basename not in firsts:
+                firsts[basename] = len(unique)
+                unique.append(packagename)
+            duplicates.setdefault(firsts[basename], []).append(i)
+        if len(unique) < len(packagenames):
+            logger.info('{0} packages listed in several repositories are '
+                        'downloaded once'
+                        .format(len(packagenames) - len(unique)))
+
+        def done(i, status):
+            for j in duplicates[i]:
+                callback(j, status)
+
+        uniqueRetVals = transfer.engine().run(
+            self.download_single,
+            [(packagename, dest) for packagename in unique],
+            hosts=transfer.TransferEngine.host(self.baseurl),
+            callback=done if callback else None,
+            workers=procs)
+        retVals = [None] * len(packagenames)
+        for i, retVal in enumerate(uniqueRetVals):
+            for j in duplicates[i]:
+                retVals[j] = retVal
+        totaldownloaded = len([x for x in retVals
+                               if x == PackStatus.DOWNLOADED])
+        logger.info("{0}/{1} packages done."
+                    .format(totaldownloaded, len(packagenames)))
+        if totaldownloaded < len(packagenames):
+            logger.error('Failed to download all R packages')
+        return retVals
+
+    def upload_single(self, filepath, repo, overwrite=False,
+                      overwritepackages=None):
+        raise NotImplementedError(
+            'Uploading is not implemented for CRAN-like repositories')
+
+    def upload_multiple(self, filepaths, repo, overwrite=False,
+                        overwritepackages=None):
+        raise NotImplementedError(
+            'Uploading is not implemented for CRAN-like repositories')
+
+    def packinfo(self, packagename, keeptempfiles=False):
+        """
+        :param packagename: can be one of "methods",
+                            "methods_1.2.3.tar.gz" or a path returned
+                            by find()
+        """
+        path = self._resolve(packagename)
+        if path is None:
+            logger.error('Package {} not FOUND'.format(packagename))
+            packinfo = PackInfo(packagename)
+            packinfo.status = PackStatus.NOT_FOUND
+            packinfo.fullstatus = 'Package not found'
+            return packinfo
+        repo, relpath = self._split(path)
+        m = TARBALL.match(relpath)
+        index = self.packages_index(repo)
+        if not keeptempfiles and m and index is not None and \
+                index.tarball(m.group(1)) == relpath:
+            # no tarball is downloaded
+            packinfo = index.packinfo(m.group(1))
+            logger.debug("PACKINFO: " + str(packinfo.as_dict))
+            return packinfo
+        # download tarball prior to create the PackInfo object
+        dest = tempfile.mkdtemp()
+        tarballpath = os.path.join(dest, os.path.basename(relpath))
+        retVal = self.download_single(path, dest)
+        if retVal == PackStatus.DOWNLOADED:
+            packinfo = PackInfo(tarballpath)
+            packinfo.tempdir = dest
+            packinfo.packagepath = tarballpath
+            logger.debug("PACKINFO: " + str(packinfo.as_dict))
+        else:
+            packinfo = PackInfo(packagename)
+            packinfo.tempdir = dest
+            packinfo.status = PackStatus.DOWNLOAD_FAILED
+            packinfo.fullstatus = 'Failed to download package ' \
+                + packagename
+        if os.path.exists(dest) and not keeptempfiles:
+            shutil.rmtree(dest)
+        return packinfo
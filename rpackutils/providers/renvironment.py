@@ -9,32 +9,66 @@ import tempfile
 import subprocess
 import shutil
 import glob
+import copy
 import datetime
+import time
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import wait
 
 from ..provider import AbstractREnvironment
 from ..packinfo import PackStatus
 from ..packinfo import PackInfo
-from ..rbasepackages import RBasePackages
 from ..utils import Utils
 from ..depsmanager import PackNode
 from ..license import License
-# from ..command import Command
+from ..libraryindex import LibraryIndex
+from ..command import Command
 
-# INSTALL_TIMEOUT_SEC = 240
+# default wall-clock timeout of a single package installation
+INSTALL_TIMEOUT_SEC = 3600
+# messages denoting a failed installation, even with a zero return code
+INSTALL_FAILURE_MARKERS = ['Execution halted', 'failed', 'FAILED', 'ERROR:']
+# prefix of the staging folders created inside the target library, the
+# leading dot hides them from ls() and find()
+STAGING_PREFIX = '.rpackutils_staging_'
+# output formats of the installation in dry-run mode
+DRYRUN_FORMATS = ['script', 'makefile']
+MAKEFILE_HEADER = '''\
+# R packages installation generated by RPackUtils.
+# Run "make -j N" in this folder to install up to N packages
+# concurrently, each package once its dependencies are installed.
+R := {}
+LIBRARY := {}
+
+.PHONY: all
+all:
+'''
 logger = logging.getLogger(__name__)
 
 
 class REnvironment(AbstractREnvironment):
 
-    def __init__(self, rhome, librarypath, licensecheck=False):
+    def __init__(self, rhome, librarypath, licensecheck=False,
+                 installtimeout=INSTALL_TIMEOUT_SEC, logdir=None,
+                 ncpus=None, makeflags=None):
         """
         Define a R environment.
 
         :param rhome: example /home/john/R-3.1.2
         :param librarypath: a relative path from rhome like
             'lib64/R/library' or any absolute path
+        :param licensecheck: check licenses before installing packages
+        :param installtimeout: seconds after which an installation is
+            killed, None or 0 to wait forever
+        :param logdir: folder where to write the installation logs,
+            a temp folder is created by default
+        :param ncpus: number of cores used to compile a package, by
+            default the available cores are split between the
+            concurrent installations
+        :param makeflags: additional flags passed to make via MAKEFLAGS
         """
         super().__init__('renvironment', rhome, librarypath)
         if not os.path.exists(rhome):
@@ -55,24 +89,93 @@ class REnvironment(AbstractREnvironment):
                                     os.strerror(errno.ENOENT),
                                     self._Rbinarypath)
         self._licensecheck = licensecheck
+        self._installtimeout = installtimeout if installtimeout else None
+        self._logdir = logdir
+        self._ncpus = ncpus if ncpus else None
+        self._makeflags = makeflags
+        self._index = LibraryIndex(self._repofullpath)
+        # Makefile path -> targets written to it, kept in memory during
+        # a dry run rather than parsing the Makefile for every package
+        self._makefiletargets = {}
 
     @property
     def as_dict(self):
         return self.__dict__
 
+    @property
+    def logdir(self):
+        """
+        Folder where the installation logs are written.
+        """
+        if self._logdir is None:
+            self._logdir = tempfile.mkdtemp(prefix='rpackutils_logs_')
+        elif not os.path.exists(self._logdir):
+            os.makedirs(self._logdir, exist_ok=True)
+        return self._logdir
+
+    def cores_per_install(self, concurrency=1):
+        """
+        Number of cores granted to a single installation when
+        "concurrency" installations are running at the same time.
+        """
+        if self._ncpus:
+            return self._ncpus
+        return max(1, Utils.available_cpus() // max(1, concurrency))
+
+    def _install_env(self, concurrency=1):
+        """
+        Environment variables of a R CMD INSTALL process.
+        """
+        env = dict(os.environ)
+        ncpus = self.cores_per_install(concurrency)
+        makeflags = []
+        if not self._makeflags or '-j' not in self._makeflags:
+            makeflags.append('-j{}'.format(ncpus))
+        if self._makeflags:
+            makeflags.append(self._makeflags)
+        env['MAKEFLAGS'] = ' '.join(makeflags)
+        # packages are installed in a staging library, the target
+        # library must remain visible to find the dependencies
+        rlibs = [self._repofullpath]
+        if env.get('R_LIBS'):
+            rlibs.append(env['R_LIBS'])
+        env['R_LIBS'] = os.pathsep.join(rlibs)
+        # do not let multithreaded code run at build time (tests,
+        # vignettes, byte-compilation) oversubscribe the cores
+        env['OMP_NUM_THREADS'] = str(ncpus)
+        return env
+
+    @property
+    def index(self):
+        """
+        Index of the packages installed in the R environment library.
+        """
+        return self._index
+
     def ls(self, packagenamesonly=True, withBasePackages=False):
         """
-        List available packages (tarballs) with their path relative
-        to the baseurl+librarypath.
+        List the installed packages.
+
+        :param packagenamesonly: if True, return the package names,
+            otherwise return the PackInfo of each package
+        :param withBasePackages: if False, remove all R base packages
         """
-        folders = os.listdir(self._repofullpath)
-        folders = [re.sub('^/', '', x) for x in folders
-                   if os.path.exists(os.path.join(
-                       self._repofullpath, x, 'DESCRIPTION'))]
-        if not withBasePackages:
-            return [x for x in folders if x not in RBasePackages.getnames()]
-        else:
-            return folders
+        names = self._index.names(withBasePackages)
+        if packagenamesonly:
+            return names
+        return [self._index.get(x) for x in names]
+
+    def packinfo(self, packagename, keeptempfiles=False):
+        """
+        Return the PackInfo of an installed package from the index.
+        """
+        indexed = self._index.get(packagename)
+        if indexed is None:
+            # not installed or without DESCRIPTION file
+            return super().packinfo(packagename, keeptempfiles)
+        packinfo = copy.copy(indexed)
+        packinfo.status = PackStatus.DOWNLOADED
+        return packinfo
 
     def find(self, pattern):
         """
@@ -141,7 +244,7 @@ class REnvironment(AbstractREnvironment):
         return True
 
     def install_dryrun(self, packnode, dest, overwrite=False,
-                       overwritepackages=None):
+                       overwritepackages=None, outputformat='script'):
         if not isinstance(packnode, PackNode):
             msg = 'a PackNode instance is expected!'
             logger.error(msg)
@@ -152,10 +255,12 @@ class REnvironment(AbstractREnvironment):
             repo=None,
             overwrite=overwrite,
             overwritepackages=overwritepackages,
-            packagenamesonly=None)
+            packagenamesonly=None,
+            outputformat=outputformat,
+            dependencies=packnode.dependencies)
 
     def install(self, packnode, overwrite=False,
-                overwritepackages=None):
+                overwritepackages=None, concurrency=1):
         if not isinstance(packnode, PackNode):
             msg = 'a PackNode instance is expected!'
             logger.error(msg)
@@ -165,22 +270,88 @@ class REnvironment(AbstractREnvironment):
             repo=None,
             overwrite=overwrite,
             overwritepackages=overwritepackages,
-            packagenamesonly=None)
+            packagenamesonly=None,
+            concurrency=concurrency)
+
+    def install_multiple(self, packnodes, overwrite=False,
+                         overwritepackages=None, procs=1):
+        """
+        Install packages concurrently. A package is installed as soon as
+        all its dependencies part of packnodes are installed, packages
+        depending on a failed installation are not installed.
+
+        :param packnodes: list of PackNode with their dependencies set
+        :param procs: max number of concurrent installations
 
-    def _installpackage(self, packagepath):
+        return:
+        the list of PackStatus in the same order as packnodes
+        """
+        starttime = time.time()
+        procs = max(1, procs)
+        nodes = dict([(n.idt, n) for n in packnodes])
+        pending = [n.idt for n in packnodes]
+        statuses = {}
+        running = {}
+        logger.info('Installing {} packages with up to {} concurrent '
+                    'installations using {} core(s) each'
+                    .format(len(pending), procs,
+                            self.cores_per_install(procs)))
+        with ThreadPoolExecutor(max_workers=procs) as executor:
+            while pending or running:
+                for idt in list(pending):
+                    deps = [d for d in nodes[idt].dependencies
+                            if d in nodes and d != idt]
+                    failed = [d for d in deps
+                              if statuses.get(d) == PackStatus.DEPLOY_FAILED]
+                    if failed:
+                        logger.error('Not installing {}: dependencies {} '
+                                     'failed to install!'
+                                     .format(idt, ','.join(failed)))
+                        statuses[idt] = PackStatus.DEPLOY_FAILED
+                        pending.remove(idt)
+                    elif len(running) < procs \
+                            and all(d in statuses for d in deps):
+                        future = executor.submit(
+                            self.install, nodes[idt],
+                            overwrite=overwrite,
+                            overwritepackages=overwritepackages,
+                            concurrency=procs)
+                        running[future] = idt
+                        pending.remove(idt)
+                if not running:
+                    # circular dependencies, nothing can be scheduled
+                    for idt in pending:
+                        logger.error('Not installing {}: circular '
+                                     'dependencies!'.format(idt))
+                        statuses[idt] = PackStatus.DEPLOY_FAILED
+                    break
+                done, _ = wait(list(running.keys()),
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    idt = running.pop(future)
+                    try:
+                        statuses[idt] = future.result()
+                    except Exception as e:
+                        logger.error('Installation of package {} failed: {}'
+                                     .format(idt, e))
+                        statuses[idt] = PackStatus.DEPLOY_FAILED
+        retVals = [statuses[n.idt] for n in packnodes]
+        totaldeployed = len([r for r in retVals
+                             if r == PackStatus.DEPLOYED])
+        logger.info("{0}/{1} packages installed."
+                    .format(totaldeployed, len(retVals)))
+        endtime = time.time()
+        logger.info('Time elapsed: {0:.3f} seconds.'
+                    .format(endtime - starttime))
+        return retVals
+
+    def _installpackage(self, packagepath, library=None, concurrency=1):
         # Perform a license check
         packInfo = PackInfo(packagepath)
         if(packInfo.status == PackStatus.INVALID):
             message = 'Cannot install {}: {}' \
                       .format(packagepath, packInfo.fullstatus)
             return (-1, message, message)
-        # TODO: this is ugly, let's find a better solution
-        # the process never terminates
-        if(packInfo.name == 'nloptr'):
-            message = 'Cannot install {}: ' \
-                      'the package is known to be a problem!' \
-                      .format(packInfo.name)
-            return (-1, message, message)
         if(not packInfo.installation_is_allowed):
             message = "The license \"{}\" is {} " \
                       "and the installation is not allowed!" \
@@ -195,45 +366,35 @@ class REnvironment(AbstractREnvironment):
                           packInfo.licenseclass)
             logger.warning(message)
         cmd = os.path.join(self._Rbinarypath)
+        if library is None:
+            library = self._repofullpath
         cmdargs = [cmd, 'CMD', 'INSTALL', packagepath,
-                   "--library={}".format(self._repofullpath)]
-        logger.info('Running: {}'.format(" ".join(cmdargs)))
-        p = subprocess.Popen(
-            cmdargs,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=False)
-        # communicate will wait for the process to terminate
-        # and set the returncode value
-        logger.info('Waiting for PID {} to complete...'
-                    .format(p.pid))
-        (stdout, stderr) = p.communicate()
-        returncode = p.returncode
-        # decode stdout and stderr
-        if(stdout):
-            stdout = stdout.decode()
-        if(stderr):
-            stderr = stderr.decode()
-        # apply a timeout for the installation
-        # command = Command(cmdargs)
-        # (returncode, stdout, stderr) = command.run(
-        #     INSTALL_TIMEOUT_SEC)
+                   "--library={}".format(library)]
+        logfile = os.path.join(
+            self.logdir,
+            '{}_{}.log'.format(packInfo.name, packInfo.version))
+        env = self._install_env(concurrency)
+        logger.info('Running: MAKEFLAGS=\"{}\" {}'
+                    .format(env['MAKEFLAGS'], " ".join(cmdargs)))
+        logger.info('Writing the installation log to {}'.format(logfile))
+        # the output is streamed to the log file, only the lines
+        # matching a failure marker and the last lines are kept
+        # in memory
+        command = Command(cmdargs,
+                          logfile=logfile,
+                          markers=INSTALL_FAILURE_MARKERS,
+                          env=env)
+        (returncode, stdout, stderr) = command.run(self._installtimeout)
         return (returncode, stdout, stderr)
 
-    def _installpackage_dryrun(self, packagepath, dest):
+    def _installpackage_dryrun(self, packagepath, dest,
+                               outputformat='script', dependencies=None):
         # Perform a license check
         packInfo = PackInfo(packagepath)
         if(packInfo.status == PackStatus.INVALID):
             message = 'Cannot install {}: {}' \
                       .format(packagepath, packInfo.fullstatus)
             return (-1, message, message)
-        # TODO: this is ugly, let's find a better solution
-        # the process never terminates
-        if(packInfo.name == 'nloptr'):
-            message = 'Cannot install {}: ' \
-                      'the package is known to be a problem!' \
-                      .format(packInfo.name)
-            return (-1, message, message)
         if self._licensecheck:
             license = License(packInfo.license)
             if license.blacklisted:
@@ -247,6 +408,10 @@ class REnvironment(AbstractREnvironment):
         shutil.copy(packagepath, dest)
         cmd = os.path.join(self._Rbinarypath)
         destpackagepath = os.path.join(dest, os.path.basename(packagepath))
+        if outputformat == 'makefile':
+            self._write_makefile_rule(dest, packInfo.name,
+                                      destpackagepath, dependencies)
+            return (0, 'Rule written to output Makefile', None)
         cmdargs = [cmd, 'CMD', 'INSTALL', destpackagepath,
                    "--library={}".format(self._repofullpath)]
         command = " ".join(cmdargs)
@@ -259,12 +424,64 @@ class REnvironment(AbstractREnvironment):
             stderr = None
         return (returncode, stdout, stderr)
 
+    @staticmethod
+    def _makefile_targets(makefilepath):
+        """
+        Names of the packages having a rule in the Makefile.
+        """
+        targets = set()
+        if os.path.exists(makefilepath):
+            with open(makefilepath, 'r') as f:
+                for line in f:
+                    if line.startswith('all: '):
+                        targets.add(line[len('all: '):].strip()
+                                    .replace('.installed', ''))
+        return targets
+
+    def _write_makefile_rule(self, dest, packagename, packagepath,
+                             dependencies=None):
+        """
+        Append the installation rule of a package to the Makefile.
+        The prerequisites are the dependencies having a rule, the
+        other ones are expected to be already installed.
+        """
+        makefilepath = os.path.join(dest, 'Makefile')
+        targets = self._makefiletargets.get(makefilepath)
+        if targets is None or not os.path.exists(makefilepath):
+            # a Makefile written by a previous run is parsed once
+            targets = REnvironment._makefile_targets(makefilepath)
+            self._makefiletargets[makefilepath] = targets
+        if packagename in targets:
+            return
+        prerequisites = ['{}.installed'.format(d)
+                         for d in (dependencies if dependencies else [])
+                         if d in targets]
+        target = '{}.installed'.format(packagename)
+        with open(makefilepath, 'a') as f:
+            if f.tell() == 0:
+                f.write(MAKEFILE_HEADER.format(self._Rbinarypath,
+                                               self._repofullpath))
+            f.write('\nall: {}\n'.format(target))
+            f.write('{}:{}\n'.format(
+                target, ''.join([' ' + p for p in prerequisites])))
+            f.write('\t$(R) CMD INSTALL {} --library=$(LIBRARY) '
+                    '> {}.log 2>&1\n'.format(packagepath, packagename))
+            f.write('\ttouch $@\n')
+        targets.add(packagename)
+
     def upload_single(self, filepath, repo=None, overwrite=False,
-                      overwritepackages=None, packagenamesonly=None):
+                      overwritepackages=None, packagenamesonly=None,
+                      concurrency=1):
         """
         This will install a new R package to the R environment.
 
+        The package is first installed in a private staging library and
+        then moved to the R environment library. The previous version,
+        if any, is only removed once the new one is installed.
+
         repo is not a used argument.
+        concurrency is the number of installations running at the same
+        time, it is used to compute the number of cores to use.
 
         return:
         PackStatus.DEPLOY upon success and installation of the package
@@ -282,14 +499,8 @@ class REnvironment(AbstractREnvironment):
         p = os.path.join(self._repofullpath, packagename)
         if os.path.exists(p):
             if overwrite or packagename in overwritepackages:
-                logger.info('The package is already installed')
-                try:
-                    logger.info('Uninstalling the previous version')
-                    shutil.rmtree(p, ignore_errors=False)
-                except Exception as e:
-                    logger.error('Failed to uninstall previous version: {0}'
-                                 .format(e))
-                    return PackStatus.DEPLOY_FAILED
+                logger.info('The package is already installed, the '
+                            'previous version will be replaced')
             else:
                 logger.info('The package is already installed and '
                             'overwritting is disabled')
@@ -297,17 +508,30 @@ class REnvironment(AbstractREnvironment):
                 # pack.install_date = str(datetime.datetime.fromtimestamp(ts))
                 return PackStatus.DEPLOYED
         logger.info('Installing package')
-        (res, out, err) = self._installpackage(filepath)
-        installationSuccess = self._checkInstallationSuccess(res, out, err)
-        if not installationSuccess:
-            logger.error('Installation of package {} failed!\n'
-                         '\n[STDOUT BEGINS]\n{}\n[STDOUT ENDS]\n'
-                         '\n[STDERR BEGINS]\n{}\n[STDERR ENDS]'
-                         .format(packagefullname,
-                                 out,
-                                 err))
-            return PackStatus.DEPLOY_FAILED
-        else:
+        stagingdir = tempfile.mkdtemp(prefix=STAGING_PREFIX,
+                                      dir=self._repofullpath)
+        try:
+            (res, out, err) = self._installpackage(filepath,
+                                                   stagingdir,
+                                                   concurrency)
+            installationSuccess = self._checkInstallationSuccess(
+                res, out, err)
+            if not installationSuccess:
+                logger.error('Installation of package {} failed!\n'
+                             '\n[STDOUT BEGINS]\n{}\n[STDOUT ENDS]\n'
+                             '\n[STDERR BEGINS]\n{}\n[STDERR ENDS]\n'
+                             '\nThe full output is available in {}'
+                             .format(packagefullname,
+                                     out,
+                                     err,
+                                     self.logdir))
+                return PackStatus.DEPLOY_FAILED
+            try:
+                self._promote(stagingdir, packagename)
+            except Exception as e:
+                logger.error('Failed to move package {} to the library: {}'
+                             .format(packagefullname, e))
+                return PackStatus.DEPLOY_FAILED
             # pack.fullstatus = out
             # pack.install_date = str(datetime.datetime.now())
             logger.info('Installation of package {} DONE.'
@@ -318,13 +542,49 @@ class REnvironment(AbstractREnvironment):
             #             .format(packagefullname,
             #                     out.decode()))
             return PackStatus.DEPLOYED
+        finally:
+            shutil.rmtree(stagingdir, ignore_errors=True)
+
+    def _promote(self, stagingdir, packagename):
+        """
+        Move an installed package from a staging library to the
+        R environment library. Both are on the same file system, each
+        move is an atomic rename.
+        """
+        src = os.path.join(stagingdir, packagename)
+        dst = os.path.join(self._repofullpath, packagename)
+        if not os.path.exists(os.path.join(src, 'DESCRIPTION')):
+            raise FileNotFoundError(errno.ENOENT,
+                                    os.strerror(errno.ENOENT),
+                                    src)
+        olddir = None
+        if os.path.exists(dst):
+            olddir = tempfile.mkdtemp(prefix=STAGING_PREFIX,
+                                      dir=self._repofullpath)
+            os.rename(dst, os.path.join(olddir, packagename))
+        try:
+            os.rename(src, dst)
+        except Exception:
+            if olddir:
+                logger.info('Restoring the previous version')
+                os.rename(os.path.join(olddir, packagename), dst)
+            raise
+        finally:
+            if olddir:
+                shutil.rmtree(olddir, ignore_errors=True)
+            # the folder mtime may have a coarse resolution
+            self._index.invalidate()
 
     def upload_single_dryrun(self, filepath, dest, repo=None, overwrite=False,
-                             overwritepackages=None, packagenamesonly=None):
+                             overwritepackages=None, packagenamesonly=None,
+                             outputformat='script', dependencies=None):
         """
         This will simulate the installion a new R package to the R environment.
 
         repo is not a used argument.
+        outputformat is one of "script" (install.sh, sequential) or
+        "makefile" (Makefile, one target per package with its
+        dependencies as prerequisites).
 
         return:
         PackStatus.DEPLOY upon success and installation of the package
@@ -357,7 +617,9 @@ class REnvironment(AbstractREnvironment):
                 # pack.install_date = str(datetime.datetime.fromtimestamp(ts))
                 return PackStatus.DEPLOYED
         logger.info('Installing package')
-        (res, out, err) = self._installpackage_dryrun(filepath, dest)
+        (res, out, err) = self._installpackage_dryrun(filepath, dest,
+                                                      outputformat,
+                                                      dependencies)
         installationSuccess = self._checkInstallationSuccess(res, out, err)
         if not installationSuccess:
             logger.error('Installation of package {} failed!\n'
@@ -36,6 +36,7 @@ base_packages = [
     'parallel',
     'Matrix',
 ]
+base_packages_set = frozenset(base_packages)
 
 
 # FUTURE: we may get the list of base packages
@@ -51,3 +52,7 @@ class RBasePackages:
     @staticmethod
     def getnames():
         return base_packages
+
+    @staticmethod
+    def isbase(packagename):
+        return packagename in base_packages_set
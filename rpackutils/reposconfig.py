@@ -8,8 +8,15 @@ import logging
 from .config import Config
 from configparser import NoSectionError, NoOptionError
 from rpackutils.providers.artifactory import Artifactory
+from rpackutils.httpsession import POOL_SIZE
+from rpackutils.httpsession import RETRIES
+from rpackutils.httpsession import RETRY_BACKOFF_SEC
+from rpackutils.listingcache import LISTING_TTL_SEC
 from rpackutils.providers.renvironment import REnvironment
+from rpackutils.providers.renvironment import INSTALL_TIMEOUT_SEC
 from rpackutils.providers.localrepository import LocalRepository
+from rpackutils.providers.cranlike import CRANLike
+from rpackutils.providers.cranlike import CONTRIB_PATH
 
 logger = logging.getLogger(__name__)
 REPOSITORIES = "repositories"
@@ -21,6 +28,7 @@ class ReposConfig:
         self._artifactory_instances = {}
         self._renvironment_instances = {}
         self._local_instances = {}
+        self._cranlike_instances = {}
         if not isinstance(config, Config):
             raise TypeError
         self._config = config
@@ -33,6 +41,9 @@ class ReposConfig:
         self._build_repositories(
             "local_repos",
             "_build_local_repos")
+        self._build_repositories(
+            "cranlike_repos",
+            "_build_cranlike_repos")
 
     @property
     def repository_instances(self):
@@ -49,6 +60,10 @@ class ReposConfig:
         for local_instance_name in self.local_instances:
             local = self.local_instance(local_instance_name)
             repositories.append(local)
+        # fetch CRAN-like instances
+        for cranlike_instance_name in self.cranlike_instances:
+            cranlike = self.cranlike_instance(cranlike_instance_name)
+            repositories.append(cranlike)
         return repositories
 
     def repository_instances_by_name(self, names):
@@ -73,6 +88,8 @@ class ReposConfig:
             return self.renvironment_instance(name)
         elif name in self.local_instances:
             return self.local_instance(name)
+        elif name in self.cranlike_instances:
+            return self.cranlike_instance(name)
         else:
             logger.error('Repository named \"{0}\" not found!'
                          .format(name))
@@ -99,6 +116,13 @@ class ReposConfig:
     def local_instance(self, name):
         return self._local_instances[name]
 
+    @property
+    def cranlike_instances(self):
+        return self._cranlike_instances.keys()
+
+    def cranlike_instance(self, name):
+        return self._cranlike_instances[name]
+
     def _build_repositories(self, repositoriesKey, buildFunction):
         try:
             repos_config = self._config.get(REPOSITORIES, repositoriesKey)
@@ -120,11 +144,30 @@ class ReposConfig:
             )
             repos = [x.strip() for x in self._config.get(
                 name, "repos").split(',')]
+            poolsize = self._config.getint(name, "poolsize", POOL_SIZE)
+            timeout = self._config.getfloat(name, "timeout")
+            retries = self._config.getint(name, "retries", RETRIES)
+            backoff = self._config.getfloat(
+                name, "backoff", RETRY_BACKOFF_SEC)
+            cachedir = None
+            if self._config.has_option(name, "cachedir"):
+                cachedir = self._config.get(name, "cachedir")
+            cachettl = self._config.getint(name, "cachettl", LISTING_TTL_SEC)
+            aql = 'auto'
+            if self._config.has_option(name, "aql"):
+                aql = self._config.get(name, "aql").lower()
             provider = Artifactory(
                 self._config.get(name, "baseurl"),
                 repos,
                 auth,
-                self._config.get(name, "verify")
+                self._config.get(name, "verify"),
+                poolsize,
+                timeout,
+                retries,
+                backoff,
+                cachedir,
+                cachettl,
+                aql
             )
             provider.name = name
             self._artifactory_instances[name] = provider
@@ -138,10 +181,23 @@ class ReposConfig:
                 licensecheck = self._config.getboolean(name, "licensecheck")
             except Exception:
                 licensecheck = False
+            installtimeout = self._config.getint(
+                name, "installtimeout", INSTALL_TIMEOUT_SEC)
+            logdir = None
+            if self._config.has_option(name, "logdir"):
+                logdir = self._config.get(name, "logdir")
+            ncpus = self._config.getint(name, "ncpus")
+            makeflags = None
+            if self._config.has_option(name, "makeflags"):
+                makeflags = self._config.get(name, "makeflags")
             provider = REnvironment(
                 self._config.get(name, "rhome"),
                 self._config.get(name, "librarypath"),
-                licensecheck
+                licensecheck,
+                installtimeout,
+                logdir,
+                ncpus,
+                makeflags
             )
             provider.name = name
             if(provider._licensecheck):
@@ -162,3 +218,37 @@ class ReposConfig:
             )
             provider.name = name
             self._local_instances[name] = provider
+
+    def _build_cranlike_repos(self, names):
+        for name in names:
+            logger.info('Building CRAN-like repository instance \"{0}\"'
+                        .format(name))
+            repos = []
+            if self._config.has_option(name, "repos"):
+                repos = [x.strip() for x in self._config.get(
+                    name, "repos").split(',') if x.strip()]
+            contribpath = CONTRIB_PATH
+            if self._config.has_option(name, "contribpath"):
+                contribpath = self._config.get(name, "contribpath")
+            verify = True
+            if self._config.has_option(name, "verify"):
+                verify = self._config.get(name, "verify")
+                if verify.lower() in ['true', 'false']:
+                    verify = (verify.lower() == 'true')
+            cachedir = None
+            if self._config.has_option(name, "cachedir"):
+                cachedir = self._config.get(name, "cachedir")
+            provider = CRANLike(
+                self._config.get(name, "baseurl"),
+                repos,
+                contribpath,
+                verify,
+                self._config.getint(name, "poolsize", POOL_SIZE),
+                self._config.getfloat(name, "timeout"),
+                self._config.getint(name, "retries", RETRIES),
+                self._config.getfloat(name, "backoff", RETRY_BACKOFF_SEC),
+                cachedir,
+                self._config.getint(name, "cachettl", LISTING_TTL_SEC)
+            )
+            provider.name = name
+            self._cranlike_instances[name] = provider
@@ -0,0 +1,95 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DB_PATH = os.path.join(os.path.expanduser('~'), '.cache',
+                                'rpackutils', 'mran-snapshots.db')
+
+
+class SnapshotDB(object):
+    """
+    Local database of the MRAN snapshot dates and the R version each of
+    them was built with. The snapshots never change, a date is recorded
+    once and later runs only fetch the dates not recorded yet.
+    """
+
+    def __init__(self, path=SNAPSHOT_DB_PATH):
+        """
+        :param path: the SQLite database file, created if needed
+        """
+        self.path = path
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS snapshots ('
+                'date TEXT PRIMARY KEY, '
+                'version TEXT NOT NULL)')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS snapshots_version '
+                'ON snapshots (version)')
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM snapshots').fetchone()[0]
+
+    def dates(self):
+        """
+        Set of the recorded snapshot dates.
+        """
+        with self._lock:
+            return set([row[0] for row in self._conn.execute(
+                'SELECT date FROM snapshots')])
+
+    def record(self, date2version):
+        """
+        Record the R version of snapshot dates.
+
+        :param date2version: dictionary date -> R version
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO snapshots (date, version) '
+                'VALUES (?, ?)',
+                sorted(date2version.items()))
+
+    def versions(self, rversion=None, fromdate=None, todate=None):
+        """
+        Dictionary R version -> sorted list of snapshot dates, for a
+        single R version and a range of dates (inclusive) if given.
+        """
+        query = 'SELECT version, date FROM snapshots'
+        conditions = []
+        parameters = []
+        if rversion is not None:
+            conditions.append('version = ?')
+            parameters.append(rversion)
+        if fromdate is not None:
+            conditions.append('date >= ?')
+            parameters.append(fromdate)
+        if todate is not None:
+            # dates may be followed by a time like "2014-08-18_0233"
+            conditions.append('substr(date, 1, 10) <= ?')
+            parameters.append(todate)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY date'
+        version2dates = dict()
+        with self._lock:
+            for version, date in self._conn.execute(query, parameters):
+                version2dates.setdefault(version, []).append(date)
+        return version2dates
@@ -0,0 +1,273 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import time
+import logging
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from concurrent.futures import FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+# number of parallel transfers when none is specified
+WORKERS = 10
+
+# engine running the transfer of the current thread, if any
+_current = threading.local()
+
+
+class BandwidthLimiter(object):
+    """
+    Token bucket shared by all the transfers of an engine.
+
+    Up to one second worth of bytes can be consumed at once, the
+    transfers block afterwards until the average rate gets back
+    below the limit.
+    """
+
+    def __init__(self, rate):
+        """
+        :param rate: maximum number of bytes per second
+        """
+        self.rate = float(rate)
+        self._tokens = self.rate
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        """
+        Wait until nbytes can be transferred.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate,
+                               self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= nbytes
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ThrottledReader(object):
+    """
+    File object wrapper reading at the pace of a BandwidthLimiter,
+    used to stream uploads.
+    """
+
+    def __init__(self, f, limiter, length):
+        self._f = f
+        self._limiter = limiter
+        self._length = length
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        if data:
+            self._limiter.consume(len(data))
+        return data
+
+
+class TransferEngine(object):
+    """
+    Run the transfers of the providers bulk operations in a bounded
+    pool of threads.
+
+    The transfers are I/O bound, threads share the provider, its
+    caches and its connections instead of a copy per process.
+    The pool lives as long as the engine and is shared by the
+    concurrent callers, it has as many threads as the largest number
+    of workers requested. The number of transfers running against the
+    same host can be limited, as well as the overall bandwidth.
+    """
+
+    def __init__(self, workers=WORKERS, hostlimit=None, bandwidth=None):
+        """
+        :param workers: default number of parallel transfers
+        :param hostlimit: maximum number of parallel transfers per host,
+            None for no limit
+        :param bandwidth: maximum number of bytes per second over all
+            the transfers, None for no limit
+        """
+        self.workers = workers
+        self.hostlimit = hostlimit
+        self.limiter = BandwidthLimiter(bandwidth) if bandwidth else None
+        self._semaphores = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._poolsize = 0
+
+    @property
+    def bandwidth(self):
+        return self.limiter.rate if self.limiter else None
+
+    @staticmethod
+    def host(url):
+        """
+        Host part of an URL, used to group the transfers.
+        """
+        return urllib.parse.urlparse(url).netloc or None
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(
+                    self.hostlimit)
+            return self._semaphores[host]
+
+    def _pool(self, workers):
+        """
+        The shared executor, replaced by a larger one if more workers
+        are requested. The transfers already submitted to the previous
+        one complete there.
+        """
+        with self._lock:
+            if self._executor is None or self._poolsize < workers:
+                previous = self._executor
+                self._poolsize = max(self.workers, workers)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._poolsize,
+                    thread_name_prefix='transfer')
+                if previous is not None:
+                    previous.shutdown(wait=False)
+            return self._executor
+
+    def shutdown(self):
+        """
+        Stop the threads of the pool once their transfers are done.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._poolsize = 0
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _call(self, fn, args, host):
+        _current.engine = self
+        try:
+            if host is None or not self.hostlimit:
+                return fn(*args)
+            with self._semaphore(host):
+                return fn(*args)
+        finally:
+            _current.engine = None
+
+    def run(self, fn, argslist, hosts=None, callback=None, workers=None):
+        """
+        Call fn with each tuple of arguments of argslist in parallel and
+        return the results in the same order.
+
+        :param hosts: host of each call for the per host limit, or a
+            single host for all of them
+        :param callback: function called with the index and the result
+            of each call as soon as it is done
+        :param workers: number of parallel calls, the engine default
+            if None
+        """
+        if not argslist:
+            return []
+        if hosts is None or isinstance(hosts, str):
+            hosts = [hosts] * len(argslist)
+        workers = min(workers or self.workers, len(argslist))
+        if getattr(_current, 'engine', None) is self:
+            # called by a transfer of this engine, waiting for the
+            # shared pool from one of its threads could dead lock
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return self._run(executor, fn, argslist, hosts,
+                                 callback, workers)
+        return self._run(self._pool(workers), fn, argslist, hosts,
+                         callback, workers)
+
+    def _run(self, executor, fn, argslist, hosts, callback, workers):
+        # at most workers calls are submitted at once, the next one
+        # when one of them is done
+        calls = enumerate(zip(argslist, hosts))
+        results = [None] * len(argslist)
+        running = {}
+
+        def submit():
+            call = next(calls, None)
+            if call is not None:
+                i, (args, host) = call
+                running[executor.submit(self._call, fn, args, host)] = i
+
+        for _ in range(workers):
+            submit()
+        try:
+            while running:
+                done, _ = wait(list(running.keys()),
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    results[i] = future.result()
+                    if callback is not None:
+                        callback(i, results[i])
+                    submit()
+        except BaseException:
+            # the calls already running complete before raising
+            wait(list(running.keys()))
+            raise
+        return results
+
+
+_engine = TransferEngine()
+
+
+def engine():
+    """
+    The transfer engine shared by all the providers.
+    """
+    return _engine
+
+
+def configure(workers=WORKERS, hostlimit=None, bandwidth=None):
+    """
+    Replace the shared transfer engine.
+    """
+    global _engine
+    _engine.shutdown()
+    _engine = TransferEngine(workers, hostlimit, bandwidth)
+    return _engine
+
+
+def throttle(nbytes):
+    """
+    Account for nbytes transferred by the current thread, waiting if
+    the bandwidth of its engine is exceeded.
+    """
+    current = getattr(_current, 'engine', None)
+    if current is not None and current.limiter is not None:
+        current.limiter.consume(nbytes)
+
+
+def bound(fn):
+    """
+    Wrap fn so that it runs with the engine of the calling thread, for
+    the threads started by a transfer itself.
+    """
+    current = getattr(_current, 'engine', None)
+
+    def call(*args):
+        _current.engine = current
+        try:
+            return fn(*args)
+        finally:
+            _current.engine = None
+    return call
+
+
+def throttled(f, length):
+    """
+    Wrap a file object to upload so that it is read at the pace of the
+    bandwidth of the current engine.
+    """
+    current = getattr(_current, 'engine', None)
+    if current is None or current.limiter is None:
+        return f
+    return ThrottledReader(f, current.limiter, length)
@@ -4,10 +4,25 @@
 #######################################
 
 import os
+import re
+import hashlib
 import shutil
 import shlex
 from subprocess import Popen, PIPE
 
+# environment variables set by batch schedulers with the number of
+# cores allocated to the current job
+SCHEDULER_CPUS_VARIABLES = [
+    'SLURM_CPUS_PER_TASK',
+    'SLURM_CPUS_ON_NODE',
+    'PBS_NUM_PPN',
+    'NCPUS',
+    'LSB_DJOB_NUMPROC',
+    'NSLOTS',
+]
+# size of the blocks read when computing checksums
+CHECKSUM_BLOCK_SIZE = 1024 * 1024
+
 
 class Utils:
 
@@ -48,3 +63,44 @@ class Utils:
         out, err = proc.communicate()
         exitcode = proc.returncode
         return exitcode, out, err
+
+    @staticmethod
+    def available_cpus():
+        """
+        Number of cores this process is allowed to use.
+
+        The allocation of a batch scheduler (SLURM, PBS, LSF, SGE) is
+        honored first, then the CPU affinity of the process and finally
+        the number of cores of the machine.
+        """
+        for variable in SCHEDULER_CPUS_VARIABLES:
+            value = os.environ.get(variable)
+            # SLURM may report values like "4(x2)"
+            m = re.match(r'^\s*(\d+)', value) if value else None
+            if m and int(m.group(1)) > 0:
+                return int(m.group(1))
+        if hasattr(os, 'sched_getaffinity'):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    @staticmethod
+    def checksums(filepath, algorithms=('md5', 'sha1', 'sha256')):
+        """
+        Compute the digests of a file in a single read.
+
+        :return: dictionary algorithm -> hexadecimal digest
+        """
+        hashes = {a: hashlib.new(a) for a in algorithms}
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(CHECKSUM_BLOCK_SIZE), b''):
+                for h in hashes.values():
+                    h.update(block)
+        return {a: h.hexdigest() for a, h in hashes.items()}
+
+    @staticmethod
+    def versionkey(version):
+        """
+        Sort key of a R package version like "1.2-3".
+        """
+        return [int(x) if x.isdigit() else -1
+                for x in re.split(r'[.-]', version)]
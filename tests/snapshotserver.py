@@ -0,0 +1,161 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import io
+import os
+import gzip
+import html
+import hashlib
+import logging
+import tarfile
+import threading
+import functools
+from http.server import ThreadingHTTPServer
+from http.server import SimpleHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+BANNER_TEMPLATE = """<html><body>
+<p>Snapshot of CRAN taken on {date}, built with
+<a href="src/base/R-{major}/R-{rversion}.tar.gz">R-{rversion}.tar.gz</a></p>
+</body></html>
+"""
+
+
+class SnapshotRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serve the files of a folder, the folders being listed like the
+    autoindex pages of MRAN: "../" first, then one anchor per entry.
+    """
+
+    def list_directory(self, path):
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            self.send_error(404, 'No permission to list directory')
+            return None
+        lines = ['<html><head><title>Index of {0}</title></head>'
+                 .format(html.escape(self.path)),
+                 '<body><h1>Index of {0}</h1><hr><pre>'
+                 .format(html.escape(self.path)),
+                 '<a href="../">../</a>']
+        for name in names:
+            if os.path.isdir(os.path.join(path, name)):
+                name = name + '/'
+            lines.append('<a href="{0}">{1}</a>'
+                         .format(html.escape(name, quote=True),
+                                 html.escape(name)))
+        lines.append('</pre><hr></body></html>')
+        content = '\n'.join(lines).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        return io.BytesIO(content)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+class SnapshotServer(object):
+    """
+    Local stand-in for MRAN: a HTTP server running in a thread and
+    serving the snapshot/<date>/ folders of a fixture folder, with their
+    banner.shtml and their src/contrib/ tarballs and PACKAGES index.
+    CRAN(baseurl=server.baseurl) then runs without any Internet access,
+    for the tests and the benchmarks.
+
+    with SnapshotServer(root) as server:
+        cran = CRAN(baseurl=server.baseurl)
+    """
+
+    def __init__(self, root, host='127.0.0.1', port=0):
+        """
+        :param root: the fixture folder, holding the snapshot folder
+        :param port: the port to listen to, 0 for any free port
+        """
+        self.root = root
+        handler = functools.partial(SnapshotRequestHandler,
+                                    directory=root)
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def baseurl(self):
+        host, port = self._server.server_address[:2]
+        return 'http://{0}:{1}'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        logger.debug('Serving {0} on {1}'.format(self.root, self.baseurl))
+        return self
+
+    def stop(self):
+        # shutdown() waits for serve_forever(), only if it was started
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @staticmethod
+    def _tarball(fields):
+        description = ''.join(['{0}: {1}\n'.format(k, v)
+                               for k, v in fields.items()])
+        data = description.encode('utf-8')
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode='w:gz') as tar:
+            info = tarfile.TarInfo('{0}/DESCRIPTION'
+                                   .format(fields['Package']))
+            info.size = len(data)
+            info.mtime = 0
+            tar.addfile(info, io.BytesIO(data))
+        return buf.getvalue()
+
+    @staticmethod
+    def add_snapshot(root, date, rversion, packages):
+        """
+        Write a snapshot in a fixture folder: its banner, a tarball
+        holding the DESCRIPTION file of each package and the PACKAGES
+        index with their checksums.
+
+        :param root: the fixture folder
+        :param date: the snapshot date, like "2018-02-27"
+        :param rversion: the version of R of the banner, like "3.4.3"
+        :param packages: list of dictionaries of DESCRIPTION fields,
+            with at least "Package" and "Version"
+        """
+        snapshotdir = os.path.join(root, 'snapshot', date)
+        contribdir = os.path.join(snapshotdir, 'src', 'contrib')
+        os.makedirs(contribdir, exist_ok=True)
+        with open(os.path.join(snapshotdir, 'banner.shtml'), 'w') as f:
+            f.write(BANNER_TEMPLATE.format(date=date,
+                                           major=rversion.split('.')[0],
+                                           rversion=rversion))
+        records = []
+        for fields in packages:
+            content = SnapshotServer._tarball(fields)
+            tarball = '{0}_{1}.tar.gz'.format(fields['Package'],
+                                              fields['Version'])
+            with open(os.path.join(contribdir, tarball), 'wb') as f:
+                f.write(content)
+            record = ''.join(['{0}: {1}\n'.format(k, v)
+                              for k, v in fields.items()])
+            records.append(record + 'MD5sum: {0}\n'
+                           .format(hashlib.md5(content).hexdigest()))
+        index = '\n'.join(records).encode('utf-8')
+        with open(os.path.join(contribdir, 'PACKAGES'), 'wb') as f:
+            f.write(index)
+        with open(os.path.join(contribdir, 'PACKAGES.gz'), 'wb') as f:
+            f.write(gzip.compress(index))
@@ -10,6 +10,7 @@ from unittest import mock
 from unittest.mock import patch
 import tempfile
 import shutil
+import gzip
 
 from rpackutils.packinfo import PackInfo
 from rpackutils.packinfo import PackStatus
@@ -37,7 +38,9 @@ class MockResponse(object):
         return json.loads(self.text)
 
     def iter_content(self, chunk_size=1, decode_unicode=False):
-        return None
+        # small chunks, the JSON documents are parsed incrementally
+        content = self.text.encode('utf-8')
+        return iter([content[i:i + 7] for i in range(0, len(content), 7)])
 
 
 class PackInfoMock(object):
@@ -75,6 +78,27 @@ def test_get_api_url():
            'https://YOUR_ARTIFACTORY_HOSTNAME/artifactory/api/storage/R-3.1.2')
 
 
+@patch('requests.Session.request')
+def test_do_request(mock_request):
+    arti = create()
+    mock_request.return_value = MockResponse(200, "Ok")
+    arti._do_request(arti._get_api_url('R-3.1.2'), stream=True)
+    args, kwargs = mock_request.call_args
+    assert(args[0] == 'get')
+    assert(kwargs['stream'])
+    # the connections are pooled
+    session = arti._http.session
+    assert(session.auth == arti.auth)
+    assert(session.verify == arti.verify)
+    arti._do_request(arti.baseurl)
+    assert(arti._http.session is session)
+    # the pool follows the number of parallel downloads
+    arti.poolsize = 20
+    assert(session.get_adapter(arti.baseurl)._pool_maxsize == 10)
+    assert(arti._http.session.get_adapter(
+        arti.baseurl)._pool_maxsize == 20)
+
+
 @patch('rpackutils.providers.artifactory.Artifactory._do_request')
 def test_ls(mock_do_request):
     arti = create()
@@ -104,6 +128,156 @@ def test_ls(mock_do_request):
     assert("R-local/ABCExtremes_1.0.tar.gz" in files)
 
 
+@patch('rpackutils.providers.artifactory.Artifactory._do_request')
+def test_ls_repo_details(mock_do_request):
+    arti = create()
+    mockresjson = {
+        "uri": "https://artifactory.local/artifactory/api/storage/R-3.1.2",
+        "created": "2017-03-08T16:21:11.504+01:00",
+        "files": [{
+            "uri": "/accelerometry_2.2.4.tar.gz",
+            "size": 1024,
+            "lastModified": "2017-03-08T16:21:11.504+01:00",
+            "folder": False,
+            "sha1": "962c287c760e03b03c17eb920f5358d05f44dd3b",
+            "sha2": "04b49d6d6b4b4bd8c7c1e2a0b6bb8d1bd5b4b1a7e0c2d9f1e1b9c0d6"
+        }, {
+            "uri": "/ABCExtremes_1.0.tar.gz",
+            "size": 2048,
+            "lastModified": "2017-03-08T16:21:11.504+01:00",
+            "folder": False,
+            "sha1": "a2c287c760e03b03c17eb920f5358d05f44dd3b"
+        }]
+    }
+    mock_do_request.return_value = MockResponse(200, json.dumps(mockresjson))
+    details = arti.ls_repo_details('R-3.1.2')
+    assert(mock_do_request.call_args[0][0] ==
+           'https://YOUR_ARTIFACTORY_HOSTNAME/artifactory/api/storage/'
+           'R-3.1.2?list&deep=1&depth=1&listFolders=0')
+    assert(details[0]['uri'] == 'accelerometry_2.2.4.tar.gz')
+    assert(details[0]['size'] == 1024)
+    assert(details[1]['sha1'] == 'a2c287c760e03b03c17eb920f5358d05f44dd3b')
+    assert(details[1]['sha256'] is None)
+    # later lookups are served from the cache
+    arti.find_repo('R-3.1.2', 'accelerometry_*')
+    arti.find_repo('R-3.1.2', 'ABC*')
+    assert(mock_do_request.call_count == 1)
+    # errors are not cached
+    mock_do_request.return_value = MockResponse(404, "Not found")
+    arti.invalidate_cache()
+    assert(arti.ls_repo('R-3.1.2') == [])
+    assert(arti.ls_repo('R-3.1.2') == [])
+    assert(mock_do_request.call_count == 3)
+
+
+@patch('rpackutils.providers.artifactory.Artifactory._do_request')
+def test_ils(mock_do_request):
+    arti = create()
+    arti._aqlsupported = False
+    listing = {"uri": "https://artifactory.local/artifactory/api/storage/"
+                      "R-local",
+               "files": [{"uri": "/A_1.0.tar.gz", "size": 10,
+                          "folder": False},
+                         {"uri": "/B_1.0.tar.gz", "size": 20,
+                          "folder": False},
+                         {"uri": "/A_1.1.tar.gz", "size": 30,
+                          "folder": False}]}
+    mock_do_request.return_value = MockResponse(200, json.dumps(listing))
+    names = arti.ils('R-local')
+    # nothing is requested until the first file is needed
+    assert(mock_do_request.call_count == 0)
+    assert(next(names) == 'A_1.0.tar.gz')
+    assert(list(names) == ['B_1.0.tar.gz', 'A_1.1.tar.gz'])
+    assert(list(arti.ifind_repo('R-local', 'A_*')) ==
+           ['A_1.0.tar.gz', 'A_1.1.tar.gz'])
+    assert(list(arti.ifind('B_*')) == ['R-3.1.2/B_1.0.tar.gz',
+                                       'R-local/B_1.0.tar.gz'])
+    # streamed listings are not cached
+    assert(mock_do_request.call_count == 4)
+    assert(arti.ls_repo('R-local') == list(arti.ils('R-local')))
+    assert(mock_do_request.call_count == 5)
+    # a truncated listing
+    arti.invalidate_cache()
+    mock_do_request.return_value = MockResponse(200,
+                                                json.dumps(listing)[:-20])
+    assert(list(arti.ils('R-local')) == ['A_1.0.tar.gz', 'B_1.0.tar.gz'])
+    assert(arti.ls_repo('R-local') == [])
+
+
+def aql_response(names):
+    return MockResponse(200, json.dumps({
+        "results": [{
+            "repo": "R-3.1.2",
+            "path": ".",
+            "name": name,
+            "type": "file",
+            "size": 1024,
+            "actual_sha1": "962c287c760e03b03c17eb920f5358d05f44dd3b",
+            "modified": "2017-03-08T16:21:11.504+01:00",
+            "properties": [{"key": "r.name", "value": name.split('_')[0]}]
+        } for name in names],
+        "range": {"start_pos": 0, "end_pos": len(names), "total": len(names)}
+    }))
+
+
+@patch('rpackutils.providers.artifactory.Artifactory._do_request')
+def test_find_aql(mock_do_request):
+    arti = create()
+    mock_do_request.return_value = aql_response(['ABCExtremes_1.0.tar.gz'])
+    assert(arti.find_repo('R-3.1.2', 'ABCExtremes_*.tar.gz')
+           == ['ABCExtremes_1.0.tar.gz'])
+    args, kwargs = mock_do_request.call_args
+    assert(args[0] == 'https://YOUR_ARTIFACTORY_HOSTNAME/artifactory'
+                      '/api/search/aql')
+    assert(kwargs['method'] == 'post')
+    assert(kwargs['data'].startswith(
+        'items.find({"repo": "R-3.1.2", "path": ".", "type": "file", '
+        '"name": {"$match": "ABCExtremes_*.tar.gz"}})'))
+    assert(arti.aql_enabled)
+    # many packages are searched in a single query
+    mock_do_request.reset_mock()
+    mock_do_request.return_value = aql_response(['A_1.0.tar.gz',
+                                                 'A_1.1.tar.gz',
+                                                 'B_0.1.tar.gz'])
+    found = arti.find_packages('R-3.1.2', ['A', 'B', 'C'])
+    assert(found == {'A': ['A_1.0.tar.gz', 'A_1.1.tar.gz'],
+                     'B': ['B_0.1.tar.gz'],
+                     'C': []})
+    assert(mock_do_request.call_count == 1)
+    assert('"$or": [{"name": {"$match": "A_*.tar.gz"}}'
+           in mock_do_request.call_args[1]['data'])
+    details = arti.search_repo('R-3.1.2', ['B_*.tar.gz'])['B_*.tar.gz']
+    assert(details[0]['properties'] == {'r.name': ['B']})
+    # the results are cached
+    assert(arti.find_repo('R-3.1.2', 'A_*.tar.gz') == ['A_1.0.tar.gz',
+                                                       'A_1.1.tar.gz'])
+    assert(mock_do_request.call_count == 1)
+
+
+@patch('rpackutils.providers.artifactory.Artifactory._do_request')
+def test_find_aql_unsupported(mock_do_request):
+    arti = create()
+    mockresjson = {
+        "uri": "https://artifactory.local/artifactory/api/storage/R-3.1.2",
+        "files": [{"uri": "/ABCExtremes_1.0.tar.gz", "size": 2048,
+                   "folder": False}]
+    }
+
+    def do_request(url, method='get', **kwargs):
+        if method == 'post':
+            return MockResponse(404, 'Not found')
+        return MockResponse(200, json.dumps(mockresjson))
+
+    mock_do_request.side_effect = do_request
+    assert(arti.find_repo('R-3.1.2', 'ABCExtremes_*')
+           == ['ABCExtremes_1.0.tar.gz'])
+    assert(not arti.aql_enabled)
+    # AQL is not tried again
+    assert(arti.find_packages('R-local', ['ABCExtremes'])
+           == {'ABCExtremes': ['ABCExtremes_1.0.tar.gz']})
+    assert(mock_do_request.call_count == 3)
+
+
 @patch('rpackutils.providers.artifactory.Artifactory._do_request')
 def test_find(mock_do_request):
     arti = create()
@@ -131,6 +305,43 @@ def test_find(mock_do_request):
     assert("R-local/accelerometry_2.2.4.tar.gz" in files)
 
 
+class MockDownloadResponse(MockResponse):
+    def __init__(self, status_code, body, headers=None):
+        super().__init__(status_code, '', body)
+        self.headers = headers if headers is not None else {}
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        return iter([self.body])
+
+
+@patch('rpackutils.providers.artifactory.Artifactory._do_request')
+def test_download_single_fullname(mock_do_request):
+    arti = create()
+    dest = tempfile.mkdtemp()
+    body = gzip.compress(b'Package: Rpack')
+    mock_do_request.return_value = MockDownloadResponse(200, body)
+    retVal = arti.download_single_fullname('R-local', 'Rpack_0.99.0.tar.gz',
+                                           dest)
+    assert(retVal == PackStatus.DOWNLOADED)
+    assert(os.listdir(dest) == ['Rpack_0.99.0.tar.gz'])
+    os.remove(os.path.join(dest, 'Rpack_0.99.0.tar.gz'))
+    # the checksum of the listing does not match
+    arti._listingcache.put(Utils.concaturls(arti.baseurl, 'R-local'), [
+        {'uri': 'Rpack_0.99.0.tar.gz', 'size': len(body), 'sha1': '0' * 40,
+         'sha256': None, 'lastModified': None}])
+    retVal = arti.download_single_fullname('R-local', 'Rpack_0.99.0.tar.gz',
+                                           dest)
+    assert(retVal == PackStatus.DOWNLOAD_FAILED)
+    # Artifactory returned an error message
+    mock_do_request.return_value = MockDownloadResponse(
+        200, b'{"errors": [{"status": 404, "message": "Not found"}]}')
+    retVal = arti.download_single_fullname('R-local', 'Rpack_0.99.1.tar.gz',
+                                           dest)
+    assert(retVal == PackStatus.DOWNLOAD_FAILED)
+    assert(os.listdir(dest) == [])
+    shutil.rmtree(dest)
+
+
 @patch('rpackutils.providers.artifactory.Artifactory.find_repo')
 @patch('rpackutils.providers.artifactory.Artifactory.download_single_fullname')
 @patch('rpackutils.packinfo.PackInfo.__init__')
@@ -146,55 +357,276 @@ def test_download_single(mock_pi, mock_download_single_fullname,
     shutil.rmtree(dest)
 
 
-# @patch('rpackutils.providers.Artifactory.find_repo')
-# @patch('rpackutils.providers.Artifactory.download_single')
-# def test_download_multiple(mock_download_single, mock_find_repo):
-def test_download_multiple():
-    pass
-    # arti = create()
-    # dest = tempfile.mkdtemp()
-    # mock_find_repo.return_value = ['Rpackabc_0.99.0.tar.gz',
-    #                                'Rpacktru_1.2.3.tar.gz',
-    #                                'Rpacksta_0.9.34.tar.gz']
-    # mock_download_single.return_value = PackStatus.DOWNLOADED
-    # retVals = arti.download_multiple(
-    #     ['R-local', 'R-3.1.2', 'R-3.2.2'],
-    #     ['Rpackabc', 'Rpacktru', 'Rpacksta'],
-    #     dest,
-    #     procs=3)
-    # assert(retVals == [PackStatus.DOWNLOADED,
-    #                    PackStatus.DOWNLOADED,
-    #                    PackStatus.DOWNLOADED])
-    # shutil.rmtree(dest)
-
-
-@patch('rpackutils.utils.Utils.subprocesscall')
-def test_upload_single(mock_subprocesscall):
+@patch('rpackutils.providers.artifactory.Artifactory.find_packages')
+@patch('rpackutils.providers.artifactory.Artifactory.download_single')
+def test_download_multiple(mock_download_single, mock_find_packages):
+    arti = create()
+    dest = tempfile.mkdtemp()
+    mock_download_single.side_effect = [PackStatus.DOWNLOADED,
+                                        PackStatus.NOT_FOUND,
+                                        PackStatus.DOWNLOADED]
+    done = []
+    retVals = arti.download_multiple(
+        ['R-local', 'R-3.1.2', 'R-3.2.2'],
+        ['Rpackabc', 'Rpacktru', 'Rpacksta'],
+        dest,
+        procs=1,
+        callback=lambda i, retVal: done.append((i, retVal)))
+    assert(retVals == [PackStatus.DOWNLOADED,
+                       PackStatus.NOT_FOUND,
+                       PackStatus.DOWNLOADED])
+    assert(done == [(0, PackStatus.DOWNLOADED),
+                    (1, PackStatus.NOT_FOUND),
+                    (2, PackStatus.DOWNLOADED)])
+    assert(mock_find_packages.call_count == 3)
+    shutil.rmtree(dest)
+
+
+def create_artifacts(names):
+    folder = tempfile.mkdtemp()
+    artifacts = []
+    for name in names:
+        artifact = os.path.join(folder, name)
+        with open(artifact, 'wb') as f:
+            f.write(name.encode())
+        artifacts.append(artifact)
+    return folder, artifacts
+
+
+def deploy_response(artifact, status_code=201):
+    checksums = Utils.checksums(artifact)
+    return MockResponse(status_code, json.dumps({
+        "repo": "fakerepo",
+        "path": "/" + os.path.basename(artifact),
+        "checksums": {"sha1": checksums['sha1'],
+                      "md5": checksums['md5'],
+                      "sha256": checksums['sha256']}
+    }))
+
+
+@patch('rpackutils.providers.artifactory.Artifactory._do_request')
+def test_upload_single(mock_do_request):
+    arti = create()
+    folder, artifacts = create_artifacts(['package_version.tar.gz'])
+    artifact = artifacts[0]
+    mock_do_request.return_value = deploy_response(artifact)
+    arti._listingcache.put(Utils.concaturls(arti.baseurl, 'fakerepo'), [])
+    retVal = arti.upload_single(artifact, "fakerepo",
+                                properties={'r.name': 'package'})
+    assert(retVal == PackStatus.DEPLOYED)
+    args, kwargs = mock_do_request.call_args
+    # no credentials in the url
+    assert(args[0] == 'https://YOUR_ARTIFACTORY_HOSTNAME/artifactory/'
+                      'fakerepo/package_version.tar.gz;r.name=package')
+    assert(kwargs['method'] == 'put')
+    assert(kwargs['headers']['X-Checksum-Sha1']
+           == Utils.checksums(artifact)['sha1'])
+    # the deployed file is added to the listing of the repository
+    entries = arti._listingcache.get(
+        Utils.concaturls(arti.baseurl, 'fakerepo'))
+    assert([x['uri'] for x in entries] == ['package_version.tar.gz'])
+    assert(entries[0]['sha1'] == Utils.checksums(artifact)['sha1'])
+    arti._listingcache.put(Utils.concaturls(arti.baseurl, 'fakerepo'), [])
+    # the server rejected the artifact
+    mock_do_request.return_value = MockResponse(409, json.dumps({
+        "errors": [{"status": 409, "message": "Checksum policy violated"}]
+    }))
+    retVal = arti.upload_single(artifact, "fakerepo")
+    assert(retVal == PackStatus.DEPLOY_FAILED)
+    # the deployed content differs
+    mock_do_request.return_value = MockResponse(201, json.dumps({
+        "checksums": {"sha1": "0000000000000000000000000000000000000000"}
+    }))
+    retVal = arti.upload_single(artifact, "fakerepo")
+    assert(retVal == PackStatus.DEPLOY_FAILED)
+    # missing file
+    retVal = arti.upload_single(artifact + '.missing', "fakerepo")
+    assert(retVal == PackStatus.DEPLOY_FAILED)
+    shutil.rmtree(folder)
+
+
+@patch('rpackutils.providers.artifactory.Artifactory._do_request')
+def test_upload_single_retry(mock_do_request):
     arti = create()
-    artifact = "/some/path/to/a/package_version.tar.gz"
-    mock_subprocesscall.return_value = (0, None, None)
+    arti._http.backoff = 0
+    folder, artifacts = create_artifacts(['package_version.tar.gz'])
+    artifact = artifacts[0]
+    arti._listingcache.put(Utils.concaturls(arti.baseurl, 'fakerepo'), [])
+    bodies = []
+    responses = [MockResponse(404, "{}"),
+                 MockResponse(503, "Unavailable"),
+                 MockResponse(502, "Bad gateway"),
+                 deploy_response(artifact)]
+
+    def do_request(url, method='get', data=None, headers=None, **kwargs):
+        if data is not None:
+            bodies.append(data.read())
+        return responses.pop(0)
+
+    mock_do_request.side_effect = do_request
     retVal = arti.upload_single(artifact, "fakerepo")
     assert(retVal == PackStatus.DEPLOYED)
+    # the whole content is sent again on each attempt
+    assert(bodies == [b'package_version.tar.gz'] * 3)
+    # the session itself does not retry the uploads
+    retry = arti._http.session.get_adapter(arti.baseurl).max_retries
+    assert(not retry.is_retry('PUT', 503))
+    assert(retry.is_retry('GET', 503))
+    shutil.rmtree(folder)
+
+
+@patch('rpackutils.providers.artifactory.Artifactory._do_request')
+def test_upload_single_existing(mock_do_request):
+    arti = create()
+    folder, artifacts = create_artifacts(['same_1.0.tar.gz',
+                                          'other_1.0.tar.gz',
+                                          'new_1.0.tar.gz'])
+    same, other, new = artifacts
+    listing = {"files": [
+        {"uri": "/same_1.0.tar.gz", "size": 15, "folder": False,
+         "sha1": Utils.checksums(same)['sha1']},
+        {"uri": "/other_1.0.tar.gz", "size": 3, "folder": False,
+         "sha1": "0000000000000000000000000000000000000000"}]}
+    requests = []
+
+    def do_request(url, method='get', data=None, headers=None, **kwargs):
+        requests.append((os.path.basename(url), method,
+                         data is not None, headers))
+        if method == 'get':
+            return MockResponse(200, json.dumps(listing))
+        if headers.get('X-Checksum-Deploy') == 'true':
+            # the checksum of "new" is unknown
+            if 'new_' in url:
+                return MockResponse(404, "{}")
+        return MockResponse(201, "{}")
+
+    mock_do_request.side_effect = do_request
+    # same path and checksum: nothing is sent and the tarball is not read
+    with patch('rpackutils.providers.artifactory.Artifactory.'
+               '_description_properties') as mock_properties:
+        assert(arti.upload_single(same, 'fakerepo') == PackStatus.DEPLOYED)
+        assert([r[1] for r in requests] == ['get'])
+        # other content without overwrite: kept
+        assert(arti.upload_single(other, 'fakerepo')
+               == PackStatus.DEPLOYED)
+        assert([r[1] for r in requests] == ['get'])
+        assert(mock_properties.call_count == 0)
+    # other content with overwrite: deployed by checksum
+    assert(arti.upload_single(other, 'fakerepo', overwrite=True)
+           == PackStatus.DEPLOYED)
+    assert(requests[-1][0:3] == ('other_1.0.tar.gz', 'put', False))
+    assert(arti.upload_single(other, 'fakerepo',
+                              overwritepackages=['other'])
+           == PackStatus.DEPLOYED)
+    # unknown checksum: the content is uploaded, the listing was
+    # updated with the previous deployments instead of being requested
+    del requests[:]
+    assert(arti.upload_single(new, 'fakerepo') == PackStatus.DEPLOYED)
+    assert([r[0:3] for r in requests]
+           == [('new_1.0.tar.gz', 'put', False),
+               ('new_1.0.tar.gz', 'put', True)])
+    assert('X-Checksum-Deploy' not in requests[-1][3])
+    shutil.rmtree(folder)
+
+
+def test_properties_matrix():
+    matrix = Artifactory._properties_matrix({
+        'r.name': 'FooBar',
+        'r.imports': ['methods', 'utils'],
+        'r.license': 'GPL (>= 2) | file LICENSE'})
+    assert(matrix == ';r.name=FooBar'
+                     ';r.imports=methods,utils'
+                     ';r.license=GPL%20%28%3E%5C%3D%202%29%20%5C%7C'
+                     '%20file%20LICENSE')
 
 
-@patch('rpackutils.utils.Utils.subprocesscall')
-def test_upload_multiple(mock_subprocesscall):
+@patch('rpackutils.providers.artifactory.Artifactory._do_request')
+def test_upload_single_description_properties(mock_do_request):
+    arti = create()
+    tarballpath = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        'resources/FooBar_0.99.1.tar.gz')
+    mock_do_request.return_value = MockResponse(201, "{}")
+    retVal = arti.upload_single(tarballpath, "fakerepo")
+    assert(retVal == PackStatus.DEPLOYED)
+    url = mock_do_request.call_args[0][0]
+    assert(url.startswith('https://YOUR_ARTIFACTORY_HOSTNAME/artifactory/'
+                          'fakerepo/FooBar_0.99.1.tar.gz;r.name=FooBar'))
+    assert(';r.imports=methods,utils' in url)
+    assert(';r.license=GPL-2' in url)
+
+
+@patch('rpackutils.providers.artifactory.Artifactory.download_single_fullname')
+@patch('rpackutils.providers.artifactory.Artifactory._do_request')
+def test_packinfo_properties(mock_do_request, mock_download_single_fullname):
+    arti = create()
+    listing = {"files": [
+        {"uri": "/FooBar_0.99.1.tar.gz", "folder": False},
+        {"uri": "/FooBar_0.99.10.tar.gz", "folder": False}]}
+
+    def properties(version):
+        return {"properties": {"r.name": ["FooBar"],
+                               "r.version": [version],
+                               "r.imports": ["methods", "utils"],
+                               "r.license": ["GPL-2"]}}
+
+    def do_request(url, method='get', **kwargs):
+        if method == 'post':
+            return MockResponse(404, "Not found")
+        if url.endswith('FooBar_0.99.1.tar.gz?properties'):
+            return MockResponse(200, json.dumps(properties('0.99.1')))
+        if url.endswith('FooBar_0.99.10.tar.gz?properties'):
+            return MockResponse(200, json.dumps(properties('0.99.10')))
+        return MockResponse(200, json.dumps(listing))
+
+    mock_do_request.side_effect = do_request
+    packinfo = arti.packinfo('FooBar', repo='R-local')
+    assert(packinfo.name == 'FooBar')
+    assert(packinfo.version == '0.99.10')
+    assert(packinfo.imports == ['methods', 'utils'])
+    assert(packinfo.repos == ['R-local'])
+    assert(packinfo.status == PackStatus.PARSED)
+    # no tarball was downloaded
+    assert(not mock_download_single_fullname.called)
+
+
+@patch('rpackutils.providers.artifactory.Artifactory._do_request')
+def test_upload_multiple(mock_do_request):
     arti = create()
-    artifacts = ["/path1/package1",
-                 "/path2/package2",
-                 "/path3/package3"]
+    folder, artifacts = create_artifacts(["package1",
+                                          "package2",
+                                          "package3"])
     # success
-    mock_subprocesscall.return_value = (0, None, None)
+    mock_do_request.return_value = MockResponse(201, "{}")
     retVals = arti.upload_multiple(artifacts, "sources-local", procs=3)
     assert(retVals == [PackStatus.DEPLOYED,
                        PackStatus.DEPLOYED,
                        PackStatus.DEPLOYED])
-    # fail
-    mock_subprocesscall.return_value = (1, None, None)
+    # fail, without waiting between the retries
+    arti._http.backoff = 0
+    mock_do_request.return_value = MockResponse(500, "Internal error")
     retVals = arti.upload_multiple(artifacts, "sources-local", procs=3)
     assert(retVals == [PackStatus.DEPLOY_FAILED,
                        PackStatus.DEPLOY_FAILED,
                        PackStatus.DEPLOY_FAILED])
+    # package1 is already deployed with another content
+    arti.invalidate_cache()
+    listing = {"files": [{"uri": "/package1", "size": 3, "folder": False,
+                          "sha1": "0000000000000000000000000000000000000000"}]}
+
+    def do_request(url, method='get', **kwargs):
+        if method == 'get':
+            return MockResponse(200, json.dumps(listing))
+        return MockResponse(500, "Internal error")
+
+    mock_do_request.side_effect = do_request
+    retVals = arti.upload_multiple(artifacts[0:1], "sources-local", procs=1)
+    assert(retVals == [PackStatus.DEPLOYED])
+    # overwrite is not taken as the properties anymore
+    retVals = arti.upload_multiple(artifacts[0:1], "sources-local", procs=1,
+                                   overwrite=True)
+    assert(retVals == [PackStatus.DEPLOY_FAILED])
+    shutil.rmtree(folder)
 
 
 def test_packinfo_repo_multiple_versions():
@@ -0,0 +1,30 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import time
+
+from rpackutils.circuitbreaker import CircuitBreaker
+
+
+def test_circuitbreaker():
+    health = CircuitBreaker('https://cran', threshold=2, ttl=0.05)
+    assert(not health.is_open)
+    assert(not health.probe_due())
+    health.record_failure()
+    assert(not health.is_open)
+    # a success resets the count of failures
+    health.record_success()
+    health.record_failure()
+    assert(not health.is_open)
+    health.record_failure()
+    assert(health.is_open)
+    # a single probe per ttl
+    assert(not health.probe_due())
+    time.sleep(0.06)
+    assert(health.probe_due())
+    assert(not health.probe_due())
+    health.record_success()
+    assert(not health.is_open)
+    assert(health.failures == 0)
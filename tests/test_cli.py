@@ -0,0 +1,205 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import json
+import shutil
+import tempfile
+import pytest
+from unittest.mock import patch
+
+from rpackutils.cli.cliDownload import rpacks_download
+from rpackutils.cli.cliInstall import rpacks_install
+from rpackutils.cli.cliMirror import rpacks_mirror
+from rpackutils.packinfo import PackStatus
+from rpackutils.providers.cran import CRAN
+from tests.snapshotserver import SnapshotServer
+from rpackutils.utils import Utils
+
+RHOME = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'resources/R-fake-env')
+
+RPACKAGE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'resources/FooBar_0.99.1.tar.gz')
+
+CONFIG = """[repositories]
+renvironment_repos = R-fake
+local_repos = local
+
+[local]
+baseurl = {0}
+repos = local1
+
+[R-fake]
+rhome = {1}
+librarypath = packages
+"""
+
+
+ARTIFACTORY_CONFIG = """[repositories]
+artifactory_repos = artifactory
+
+[artifactory]
+baseurl = https://artifactory/artifactory
+user = john
+password = "secret"
+verify = false
+repos = R-local
+"""
+
+
+class MockResponse(object):
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+        self.ok = (status_code == 200)
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        return iter([self.text.encode('utf-8')])
+
+
+def create_config(folder):
+    """
+    Configuration file of a local repository holding the FooBar
+    package and of the fake R environment.
+    """
+    repopath = os.path.join(folder, 'repository')
+    os.makedirs(os.path.join(repopath, 'local1'))
+    shutil.copy(RPACKAGE, os.path.join(repopath, 'local1'))
+    configfilepath = os.path.join(folder, 'rpackutils.conf')
+    with open(configfilepath, 'w') as f:
+        f.write(CONFIG.format(repopath, RHOME))
+    return configfilepath
+
+
+@patch('rpackutils.providers.renvironment.REnvironment.install_multiple')
+def test_rpacks_install_procs_failed(mock_install_multiple):
+    folder = tempfile.mkdtemp()
+    configfilepath = create_config(folder)
+    mock_install_multiple.return_value = [PackStatus.DEPLOY_FAILED]
+    argv = ['rpacki', '--config', configfilepath, '--repo', 'local',
+            '--Renv', 'R-fake', '--packages', 'FooBar', '--procs', '2']
+    with patch('sys.argv', argv):
+        with pytest.raises(SystemExit) as e:
+            rpacks_install()
+    assert(e.value.code == -1)
+    assert(mock_install_multiple.call_count == 1)
+    packnodes = mock_install_multiple.call_args[0][0]
+    assert([n.idt for n in packnodes] == ['FooBar'])
+    shutil.rmtree(folder)
+
+
+@patch('rpackutils.providers.renvironment.REnvironment.install_multiple')
+def test_rpacks_install_procs_ok(mock_install_multiple):
+    folder = tempfile.mkdtemp()
+    configfilepath = create_config(folder)
+    mock_install_multiple.return_value = [PackStatus.DEPLOYED]
+    argv = ['rpacki', '--config', configfilepath, '--repo', 'local',
+            '--Renv', 'R-fake', '--packages', 'FooBar', '--procs', '2']
+    with patch('sys.argv', argv):
+        rpacks_install()
+    assert(mock_install_multiple.call_count == 1)
+    shutil.rmtree(folder)
+
+
+@patch('rpackutils.providers.renvironment.REnvironment.install')
+def test_rpacks_install_failed(mock_install):
+    folder = tempfile.mkdtemp()
+    configfilepath = create_config(folder)
+    mock_install.return_value = PackStatus.DEPLOY_FAILED
+    argv = ['rpacki', '--config', configfilepath, '--repo', 'local',
+            '--Renv', 'R-fake', '--packages', 'FooBar']
+    with patch('sys.argv', argv):
+        with pytest.raises(SystemExit) as e:
+            rpacks_install()
+    assert(e.value.code == -1)
+    assert(mock_install.call_count == 1)
+    shutil.rmtree(folder)
+
+
+def test_rpacks_download_script():
+    folder = tempfile.mkdtemp()
+    configfilepath = create_config(folder)
+    dest = os.path.join(folder, 'dest')
+    os.makedirs(dest)
+    argv = ['rpackd', '--config', configfilepath, '--repo', 'local',
+            '--Renv', 'R-fake', '--packages', 'FooBar', '--dest', dest]
+    with patch('sys.argv', argv):
+        rpacks_download()
+    assert(os.path.exists(os.path.join(dest, 'FooBar_0.99.1.tar.gz')))
+    with open(os.path.join(dest, 'install.sh')) as f:
+        script = f.read()
+    assert('CMD INSTALL' in script)
+    assert(os.path.join(dest, 'FooBar_0.99.1.tar.gz') in script)
+    shutil.rmtree(folder)
+
+
+def test_rpacks_download_makefile():
+    folder = tempfile.mkdtemp()
+    configfilepath = create_config(folder)
+    dest = os.path.join(folder, 'dest')
+    os.makedirs(dest)
+    argv = ['rpackd', '--config', configfilepath, '--repo', 'local',
+            '--Renv', 'R-fake', '--packages', 'FooBar', '--dest', dest,
+            '--format', 'makefile']
+    with patch('sys.argv', argv):
+        rpacks_download()
+    assert(os.path.exists(os.path.join(dest, 'FooBar_0.99.1.tar.gz')))
+    with open(os.path.join(dest, 'Makefile')) as f:
+        makefile = f.read()
+    assert('all: FooBar.installed' in makefile)
+    shutil.rmtree(folder)
+
+
+def test_rpacks_mirror_since_changed():
+    root = tempfile.mkdtemp()
+    a3 = {'Package': 'A3', 'Version': '1.0.0', 'License': 'GPL (>= 2)'}
+    abc = {'Package': 'abc', 'Version': '2.1', 'License': 'GPL (>= 3)'}
+    SnapshotServer.add_snapshot(root, '2018-02-27', '3.4.3', [a3, abc])
+    # A3 is rebuilt under the same name with another content
+    SnapshotServer.add_snapshot(root, '2018-02-28', '3.4.3',
+                                [dict(a3, Packaged='2018-02-28'), abc])
+    contrib = os.path.join(root, 'snapshot', '{0}', 'src', 'contrib', '{1}')
+    with open(contrib.format('2018-02-28', 'A3_1.0.0.tar.gz'), 'rb') as f:
+        newcontent = f.read()
+    configfilepath = os.path.join(root, 'rpackutils.conf')
+    with open(configfilepath, 'w') as f:
+        f.write(ARTIFACTORY_CONFIG)
+    # the packages of the previous snapshot are already deployed
+    listing = {'files': [
+        {'uri': '/' + x, 'folder': False,
+         'sha1': Utils.checksums(contrib.format('2018-02-27', x))['sha1']}
+        for x in ('A3_1.0.0.tar.gz', 'abc_2.1.tar.gz')]}
+    uploads = {}
+
+    def do_request(url, method='get', data=None, headers=None, **kwargs):
+        if method == 'get':
+            return MockResponse(200, json.dumps(listing))
+        if data is None:
+            # the content is unknown to Artifactory
+            return MockResponse(404, '{}')
+        uploads[os.path.basename(url).split(';')[0]] = data.read()
+        return MockResponse(201, '{}')
+
+    with SnapshotServer(root) as server:
+        argv = ['rpackm', '--config', configfilepath,
+                '--input-repository', 'cran',
+                '--inputrepoparam', '2018-02-28', '--since', '2018-02-27',
+                '--output-repository', 'artifactory',
+                '--output-repository-folder', 'R-local']
+        with patch('sys.argv', argv), \
+                patch('rpackutils.cli.cliMirror.CRAN',
+                      lambda cachedir: CRAN(baseurl=server.baseurl)), \
+                patch('rpackutils.providers.artifactory.Artifactory.'
+                      '_do_request', side_effect=do_request):
+            rpacks_mirror()
+    # the changed package is replaced without --overwrite
+    assert(uploads == {'A3_1.0.0.tar.gz': newcontent})
+    shutil.rmtree(root)
@@ -0,0 +1,86 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import sys
+import time
+import tempfile
+import shutil
+
+from rpackutils.command import Command
+
+
+def test_run():
+    command = Command([sys.executable, '-c',
+                       'import sys; print("hello"); '
+                       'print("world", file=sys.stderr)'])
+    (returncode, out, err) = command.run(timeout=30)
+    assert(returncode == 0)
+    assert(out == 'hello')
+    assert(err == 'world')
+    assert(not command.timedout)
+
+
+def test_run_returncode():
+    command = Command([sys.executable, '-c', 'import sys; sys.exit(3)'])
+    (returncode, out, err) = command.run(timeout=30)
+    assert(returncode == 3)
+    assert(out is None)
+    assert(err is None)
+
+
+def test_run_logfile_and_tail():
+    logdir = tempfile.mkdtemp()
+    logfile = os.path.join(logdir, 'out.log')
+    command = Command([sys.executable, '-c',
+                       'import sys\n'
+                       'print("ERROR: first line", file=sys.stderr)\n'
+                       'for i in range(1000):\n'
+                       '    print("line {}".format(i))\n'],
+                      logfile=logfile,
+                      markers=['ERROR:'],
+                      taillines=10)
+    (returncode, out, err) = command.run(timeout=30)
+    assert(returncode == 0)
+    # only the tail is kept in memory
+    assert(len(out.split('\n')) == 10)
+    assert(out.split('\n')[-1] == 'line 999')
+    assert('ERROR: first line' in err)
+    assert(command.matches == [('stderr', 'ERROR: first line')])
+    # the whole output is in the log file
+    with open(logfile) as f:
+        lines = f.read().splitlines()
+    assert(len(lines) == 1001)
+    assert('line 0' in lines)
+    shutil.rmtree(logdir)
+
+
+def test_run_marker_out_of_tail():
+    command = Command([sys.executable, '-c',
+                       'print("Execution halted")\n'
+                       'for i in range(100):\n'
+                       '    print(i)\n'],
+                      markers=['Execution halted'],
+                      taillines=5)
+    (returncode, out, err) = command.run(timeout=30)
+    assert(returncode == 0)
+    # matching lines are kept even if they are not part of the tail
+    assert(out.split('\n')[0] == 'Execution halted')
+    assert(len(out.split('\n')) == 6)
+
+
+def test_run_timeout():
+    # the child spawns a grand child, both have to be killed
+    command = Command([sys.executable, '-c',
+                       'import subprocess, sys, time\n'
+                       'subprocess.Popen([sys.executable, "-c", '
+                       '"import time; time.sleep(60)"])\n'
+                       'time.sleep(60)\n'])
+    starttime = time.time()
+    (returncode, out, err) = command.run(timeout=1)
+    assert(time.time() - starttime < 30)
+    assert(returncode == -1)
+    assert(command.timedout)
+    assert('killed' in err)
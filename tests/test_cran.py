@@ -7,12 +7,16 @@ import pytest
 import os
 import glob
 import tarfile
+import gzip
 import tempfile
 import shutil
+import requests
+from unittest.mock import patch
 
 from rpackutils.packinfo import PackInfo
 from rpackutils.packinfo import PackStatus
 from rpackutils.providers.cran import CRAN
+from rpackutils.snapshotdb import SnapshotDB
 from rpackutils.utils import Utils
 
 ####################################################################
@@ -191,3 +195,296 @@ def test_packinfo():
     assert('knitr' in pi.suggests)
     assert('rmarkdown' in pi.suggests)
     assert('markdown' in pi.suggests)
+
+
+class MockResponse(object):
+    def __init__(self, status_code, text, content=None):
+        self.status_code = status_code
+        self.text = text
+        self.content = content
+        self.headers = {}
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        yield self.content
+
+    def close(self):
+        pass
+
+
+PACKAGES_PAGE = """<html><body><pre>
+<a href="../">../</a>
+<a href="A3_1.0.0.tar.gz">A3_1.0.0.tar.gz</a>
+<a href="abc_2.1.tar.gz">abc_2.1.tar.gz</a>
+<a href="abc.data_1.0.tar.gz">abc.data_1.0.tar.gz</a>
+<a href="PACKAGES">PACKAGES</a>
+</pre></body></html>"""
+
+
+@patch('rpackutils.httpsession.HttpSession.get')
+@patch('rpackutils.providers.cran.CRAN.check_connection')
+def test_snapshot_listing_cache(mock_check_connection, mock_get):
+    cachedir = tempfile.mkdtemp()
+    mock_check_connection.return_value = True
+    mock_get.return_value = MockResponse(200, PACKAGES_PAGE)
+    mran = CRAN(cachedir=cachedir, usepackagesindex=False)
+    assert(mran.ls('2018-02-27') == ['A3_1.0.0.tar.gz', 'abc_2.1.tar.gz',
+                                     'abc.data_1.0.tar.gz'])
+    assert(mran.find('abc_*.tar.gz', '2018-02-27') == ['abc_2.1.tar.gz'])
+    assert(mran.find('abc*', '2018-02-27') == ['abc_2.1.tar.gz',
+                                               'abc.data_1.0.tar.gz'])
+    assert(mran.find('A3_1.0.0.tar.gz', '2018-02-27') ==
+           ['A3_1.0.0.tar.gz'])
+    assert(mran.find('zzz_*.tar.gz', '2018-02-27') == [])
+    # the page was parsed once
+    assert(mock_get.call_count == 1)
+    # and is read from the disk by another run
+    mran = CRAN(cachedir=cachedir, usepackagesindex=False)
+    assert(mran.ls('2018-02-27', packagenamesonly=True) ==
+           ['A3', 'abc', 'abc.data'])
+    assert(mock_get.call_count == 1)
+    # errors are not cached
+    mock_get.return_value = MockResponse(404, 'Not found')
+    assert(mran.find('abc_*.tar.gz', '2014-01-01') == [])
+    assert(mran.find('abc_*.tar.gz', '2014-01-01') == [])
+    assert(mock_get.call_count == 3)
+    shutil.rmtree(cachedir)
+
+
+PACKAGES_INDEX = """Package: A3
+Version: 1.0.0
+Depends: R (>= 2.15.0), xtable, pbapply
+Suggests: randomForest, e1071
+License: GPL (>= 2)
+MD5sum: 027ebdd8affce8f0effaecfcd5f5ade2
+NeedsCompilation: no
+
+Package: abc
+Version: 2.1
+Depends: R (>= 2.10), abc.data, nnet, quantreg, MASS,
+        locfit
+License: GPL (>= 3)
+MD5sum: c9fffe4334c178917f762735aba59653
+"""
+
+
+@patch('rpackutils.httpsession.HttpSession.get')
+@patch('rpackutils.providers.cran.CRAN.check_connection')
+def test_packages_index(mock_check_connection, mock_get):
+    cachedir = tempfile.mkdtemp()
+    mock_check_connection.return_value = True
+    mock_get.return_value = MockResponse(
+        200, None, gzip.compress(PACKAGES_INDEX.encode('utf-8')))
+    mran = CRAN(cachedir=cachedir)
+    assert(mran.ls('2018-02-27') == ['A3_1.0.0.tar.gz', 'abc_2.1.tar.gz'])
+    assert(mock_get.call_args[0][0] ==
+           'https://mran.revolutionanalytics.com/snapshot/2018-02-27/'
+           'src/contrib/PACKAGES.gz')
+    # the package information is read from the index
+    packinfo = mran.packinfo('abc', '2018-02-27')
+    assert(packinfo.version == '2.1')
+    assert(packinfo.depends == ['R', 'abc.data', 'nnet', 'quantreg', 'MASS',
+                                'locfit'])
+    assert(packinfo.license == 'GPL (>= 3)')
+    assert(packinfo.status == PackStatus.PARSED)
+    packinfo = mran.packinfo('A3_1.0.0.tar.gz', '2018-02-27')
+    assert(packinfo.suggests == ['randomForest', 'e1071'])
+    assert(mran._index_checksums('2018-02-27', 'A3_1.0.0.tar.gz') ==
+           {'md5': '027ebdd8affce8f0effaecfcd5f5ade2'})
+    assert(mran.packinfo('zzz', '2018-02-27').status ==
+           PackStatus.NOT_FOUND)
+    # a single download for all of them
+    assert(mock_get.call_count == 1)
+    # without index, the html page is parsed
+    mock_get.return_value = MockResponse(404, 'Not found')
+    assert(mran.packages_index('2014-01-01') is None)
+    shutil.rmtree(cachedir)
+
+
+@patch('rpackutils.httpsession.HttpSession.get')
+@patch('rpackutils.providers.cran.CRAN.check_connection')
+def test_connection_health(mock_check_connection, mock_get):
+    mock_check_connection.return_value = True
+    mran = CRAN(cachedir=None)
+    # no connection check while the requests succeed
+    mock_check_connection.reset_mock()
+    mock_get.return_value = MockResponse(200, PACKAGES_PAGE)
+    mran.usepackagesindex = False
+    mran.ls('2018-02-27')
+    mran.ls('2018-02-28')
+    assert(not mock_check_connection.called)
+    # the server goes down
+    mock_get.side_effect = requests.exceptions.ConnectionError('down')
+    for i in range(0, 3):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            mran.ls('2018-03-0{}'.format(i + 1))
+    assert(mran._health.is_open)
+    # the next calls fail at once, without any request
+    mock_get.reset_mock()
+    with pytest.raises(FileNotFoundError):
+        mran.ls('2018-03-04')
+    assert(not mock_get.called)
+    # until a probe succeeds
+    mran._health.ttl = 0
+    mock_get.side_effect = None
+    assert(mran.ls('2018-03-04') == ['A3_1.0.0.tar.gz', 'abc_2.1.tar.gz',
+                                     'abc.data_1.0.tar.gz'])
+    assert(mock_check_connection.call_count == 1)
+    assert(not mran._health.is_open)
+
+
+SNAPSHOTS_PAGE = """<html><body><pre>
+<a href="../">../</a>
+<a href="2014-08-18_0233/">2014-08-18_0233/</a>
+<a href="2015-03-10/">2015-03-10/</a>
+<a href="2015-03-11/">2015-03-11/</a>
+</pre></body></html>"""
+
+
+def mock_snapshots_get(url, **kwargs):
+    if not url.endswith('banner.shtml'):
+        return MockResponse(200, SNAPSHOTS_PAGE)
+    version = '3.1.1' if '2014-08-18' in url else '3.1.3'
+    return MockResponse(
+        200,
+        '<a href="src/base/R-3/R-{0}.tar.gz">R-{0}.tar.gz</a>'
+        .format(version))
+
+
+@patch('rpackutils.httpsession.HttpSession.get')
+@patch('rpackutils.providers.cran.CRAN.check_connection')
+def test_ls_snapshots_db(mock_check_connection, mock_get):
+    tmpdir = tempfile.mkdtemp()
+    mock_check_connection.return_value = True
+    mock_get.side_effect = mock_snapshots_get
+    mran = CRAN(cachedir=None)
+    assert(mran.ls_snapshots(rversion='3.1.3', todate='2015-03-10') ==
+           {'3.1.3': ['2015-03-10']})
+    db = SnapshotDB(os.path.join(tmpdir, 'snapshots.db'))
+    mock_get.reset_mock()
+    assert(mran.ls_snapshots(rversion='3.1.3', db=db) ==
+           {'3.1.3': ['2015-03-10', '2015-03-11']})
+    # the index and the 3 banners
+    assert(mock_get.call_count == 4)
+    assert(len(db) == 3)
+    # only the index is fetched again
+    mock_get.reset_mock()
+    assert(mran.ls_snapshots(db=db, fromdate='2014-08-18',
+                             todate='2014-08-18') ==
+           {'3.1.1': ['2014-08-18_0233']})
+    assert(mock_get.call_count == 1)
+    db.close()
+    shutil.rmtree(tmpdir)
+
+
+def mock_history_get(url, **kwargs):
+    # 300 daily snapshots: R 3.1.1, then 3.1.2 and 3.10.0
+    if not url.endswith('banner.shtml'):
+        return MockResponse(200, '<a href="../">../</a>' + ''.join(
+            ['<a href="2015-{0:03d}/">2015-{0:03d}/</a>'.format(i)
+             for i in range(0, 300)]))
+    day = int(url.split('/')[-2].split('-')[1])
+    if day == 150:
+        return MockResponse(200, 'Banner not found')
+    version = '3.1.1' if day < 100 else '3.1.2' if day < 220 else '3.10.0'
+    return MockResponse(
+        200,
+        '<a href="src/base/R-3/R-{0}.tar.gz">R-{0}.tar.gz</a>'
+        .format(version))
+
+
+@patch('rpackutils.httpsession.HttpSession.get')
+@patch('rpackutils.providers.cran.CRAN.check_connection')
+def test_bisect_snapshots(mock_check_connection, mock_get):
+    tmpdir = tempfile.mkdtemp()
+    mock_check_connection.return_value = True
+    mock_get.side_effect = mock_history_get
+    mran = CRAN(cachedir=None)
+    version2dates = mran.bisect_snapshots('3.1.2')
+    assert(version2dates == {'3.1.2': ['2015-{0:03d}'.format(i)
+                                       for i in range(100, 220)]})
+    # the index and a few banners
+    assert(mock_get.call_count < 25)
+    assert(mran.bisect_snapshots('3.10.0', fromdate='2015-250') ==
+           {'3.10.0': ['2015-{0:03d}'.format(i)
+                       for i in range(250, 300)]})
+    assert(mran.bisect_snapshots('3.1.0') == {})
+    assert(mran.bisect_snapshots('3.2.0') == {})
+    # the banners fetched are recorded and not fetched again, but the
+    # one which cannot be parsed
+    db = SnapshotDB(os.path.join(tmpdir, 'snapshots.db'))
+    assert(mran.bisect_snapshots('3.1.1', db=db) ==
+           {'3.1.1': ['2015-{0:03d}'.format(i) for i in range(0, 100)]})
+    assert(len(db) > 0)
+    mock_get.reset_mock()
+    assert(mran.bisect_snapshots('3.1.1', db=db) ==
+           {'3.1.1': ['2015-{0:03d}'.format(i) for i in range(0, 100)]})
+    assert(mock_get.call_count == 2)
+    db.close()
+    shutil.rmtree(tmpdir)
+
+
+@patch('rpackutils.httpsession.HttpSession.get')
+@patch('rpackutils.providers.cran.CRAN.check_connection')
+def test_download_tarballs(mock_check_connection, mock_get):
+    dest = tempfile.mkdtemp()
+    mock_check_connection.return_value = True
+    mock_get.return_value = MockResponse(200, PACKAGES_PAGE)
+    mran = CRAN(cachedir=None, usepackagesindex=False)
+    tarballs = mran.ls('2018-02-27')
+    mock_get.reset_mock()
+    mock_get.return_value = MockResponse(200, None, gzip.compress(b'R'))
+    statuses = []
+    retVals = mran.download_tarballs(
+        '2018-02-27', tarballs, dest, procs=2,
+        callback=lambda i, status: statuses.append(status))
+    assert(retVals == [PackStatus.DOWNLOADED] * 3)
+    assert(statuses == [PackStatus.DOWNLOADED] * 3)
+    assert(sorted(os.listdir(dest)) == sorted(tarballs))
+    # a single request per package, straight to the tarball
+    assert(sorted([c[0][0] for c in mock_get.call_args_list]) ==
+           ['https://mran.revolutionanalytics.com/snapshot/2018-02-27/'
+            'src/contrib/' + x for x in sorted(tarballs)])
+    shutil.rmtree(dest)
+
+
+PACKAGES_INDEX_NEXT = """Package: A3
+Version: 1.0.0
+License: GPL (>= 2)
+MD5sum: 1111111111111111111111111111111a
+
+Package: abc
+Version: 2.2
+License: GPL (>= 3)
+MD5sum: c9fffe4334c178917f762735aba59653
+
+Package: zoo
+Version: 1.8-6
+License: GPL-2 | GPL-3
+MD5sum: 2217a4f362f2201443b5fe6b66a2b23f
+"""
+
+
+def mock_indexes_get(url, **kwargs):
+    if '2018-02-27' in url:
+        index = PACKAGES_INDEX
+    elif '2018-02-28' in url:
+        index = PACKAGES_INDEX_NEXT
+    else:
+        index = PACKAGES_INDEX.replace('Package: abc', 'Package: abd')
+    return MockResponse(200, None, gzip.compress(index.encode('utf-8')))
+
+
+@patch('rpackutils.httpsession.HttpSession.get')
+@patch('rpackutils.providers.cran.CRAN.check_connection')
+def test_delta(mock_check_connection, mock_get):
+    mock_check_connection.return_value = True
+    mock_get.side_effect = mock_indexes_get
+    mran = CRAN(cachedir=None)
+    changed, removed = mran.delta('2018-02-27', '2018-02-28')
+    # a new version, a rebuilt tarball and a new package
+    assert(changed == ['A3_1.0.0.tar.gz', 'abc_2.2.tar.gz',
+                       'zoo_1.8-6.tar.gz'])
+    assert(removed == ['abc_2.1.tar.gz'])
+    assert(mran.delta('2018-02-27', '2018-02-27') == ([], []))
+    assert(mran.delta('2018-02-27', '2018-03-01') ==
+           (['abd_2.1.tar.gz'], ['abc_2.1.tar.gz']))
@@ -0,0 +1,146 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from rpackutils.downloadsink import DownloadSink
+from rpackutils.packinfo import PackStatus
+from rpackutils.providers.cranlike import CRANLike
+from tests.snapshotserver import SnapshotServer
+
+
+PACKAGES = [
+    {'Package': 'A3', 'Version': '1.0.0',
+     'Depends': 'R (>= 2.15.0), xtable, pbapply',
+     'License': 'GPL (>= 2)'},
+    {'Package': 'abc', 'Version': '2.1',
+     'Depends': 'R (>= 2.10), abc.data, nnet, quantreg, MASS, locfit',
+     'License': 'GPL (>= 3)'},
+]
+
+
+def create_fixtures():
+    root = tempfile.mkdtemp()
+    SnapshotServer.add_snapshot(root, '2018-02-27', '3.4.3', PACKAGES)
+    SnapshotServer.add_snapshot(
+        root, '2018-04-23', '3.4.4',
+        [PACKAGES[0], {'Package': 'abc', 'Version': '2.2',
+                       'License': 'GPL (>= 3)'}])
+    # the previous version of abc is archived
+    archive = os.path.join(root, 'snapshot', '2018-04-23', 'src', 'contrib',
+                           'Archive', 'abc')
+    os.makedirs(archive)
+    shutil.copy(os.path.join(root, 'snapshot', '2018-02-27', 'src',
+                             'contrib', 'abc_2.1.tar.gz'), archive)
+    return root
+
+
+def test_cranlike():
+    root = create_fixtures()
+    dest = tempfile.mkdtemp()
+    with SnapshotServer(root) as server:
+        # a single contrib folder
+        cranlike = CRANLike(server.baseurl + '/snapshot/2018-04-23')
+        assert(cranlike.contrib_url() == server.baseurl +
+               '/snapshot/2018-04-23/src/contrib/')
+        assert(cranlike.check_connection())
+        assert(cranlike.ls() == ['A3_1.0.0.tar.gz', 'abc_2.2.tar.gz'])
+        assert(cranlike.ls(packagenamesonly=True) == ['A3', 'abc'])
+        assert(cranlike.find('abc_*.tar.gz') == ['abc_2.2.tar.gz'])
+        assert(cranlike.find('A*') == ['A3_1.0.0.tar.gz'])
+        # the previous versions are found in the archive
+        assert(cranlike.archive('abc') == ['Archive/abc/abc_2.1.tar.gz'])
+        assert(cranlike.find('abc_2.1.tar.gz') ==
+               ['Archive/abc/abc_2.1.tar.gz'])
+        assert(cranlike.find('abc_1.0.tar.gz') == [])
+        packinfo = cranlike.packinfo('abc')
+        assert(packinfo.version == '2.2')
+        assert(packinfo.status == PackStatus.PARSED)
+        packinfo = cranlike.packinfo('abc_2.1.tar.gz')
+        assert(packinfo.version == '2.1')
+        assert('abc.data' in packinfo.depends)
+        packinfo = cranlike.packinfo('A3', keeptempfiles=True)
+        assert(os.path.exists(packinfo.packagepath))
+        shutil.rmtree(packinfo.tempdir)
+        assert(cranlike.packinfo('zzz').status == PackStatus.NOT_FOUND)
+        retVals = cranlike.download_multiple(
+            ['A3', 'abc_2.1.tar.gz', 'zzz'], dest, procs=2)
+        assert(retVals == [PackStatus.DOWNLOADED, PackStatus.DOWNLOADED,
+                           PackStatus.NOT_FOUND])
+        assert(sorted(os.listdir(dest)) == ['A3_1.0.0.tar.gz',
+                                            'abc_2.1.tar.gz'])
+        # dated snapshots below a common base URL
+        cranlike = CRANLike(server.baseurl + '/snapshot',
+                            ['2018-02-27', '2018-04-23'])
+        assert(cranlike.ls() == ['2018-02-27/A3_1.0.0.tar.gz',
+                                 '2018-02-27/abc_2.1.tar.gz',
+                                 '2018-04-23/A3_1.0.0.tar.gz',
+                                 '2018-04-23/abc_2.2.tar.gz'])
+        # the same tarball of both snapshots is downloaded once
+        for filename in os.listdir(dest):
+            os.remove(os.path.join(dest, filename))
+        statuses = []
+        with patch('rpackutils.providers.cranlike.DownloadSink.fetch',
+                   side_effect=DownloadSink.fetch) as mock_fetch:
+            retVals = cranlike.download_multiple(
+                cranlike.ls(), dest, procs=4,
+                callback=lambda i, status: statuses.append(i))
+        assert(retVals == [PackStatus.DOWNLOADED] * 4)
+        assert(sorted(statuses) == [0, 1, 2, 3])
+        # from the first snapshot listing it
+        assert(sorted([c[0][1][len(server.baseurl):]
+                       for c in mock_fetch.call_args_list]) ==
+               ['/snapshot/2018-02-27/src/contrib/A3_1.0.0.tar.gz',
+                '/snapshot/2018-02-27/src/contrib/abc_2.1.tar.gz',
+                '/snapshot/2018-04-23/src/contrib/abc_2.2.tar.gz'])
+        assert(sorted(os.listdir(dest)) == ['A3_1.0.0.tar.gz',
+                                            'abc_2.1.tar.gz',
+                                            'abc_2.2.tar.gz'])
+        # the most recent version is taken
+        assert(cranlike.packinfo('abc').version == '2.2')
+        assert(cranlike.packinfo('2018-02-27/abc_2.1.tar.gz').version ==
+               '2.1')
+        # no index
+        cranlike = CRANLike(server.baseurl + '/nowhere')
+        assert(not cranlike.check_connection())
+        assert(cranlike.ls() == [])
+    shutil.rmtree(dest)
+    shutil.rmtree(root)
+
+
+def test_cranlike_unreachable():
+    root = tempfile.mkdtemp()
+    # a port nobody listens to anymore
+    with SnapshotServer(root) as server:
+        baseurl = server.baseurl
+    cranlike = CRANLike(baseurl, ['2023-01-03', 'latest'],
+                        retries=0, backoff=0)
+    assert(not cranlike.check_connection())
+    assert(cranlike.ls() == [])
+    assert(cranlike.find('abc*') == [])
+    assert(cranlike.archive('abc') == [])
+    assert(cranlike.packinfo('abc').status == PackStatus.NOT_FOUND)
+    assert(cranlike.download_single('abc', root) == PackStatus.NOT_FOUND)
+    # once the server is known to be down, the requests are not sent
+    cranlike.invalidate_cache()
+    assert(cranlike.ls() == [])
+    shutil.rmtree(root)
+
+
+def test_cranlike_corrupt_packages_gz():
+    root = create_fixtures()
+    contrib = os.path.join(root, 'snapshot', '2018-04-23', 'src', 'contrib')
+    # a truncated upload of the compressed index
+    with open(os.path.join(contrib, 'PACKAGES.gz'), 'wb') as f:
+        f.write(b'\x1f\x8b\x08\x00corrupt')
+    with SnapshotServer(root) as server:
+        cranlike = CRANLike(server.baseurl + '/snapshot/2018-04-23')
+        # the uncompressed index is read instead
+        assert(cranlike.ls() == ['A3_1.0.0.tar.gz', 'abc_2.2.tar.gz'])
+        assert(cranlike.packinfo('abc').version == '2.2')
+    shutil.rmtree(root)
@@ -6,6 +6,7 @@
 import os
 import json
 import pytest
+import tempfile
 from unittest import mock
 from unittest.mock import patch
 
@@ -149,3 +150,31 @@ def test_processnode_ok(mock_packinfo):
     assert(not dm.notfound)
     assert(not dm.downloadfailed)
     assert(dm.processed[0] == package)
+
+
+@patch('rpackutils.providers.artifactory.Artifactory.packinfo')
+def test_processnode_keeptempfiles(mock_packinfo):
+    arti = create()
+    tempdirs = {}
+
+    def packinfo(packagename, keeptempfiles):
+        pi = PackInfoMock(packagename, PackStatus.DOWNLOADED)
+        pi.tempdir = tempfile.mkdtemp()
+        tempdirs[packagename] = pi.tempdir
+        if packagename == 'fakePackage1':
+            pi.dependencies = lambda withBasePackages: ['fakePackage2',
+                                                        'utils']
+        return pi
+
+    mock_packinfo.side_effect = packinfo
+    packnodes = []
+    dm = DepsManager(arti, packnodes.append, keeptempfiles=True)
+    dm.processnode(PackNode('fakePackage1'))
+    # dependencies are processed first
+    assert([n.idt for n in packnodes] == ['fakePackage2', 'fakePackage1'])
+    assert(packnodes[1].dependencies == ['fakePackage2', 'utils'])
+    assert(packnodes[0].dependencies == [])
+    # the temp files are kept until cleanup
+    assert(all(os.path.exists(t) for t in tempdirs.values()))
+    dm.cleanup()
+    assert(not any(os.path.exists(t) for t in tempdirs.values()))
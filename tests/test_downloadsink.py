@@ -0,0 +1,183 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import gzip
+import shutil
+import hashlib
+import tempfile
+
+import pytest
+import requests
+
+from rpackutils.downloadsink import DownloadSink
+from rpackutils.downloadsink import DownloadError
+
+CONTENT = gzip.compress(b'Package: FooBar\nVersion: 0.99.1\n')
+
+
+class MockResponse(object):
+    def __init__(self, status_code, content, headers=None, failat=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers if headers is not None else {
+            'Content-Length': str(len(content))}
+        self.failat = failat
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        # a chunk shorter than the gzip magic bytes first
+        yield self.content[:1]
+        if self.failat is not None:
+            yield self.content[1:self.failat]
+            raise requests.exceptions.ChunkedEncodingError('Connection reset')
+        yield self.content[1:]
+
+    def close(self):
+        pass
+
+
+class MockServer(object):
+    """
+    Serve a content with Range requests support, the first responses
+    being interrupted after failat bytes.
+    """
+
+    def __init__(self, content, failures=0, failat=None, ranges=True):
+        self.content = content
+        self.failures = failures
+        self.failat = failat
+        self.ranges = ranges
+        self.requests = []
+
+    def get(self, url, headers):
+        self.requests.append(headers)
+        content = self.content
+        status_code = 200
+        responseheaders = {'Accept-Ranges': 'bytes'} if self.ranges else {}
+        if headers and 'Range' in headers and self.ranges:
+            start, end = headers['Range'][len('bytes='):].split('-')
+            end = int(end) if end else len(self.content) - 1
+            content = self.content[int(start):end + 1]
+            status_code = 206
+            responseheaders['Content-Range'] = 'bytes {}-{}/{}'.format(
+                start, end, len(self.content))
+        responseheaders['Content-Length'] = str(len(content))
+        failat = None
+        if self.failures > 0:
+            self.failures -= 1
+            failat = self.failat
+        return MockResponse(status_code, content, responseheaders, failat)
+
+
+def test_save():
+    dest = tempfile.mkdtemp()
+    targetpath = os.path.join(dest, 'FooBar_0.99.1.tar.gz')
+    sha1 = hashlib.sha1(CONTENT).hexdigest()
+    r = MockResponse(200, CONTENT, {'Content-Length': str(len(CONTENT)),
+                                    'X-Checksum-Sha1': sha1})
+    sink = DownloadSink.save(r, targetpath,
+                             {'md5': hashlib.md5(CONTENT).hexdigest()})
+    assert(sink.written == len(CONTENT))
+    with open(targetpath, 'rb') as f:
+        assert(f.read() == CONTENT)
+    # only the target file is left
+    assert(os.listdir(dest) == ['FooBar_0.99.1.tar.gz'])
+    shutil.rmtree(dest)
+
+
+def test_invalid():
+    dest = tempfile.mkdtemp()
+    targetpath = os.path.join(dest, 'FooBar_0.99.1.tar.gz')
+    invalids = [
+        # an error page
+        MockResponse(200, b'<html>Not found</html>'),
+        MockResponse(404, CONTENT),
+        MockResponse(200, b''),
+        # a truncated download
+        MockResponse(200, CONTENT[:-4], {'Content-Length':
+                                         str(len(CONTENT))}),
+        MockResponse(200, CONTENT, {'X-Checksum-Sha1': '0' * 40}),
+    ]
+    for r in invalids:
+        with pytest.raises(DownloadError):
+            DownloadSink.save(r, targetpath)
+        # nothing reaches the target path, no temp file is left
+        assert(os.listdir(dest) == [])
+    # an expected checksum overrides the headers
+    with pytest.raises(DownloadError):
+        DownloadSink.save(MockResponse(200, CONTENT), targetpath,
+                          {'sha256': hashlib.sha256(b'').hexdigest()})
+    # files other than tarballs
+    DownloadSink.save(MockResponse(200, b'{}'), targetpath, checkgzip=False)
+    assert(os.path.exists(targetpath))
+    shutil.rmtree(dest)
+
+
+def test_fetch_resume():
+    dest = tempfile.mkdtemp()
+    targetpath = os.path.join(dest, 'FooBar_0.99.1.tar.gz')
+    content = gzip.compress(os.urandom(4096))
+    checksums = {'sha1': hashlib.sha1(content).hexdigest()}
+    # two interruptions, resumed where they stopped
+    server = MockServer(content, failures=2, failat=1000)
+    DownloadSink.fetch(server.get, 'url', targetpath, checksums)
+    with open(targetpath, 'rb') as f:
+        assert(f.read() == content)
+    assert(server.requests == [None,
+                               {'Range': 'bytes=1000-'},
+                               {'Range': 'bytes=2000-'}])
+    os.remove(targetpath)
+    # too many interruptions, the partial file is kept
+    server = MockServer(content, failures=3, failat=1000)
+    with pytest.raises(DownloadError):
+        DownloadSink.fetch(server.get, 'url', targetpath, checksums,
+                           retries=1)
+    partialpath = DownloadSink.partialpath(targetpath)
+    assert(os.path.getsize(partialpath) == 2000)
+    # and resumed by the next run
+    server = MockServer(content)
+    DownloadSink.fetch(server.get, 'url', targetpath, checksums)
+    assert(server.requests == [{'Range': 'bytes=2000-'}])
+    assert(os.listdir(dest) == ['FooBar_0.99.1.tar.gz'])
+    os.remove(targetpath)
+    # a server ignoring the Range requests sends everything again
+    with open(partialpath, 'wb') as f:
+        f.write(content[:10])
+    server = MockServer(content, failures=1, failat=1000, ranges=False)
+    DownloadSink.fetch(server.get, 'url', targetpath, checksums)
+    with open(targetpath, 'rb') as f:
+        assert(f.read() == content)
+    shutil.rmtree(dest)
+
+
+def test_fetch_segments():
+    dest = tempfile.mkdtemp()
+    targetpath = os.path.join(dest, 'FooBar_0.99.1.tar.gz')
+    content = gzip.compress(os.urandom(10000))
+    checksums = {'md5': hashlib.md5(content).hexdigest()}
+    server = MockServer(content, failures=2, failat=100)
+    DownloadSink.fetch(server.get, 'url', targetpath, checksums,
+                       segments=3, segmentthreshold=1000)
+    with open(targetpath, 'rb') as f:
+        assert(f.read() == content)
+    ranges = sorted([h['Range'] for h in server.requests if h])
+    assert(len(ranges) >= 3)
+    assert(os.listdir(dest) == ['FooBar_0.99.1.tar.gz'])
+    # a wrong checksum is detected once the segments are written
+    os.remove(targetpath)
+    with pytest.raises(DownloadError):
+        DownloadSink.fetch(MockServer(content).get, 'url', targetpath,
+                           {'md5': '0' * 32},
+                           segments=3, segmentthreshold=1000)
+    assert(os.listdir(dest) == [])
+    shutil.rmtree(dest)
+
+
+def test_chunk_size():
+    assert(DownloadSink.chunk_size(None) == 64 * 1024)
+    assert(DownloadSink.chunk_size(1024) == 64 * 1024)
+    assert(DownloadSink.chunk_size(64 * 1024 * 1024) == 1024 * 1024)
+    assert(DownloadSink.chunk_size(4 * 1024 * 1024 * 1024)
+           == 4 * 1024 * 1024)
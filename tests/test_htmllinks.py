@@ -0,0 +1,45 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+from rpackutils.htmllinks import HtmlLinks
+
+
+DIRECTORY_PAGE = """<html>
+<head><title>Index of /snapshot/2018-02-27/src/contrib/</title></head>
+<body><h1>Index of /snapshot/2018-02-27/src/contrib/</h1><hr><pre>
+<a href="../">../</a>
+<a href="A3_1.0.0.tar.gz">A3_1.0.0.tar.gz</a>    26-Feb-2018 02:46   63203
+<A HREF='abc_2.1.tar.gz' title="abc">abc_2.1.tar.gz</A>
+<a class="pkg" href=R.oo_1.21.0.tar.gz><b>R.oo</b>_1.21.0.tar.gz</a>
+<a href="Tom&amp;Jerry_1.0.tar.gz">Tom&amp;Jerry_1.0.tar.gz</a>
+<a name="bottom">no link</a>
+</pre><hr></body>
+</html>"""
+
+
+def test_hrefs():
+    assert(HtmlLinks.hrefs(DIRECTORY_PAGE) == [
+        '../', 'A3_1.0.0.tar.gz', 'abc_2.1.tar.gz', 'R.oo_1.21.0.tar.gz',
+        'Tom&Jerry_1.0.tar.gz'])
+    assert(HtmlLinks.hrefs('') == [])
+
+
+def test_anchors():
+    assert(HtmlLinks.anchors(DIRECTORY_PAGE) == [
+        ('../', '../'),
+        ('A3_1.0.0.tar.gz', 'A3_1.0.0.tar.gz'),
+        ('abc_2.1.tar.gz', 'abc_2.1.tar.gz'),
+        ('R.oo_1.21.0.tar.gz', 'R.oo_1.21.0.tar.gz'),
+        ('Tom&Jerry_1.0.tar.gz', 'Tom&Jerry_1.0.tar.gz')])
+
+
+def test_texts():
+    page = """<h3>Bioconductor 3.7 (release)</h3>
+<p>...</p>
+<H3 class="devel">Bioconductor 3.8
+(devel)</H3>"""
+    assert(HtmlLinks.texts(page, 'h3') == ['Bioconductor 3.7 (release)',
+                                           'Bioconductor 3.8\n(devel)'])
+    assert(HtmlLinks.texts(page, 'h2') == [])
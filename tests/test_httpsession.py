@@ -0,0 +1,70 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import pickle
+from unittest.mock import patch
+
+from rpackutils.httpsession import HttpSession
+from rpackutils.httpsession import CONNECT_TIMEOUT_SEC
+from rpackutils.httpsession import READ_TIMEOUT_SEC
+
+
+def test_session():
+    http = HttpSession(auth=('john', 'secret'), verify=False,
+                       poolsize=4, retries=5, backoff=1)
+    session = http.session
+    # the session is reused
+    assert(http.session is session)
+    assert(session.auth == ('john', 'secret'))
+    assert(not session.verify)
+    adapter = session.get_adapter('https://artifactory/')
+    assert(adapter._pool_maxsize == 4)
+    assert(adapter.max_retries.total == 5)
+    assert(adapter.max_retries.backoff_factor == 1)
+    assert(429 in adapter.max_retries.status_forcelist)
+    assert(503 in adapter.max_retries.status_forcelist)
+    # the requests sending a body are retried by their callers
+    assert('GET' in adapter.max_retries.allowed_methods)
+    assert('PUT' not in adapter.max_retries.allowed_methods)
+    assert(http.retry_delays() == [0, 1, 2, 4, 8, 16])
+
+
+def test_session_per_process():
+    http = HttpSession()
+    session = http.session
+    # a worker process gets its own session
+    with patch('os.getpid') as mock_getpid:
+        mock_getpid.return_value = os.getpid() + 1
+        assert(http.session is not session)
+    # pickled copies do not carry the connections
+    copy = pickle.loads(pickle.dumps(http))
+    assert(copy._session is None)
+    assert(copy.session is not session)
+
+
+def test_resize():
+    http = HttpSession(poolsize=2)
+    session = http.session
+    http.resize(8)
+    assert(http.poolsize == 8)
+    assert(http.session is not session)
+    assert(http.session.get_adapter('http://host/')._pool_maxsize == 8)
+
+
+@patch('requests.Session.request')
+def test_request_timeout(mock_request):
+    http = HttpSession()
+    http.get('https://artifactory/api/storage/R-local')
+    args, kwargs = mock_request.call_args
+    assert(args == ('get', 'https://artifactory/api/storage/R-local'))
+    assert(kwargs['timeout'] == (CONNECT_TIMEOUT_SEC, READ_TIMEOUT_SEC))
+    http = HttpSession(timeout=30)
+    http.request('put', 'https://artifactory/R-local/a.tar.gz', timeout=5)
+    args, kwargs = mock_request.call_args
+    assert(kwargs['timeout'] == 5)
+    http.get('https://artifactory/')
+    args, kwargs = mock_request.call_args
+    assert(kwargs['timeout'] == 30)
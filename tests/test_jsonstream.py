@@ -0,0 +1,49 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import json
+
+import pytest
+
+from rpackutils.jsonstream import JSONStream
+
+DOCUMENT = {
+    "uri": "https://artifactory.local/artifactory/api/storage/R-local",
+    "created": "2017-03-08T16:21:11.504+01:00",
+    "files": [{"uri": "/A_1.0.tar.gz", "size": 10, "folder": False},
+              {"uri": "/B_é_1.0.tar.gz", "size": 20, "folder": False},
+              {"uri": "/[files]: [", "size": 30, "folder": False}]
+}
+
+
+def chunked(text, size):
+    content = text.encode('utf-8')
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+def test_iter_array():
+    text = json.dumps(DOCUMENT, indent=2, ensure_ascii=False)
+    # any chunk size, including chunks splitting UTF-8 characters
+    for size in [1, 2, 3, 7, 64, len(text)]:
+        items = list(JSONStream.iter_array(chunked(text, size),
+                                           ['files', 'children']))
+        assert(items == DOCUMENT['files'])
+    # str chunks and numbers split between chunks
+    text = '{"children": [1234, 5678]}'
+    items = JSONStream.iter_array([text[:16], text[16:]], ['children'])
+    assert(list(items) == [1234, 5678])
+    assert(list(JSONStream.iter_array(['{"files": []}'], ['files'])) == [])
+
+
+def test_iter_array_invalid():
+    with pytest.raises(ValueError):
+        list(JSONStream.iter_array(chunked('{"errors": []}', 4), ['files']))
+    # the items received before the truncation are yielded
+    items = JSONStream.iter_array(chunked(json.dumps(DOCUMENT)[:-40], 5),
+                                  ['files'])
+    assert(next(items) == DOCUMENT['files'][0])
+    assert(next(items) == DOCUMENT['files'][1])
+    with pytest.raises(ValueError):
+        next(items)
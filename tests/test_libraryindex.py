@@ -0,0 +1,80 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from rpackutils.packinfo import PackInfo
+from rpackutils.libraryindex import LibraryIndex
+
+LIBRARY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    'resources/R-fake-env/packages')
+
+
+def create_library_copy():
+    tmpdir = tempfile.mkdtemp()
+    library = os.path.join(tmpdir, 'packages')
+    shutil.copytree(LIBRARY, library)
+    return tmpdir, library
+
+
+def add_package(library, name, version):
+    os.makedirs(os.path.join(library, name))
+    with open(os.path.join(library, name, 'DESCRIPTION'), 'w') as f:
+        f.write('Package: {}\nVersion: {}\nImports: energy\n'
+                'License: MIT\n'.format(name, version))
+
+
+def test_index():
+    index = LibraryIndex(LIBRARY)
+    # fake1 has no DESCRIPTION file
+    assert(index.names() == ['energy', 'entropy', 'evaluate',
+                             'faraway', 'fastcluster'])
+    assert(len(index) == 5)
+    assert('energy' in index)
+    assert('fake1' not in index)
+    assert(index.version('energy') == '1.6.2')
+    assert(index.version('foobar') is None)
+    energy = index.get('energy')
+    assert(energy.license == 'GPL (>= 2)')
+    assert(energy.imports == ['boot'])
+
+
+def test_index_base_packages():
+    tmpdir, library = create_library_copy()
+    add_package(library, 'utils', '3.2.5')
+    index = LibraryIndex(library)
+    assert('utils' not in index.names())
+    assert('utils' in index.names(withBasePackages=True))
+    shutil.rmtree(tmpdir)
+
+
+def test_index_invalidation():
+    tmpdir, library = create_library_copy()
+    # hidden folders are staging libraries
+    add_package(library, '.rpackutils_staging_x', '0.1')
+    with patch('rpackutils.libraryindex.PackInfo',
+               wraps=PackInfo) as mock_packinfo:
+        index = LibraryIndex(library)
+        assert(len(index) == 5)
+        assert(mock_packinfo.call_count == 5)
+        # nothing changed, the library is not scanned again
+        assert(len(index) == 5)
+        assert(mock_packinfo.call_count == 5)
+        # a new package only triggers the parsing of its DESCRIPTION
+        add_package(library, 'FooBar', '0.99.1')
+        index.invalidate()
+        assert(index.version('FooBar') == '0.99.1')
+        assert(index.get('FooBar').imports == ['energy'])
+        assert(mock_packinfo.call_count == 6)
+        # removed packages disappear from the index
+        shutil.rmtree(os.path.join(library, 'energy'))
+        index.invalidate()
+        assert('energy' not in index)
+        assert(mock_packinfo.call_count == 6)
+    shutil.rmtree(tmpdir)
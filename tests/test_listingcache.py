@@ -0,0 +1,83 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import time
+import pickle
+import shutil
+import tempfile
+
+from rpackutils.listingcache import ListingCache
+
+KEY = 'https://artifactory/artifactory/R-local'
+ENTRIES = [{'uri': 'A_1.0.tar.gz', 'size': 10, 'sha1': 'abc'}]
+
+
+def test_memory():
+    cache = ListingCache()
+    assert(cache.get(KEY) is None)
+    cache.put(KEY, ENTRIES)
+    assert(cache.get(KEY) == ENTRIES)
+    cache.invalidate(KEY)
+    assert(cache.get(KEY) is None)
+    cache.put(KEY, ENTRIES)
+    cache.invalidate()
+    assert(cache.get(KEY) is None)
+    # copies sent to worker processes keep the listings
+    cache.put(KEY, ENTRIES)
+    assert(pickle.loads(pickle.dumps(cache)).get(KEY) == ENTRIES)
+
+
+def test_disk():
+    cachedir = tempfile.mkdtemp()
+    ListingCache(cachedir).put(KEY, ENTRIES)
+    # another run reads the listing from the disk
+    cache = ListingCache(cachedir, ttl=60)
+    assert(cache.get(KEY) == ENTRIES)
+    assert(cache.get(KEY + '2') is None)
+    # expired listings are ignored
+    cachefilepath = cache._cachefilepath(KEY)
+    past = time.time() - 120
+    os.utime(cachefilepath, (past, past))
+    assert(ListingCache(cachedir, ttl=60).get(KEY) is None)
+    # invalidation removes the file
+    cache.invalidate(KEY)
+    assert(not os.path.exists(cachefilepath))
+    shutil.rmtree(cachedir)
+
+
+def test_update():
+    cachedir = tempfile.mkdtemp()
+    cache = ListingCache(cachedir)
+    cache.put(KEY, ENTRIES)
+    listing = cache.get(KEY)
+    cache.update(KEY, {'uri': 'B_1.0.tar.gz', 'size': 5, 'sha1': 'def'})
+    cache.update(KEY, {'uri': 'A_1.0.tar.gz', 'size': 12, 'sha1': 'ghi'})
+    assert([(x['uri'], x['sha1']) for x in cache.get(KEY)]
+           == [('A_1.0.tar.gz', 'ghi'), ('B_1.0.tar.gz', 'def')])
+    # the listing is updated in place, not copied
+    assert(cache.get(KEY) is listing)
+    # the listing given to put() is left untouched
+    assert(ENTRIES == [{'uri': 'A_1.0.tar.gz', 'size': 10, 'sha1': 'abc'}])
+    # the listing stored on disk is outdated
+    assert(not os.path.exists(cache._cachefilepath(KEY)))
+    shutil.rmtree(cachedir)
+
+
+def test_entry():
+    cache = ListingCache()
+    assert(cache.entry(KEY, 'A_1.0.tar.gz') is None)
+    cache.put(KEY, ENTRIES + [{'uri': 'B_1.0.tar.gz', 'sha1': 'def'}])
+    assert(cache.entry(KEY, 'A_1.0.tar.gz') == ENTRIES[0])
+    assert(cache.entry(KEY, 'B_1.0.tar.gz')['sha1'] == 'def')
+    assert(cache.entry(KEY, 'C_1.0.tar.gz') is None)
+    # the index follows the updates of the listing
+    cache.update(KEY, {'uri': 'C_1.0.tar.gz', 'sha1': 'ghi'})
+    cache.update(KEY, {'uri': 'A_1.0.tar.gz', 'sha1': 'jkl'})
+    assert(cache.entry(KEY, 'C_1.0.tar.gz')['sha1'] == 'ghi')
+    assert(cache.entry(KEY, 'A_1.0.tar.gz')['sha1'] == 'jkl')
+    # and is dropped with it
+    cache.invalidate(KEY)
+    assert(cache.entry(KEY, 'A_1.0.tar.gz') is None)
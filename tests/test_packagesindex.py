@@ -0,0 +1,58 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import gzip
+
+from rpackutils.packagesindex import PackagesIndex
+from rpackutils.packinfo import PackStatus
+
+PACKAGES = """Package: abc
+Version: 2.1
+Depends: R (>= 2.10), abc.data, nnet,
+        quantreg
+Imports: stats
+LinkingTo: Rcpp
+License: GPL (>= 3)
+MD5sum: c9fffe4334c178917f762735aba59653
+NeedsCompilation: no
+
+
+Package: abc.data
+Version: 1.0
+License: GPL (>= 3)
+"""
+
+
+def test_parse():
+    records = PackagesIndex.parse(PACKAGES)
+    assert(len(records) == 2)
+    assert(records[0]['Depends'] ==
+           'R (>= 2.10), abc.data, nnet, quantreg')
+    # the fields not needed are dropped
+    assert('NeedsCompilation' not in records[0])
+    assert(records[1] == {'Package': 'abc.data', 'Version': '1.0',
+                          'License': 'GPL (>= 3)'})
+
+
+def test_index():
+    index = PackagesIndex.fromcontent(gzip.compress(PACKAGES.encode()))
+    assert(len(index) == 2)
+    assert('abc' in index)
+    assert('zzz' not in index)
+    assert(index.tarballs == ['abc_2.1.tar.gz', 'abc.data_1.0.tar.gz'])
+    assert(index.md5sum('abc') == 'c9fffe4334c178917f762735aba59653')
+    assert(index.md5sum('abc.data') is None)
+    packinfo = index.packinfo('abc')
+    assert(packinfo.name == 'abc')
+    assert(packinfo.version == '2.1')
+    assert(packinfo.imports == ['stats'])
+    assert(packinfo.linkingto == ['Rcpp'])
+    # the base and recommended packages are skipped
+    assert(packinfo.dependencies() == ['abc.data', 'quantreg', 'Rcpp'])
+    assert(packinfo.status == PackStatus.PARSED)
+    assert(index.packinfo('zzz') is None)
+    # the plain PACKAGES file
+    assert(PackagesIndex.fromcontent(PACKAGES.encode()).names() ==
+           ['abc', 'abc.data'])
@@ -165,3 +165,26 @@ def test__parse_linkingto():
     assert(pi.suggests == ['testthat'])
     assert(pi.linkingto == ['plogr', 'Rcpp'])
     assert(pi.license == 'MIT + file LICENSE')
+
+
+def test_properties():
+    tarballpath = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)),
+        'resources/FooBar_0.99.1.tar.gz')
+    pi = PackInfo(tarballpath)
+    properties = pi.properties
+    assert(properties == {'r.name': ['FooBar'],
+                          'r.version': ['0.99.1'],
+                          'r.depends': ['R'],
+                          'r.imports': ['methods', 'utils'],
+                          'r.suggests': ['Rtoto', 'Rtiti'],
+                          'r.license': ['GPL-2']})
+    pi2 = PackInfo.fromproperties(properties)
+    assert(pi2.status == PackStatus.PARSED)
+    for attribute in ['name', 'version', 'depends', 'imports', 'suggests',
+                      'linkingto', 'license', 'licenseclass']:
+        assert(getattr(pi2, attribute) == getattr(pi, attribute))
+    # incomplete properties
+    del properties['r.version']
+    assert(PackInfo.fromproperties(properties) is None)
+    assert(PackInfo.fromproperties({}) is None)
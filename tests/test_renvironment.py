@@ -15,6 +15,7 @@ from unittest.mock import patch
 from rpackutils.packinfo import PackInfo
 from rpackutils.packinfo import PackStatus
 from rpackutils.providers.renvironment import REnvironment
+from rpackutils.depsmanager import PackNode
 from rpackutils.utils import Utils
 
 RHOME = os.path.join(
@@ -93,6 +94,22 @@ def test_ls():
     assert('evaluate' in packagenames)
     assert('faraway' in packagenames)
     assert('fastcluster' in packagenames)
+    packinfos = renv.ls(packagenamesonly=False)
+    assert([x.name for x in packinfos] == packagenames)
+    assert(packinfos[0].version == '1.6.2')
+
+
+def test_ls_after_install():
+    tmpdir, renv = create_renv_copy()
+    assert('FooBar' not in renv.ls())
+    with patch('rpackutils.providers.renvironment.REnvironment'
+               '._installpackage') as mock_installpackage:
+        mock_installpackage.side_effect = fake_installpackage('0.99.1')
+        renv.upload_single(RPACKAGE)
+    assert('FooBar' in renv.ls())
+    assert(renv.index.version('FooBar') == '0.99.1')
+    assert(renv.packinfo('FooBar').status == PackStatus.DOWNLOADED)
+    shutil.rmtree(tmpdir)
 
 
 def test_download_single():
@@ -105,27 +122,179 @@ def test_download_single():
         pass
 
 
+def create_renv_copy():
+    """
+    Copy the fake R environment to a temp folder so that
+    packages can be installed there.
+    """
+    tmpdir = tempfile.mkdtemp()
+    rhome = os.path.join(tmpdir, 'R-fake-env')
+    shutil.copytree(RHOME, rhome)
+    return tmpdir, REnvironment(rhome, LIBRARYPATH)
+
+
+def fake_installpackage(version):
+    """
+    Simulate R CMD INSTALL by writing a DESCRIPTION file in the library.
+    """
+    def installpackage(packagepath, library=None, concurrency=1):
+        packagefolder = os.path.join(library, 'FooBar')
+        os.makedirs(packagefolder)
+        with open(os.path.join(packagefolder, 'DESCRIPTION'), 'w') as f:
+            f.write('Package: FooBar\nVersion: {}\nLicense: MIT\n'
+                    .format(version))
+        return (0, "Ok", None)
+    return installpackage
+
+
+def read_version(renv):
+    packinfo = PackInfo(os.path.join(renv._repofullpath, 'FooBar'))
+    return packinfo.version
+
+
 @patch('rpackutils.providers.renvironment.REnvironment._installpackage')
 def test_upload_single(mock_installpackage):
-    renv = REnvironment(RHOME, LIBRARYPATH)
+    tmpdir, renv = create_renv_copy()
     # none existing package
     status = renv.upload_single(
         '/none/existent/path/to/some/none/existent/package.tar.gz')
     assert(status == PackStatus.DEPLOY_FAILED)
     # existing package
-    mock_installpackage.return_value = (0, "Ok", None)
+    mock_installpackage.side_effect = fake_installpackage('0.99.1')
     status = renv.upload_single(RPACKAGE)
     assert(status == PackStatus.DEPLOYED)
+    assert(read_version(renv) == '0.99.1')
     # set the unused argument
     status = renv.upload_single(RPACKAGE, repo='fakerepo')
     assert(status == PackStatus.DEPLOYED)
     # overwrite
+    mock_installpackage.side_effect = fake_installpackage('0.99.2')
     status = renv.upload_single(RPACKAGE, overwrite=True)
     assert(status == PackStatus.DEPLOYED)
+    assert(read_version(renv) == '0.99.2')
     # failed installation, return code 1
+    mock_installpackage.side_effect = None
     mock_installpackage.return_value = (1, "not Ok", "Could not install")
-    status = renv.upload_single(RPACKAGE)
+    status = renv.upload_single(RPACKAGE, overwrite=True)
     assert(status == PackStatus.DEPLOY_FAILED)
+    # the previous version is still installed
+    assert(read_version(renv) == '0.99.2')
+    # no staging library left behind
+    assert(renv.ls(withBasePackages=True).count('FooBar') == 1)
+    assert(not glob.glob(os.path.join(renv._repofullpath, '.rpackutils*')))
+    shutil.rmtree(tmpdir)
+
+
+@patch('rpackutils.providers.renvironment.REnvironment._installpackage')
+def test_upload_single_staging(mock_installpackage):
+    tmpdir, renv = create_renv_copy()
+    mock_installpackage.side_effect = fake_installpackage('0.99.1')
+    renv.upload_single(RPACKAGE, concurrency=3)
+    args, kwargs = mock_installpackage.call_args
+    # installed in a staging library within the target library
+    assert(os.path.dirname(args[1]) == renv._repofullpath)
+    assert(os.path.basename(args[1]).startswith('.rpackutils_staging_'))
+    assert(args[2] == 3)
+    shutil.rmtree(tmpdir)
+
+
+def test_install_env_rlibs():
+    renv = REnvironment(RHOME, LIBRARYPATH)
+    env = renv._install_env()
+    assert(env['R_LIBS'].split(os.pathsep)[0] == renv._repofullpath)
+
+
+def create_packnode(name, dependencies):
+    packnode = PackNode(name)
+    packnode.packagepath = '/path/to/{}_1.0.tar.gz'.format(name)
+    packnode.dependencies = dependencies
+    return packnode
+
+
+@patch('rpackutils.providers.renvironment.REnvironment.install')
+def test_install_multiple(mock_install):
+    renv = REnvironment(RHOME, LIBRARYPATH)
+    installed = []
+
+    def install(packnode, overwrite=False, overwritepackages=None,
+                concurrency=1):
+        # all dependencies must be installed before
+        for dep in packnode.dependencies:
+            if dep in ['A', 'B', 'C', 'D', 'E']:
+                assert(dep in installed)
+        installed.append(packnode.idt)
+        if packnode.idt == 'C':
+            return PackStatus.DEPLOY_FAILED
+        return PackStatus.DEPLOYED
+
+    mock_install.side_effect = install
+    # A <- B <- D, C <- E, 'boot' is not part of the installation
+    packnodes = [create_packnode('A', ['boot']),
+                 create_packnode('B', ['A']),
+                 create_packnode('C', []),
+                 create_packnode('D', ['B', 'A']),
+                 create_packnode('E', ['C'])]
+    retVals = renv.install_multiple(packnodes, procs=3)
+    assert(retVals == [PackStatus.DEPLOYED,
+                       PackStatus.DEPLOYED,
+                       PackStatus.DEPLOY_FAILED,
+                       PackStatus.DEPLOYED,
+                       PackStatus.DEPLOY_FAILED])
+    # E is not installed since C failed
+    assert(sorted(installed) == ['A', 'B', 'C', 'D'])
+    args, kwargs = mock_install.call_args
+    assert(kwargs['concurrency'] == 3)
+
+
+def test_upload_single_dryrun_makefile():
+    renv = REnvironment(RHOME, LIBRARYPATH)
+    dest = tempfile.mkdtemp()
+    status = renv.upload_single_dryrun(RPACKAGE, dest,
+                                       outputformat='makefile',
+                                       dependencies=['methods'])
+    assert(status == PackStatus.DEPLOYED)
+    assert(os.path.exists(os.path.join(dest, 'FooBar_0.99.1.tar.gz')))
+    assert(not os.path.exists(os.path.join(dest, 'install.sh')))
+    with open(os.path.join(dest, 'Makefile')) as f:
+        makefile = f.read()
+    assert('R := {}'.format(renv._Rbinarypath) in makefile)
+    # no rule for dependencies which are not part of the plan
+    assert('\nFooBar.installed:\n' in makefile)
+    assert('\t$(R) CMD INSTALL {} --library=$(LIBRARY)'
+           .format(os.path.join(dest, 'FooBar_0.99.1.tar.gz')) in makefile)
+    shutil.rmtree(dest)
+
+
+def test_write_makefile_rule():
+    renv = REnvironment(RHOME, LIBRARYPATH)
+    dest = tempfile.mkdtemp()
+    renv._write_makefile_rule(dest, 'A', '/tmp/A_1.0.tar.gz', [])
+    # the Makefile is parsed once, then the targets are kept in memory
+    with patch('rpackutils.providers.renvironment.REnvironment.'
+               '_makefile_targets') as mock_targets:
+        renv._write_makefile_rule(dest, 'B', '/tmp/B_1.0.tar.gz',
+                                  ['A', 'utils'])
+        renv._write_makefile_rule(dest, 'C', '/tmp/C_1.0.tar.gz', ['A', 'B'])
+        # a package is only planned once
+        renv._write_makefile_rule(dest, 'B', '/tmp/B_1.0.tar.gz', ['A'])
+        assert(mock_targets.call_count == 0)
+    makefilepath = os.path.join(dest, 'Makefile')
+    assert(REnvironment._makefile_targets(makefilepath) == {'A', 'B', 'C'})
+    with open(makefilepath) as f:
+        lines = f.read().splitlines()
+    assert(lines.count('.PHONY: all') == 1)
+    assert(lines.count('B.installed: A.installed') == 1)
+    assert('C.installed: A.installed B.installed' in lines)
+    assert('A.installed:' in lines)
+    # another run appending to the same Makefile reads its targets
+    renv = REnvironment(RHOME, LIBRARYPATH)
+    renv._write_makefile_rule(dest, 'A', '/tmp/A_1.0.tar.gz', [])
+    renv._write_makefile_rule(dest, 'D', '/tmp/D_1.0.tar.gz', ['C'])
+    with open(makefilepath) as f:
+        lines = f.read().splitlines()
+    assert(lines.count('A.installed:') == 1)
+    assert('D.installed: C.installed' in lines)
+    shutil.rmtree(dest)
 
 
 def test_checkInstallationSuccess():
@@ -168,3 +337,55 @@ def test_packinfo():
                     'must raise an exception!')
     except Exception:
         pass
+
+
+@patch('rpackutils.providers.renvironment.Command')
+def test_installpackage(mock_command):
+    logdir = tempfile.mkdtemp()
+    renv = REnvironment(RHOME, LIBRARYPATH, installtimeout=120,
+                        logdir=logdir)
+    mock_command.return_value.run.return_value = (0, "Ok", None)
+    (res, out, err) = renv._installpackage(RPACKAGE)
+    assert(res == 0)
+    args, kwargs = mock_command.call_args
+    assert(args[0][1:3] == ['CMD', 'INSTALL'])
+    assert(kwargs['logfile'] == os.path.join(logdir, 'FooBar_0.99.1.log'))
+    assert('Execution halted' in kwargs['markers'])
+    mock_command.return_value.run.assert_called_with(120)
+    shutil.rmtree(logdir)
+
+
+@patch('rpackutils.utils.Utils.available_cpus')
+def test_cores_per_install(mock_available_cpus):
+    mock_available_cpus.return_value = 16
+    renv = REnvironment(RHOME, LIBRARYPATH)
+    assert(renv.cores_per_install() == 16)
+    assert(renv.cores_per_install(4) == 4)
+    assert(renv.cores_per_install(5) == 3)
+    assert(renv.cores_per_install(32) == 1)
+    # a fixed number of cores
+    renv = REnvironment(RHOME, LIBRARYPATH, ncpus=2)
+    assert(renv.cores_per_install(4) == 2)
+
+
+@patch('rpackutils.utils.Utils.available_cpus')
+def test_install_env(mock_available_cpus):
+    mock_available_cpus.return_value = 8
+    renv = REnvironment(RHOME, LIBRARYPATH)
+    env = renv._install_env(2)
+    assert(env['MAKEFLAGS'] == '-j4')
+    assert(env['OMP_NUM_THREADS'] == '4')
+    renv = REnvironment(RHOME, LIBRARYPATH, makeflags='--output-sync')
+    assert(renv._install_env()['MAKEFLAGS'] == '-j8 --output-sync')
+    # -j given by the user wins
+    renv = REnvironment(RHOME, LIBRARYPATH, makeflags='-j3')
+    assert(renv._install_env()['MAKEFLAGS'] == '-j3')
+
+
+@patch.dict(os.environ, {'SLURM_CPUS_PER_TASK': '6'})
+def test_available_cpus_scheduler():
+    assert(Utils.available_cpus() == 6)
+
+
+def test_available_cpus():
+    assert(Utils.available_cpus() >= 1)
@@ -76,6 +76,10 @@ def test_reposconfig_creation(mock_cran, mock_bioc, mock_arti, mock_exists):
     assert('Bioc-3.0' in artifactory.repos)
     assert('R-local' in artifactory.repos)
     assert('R-Data-0.1' in artifactory.repos)
+    assert(artifactory.poolsize == 10)
+    assert(artifactory._http.retries == 3)
+    assert(artifactory._listingcache.cachedir is None)
+    assert(artifactory.aql_enabled)
     # verify artifactorydev instance
     artifactorydev = reposconfig.artifactory_instance('artifactorydev')
     assert(artifactorydev.baseurl
@@ -88,22 +92,55 @@ def test_reposconfig_creation(mock_cran, mock_bioc, mock_arti, mock_exists):
     assert('Bioc-3.0' in artifactorydev.repos)
     assert('R-local' in artifactorydev.repos)
     assert('R-Data-0.1' in artifactorydev.repos)
+    assert(artifactorydev.poolsize == 20)
+    assert(artifactorydev._http.timeout == 60)
+    assert(artifactorydev._http.retries == 5)
+    assert(artifactorydev._http.backoff == 2)
+    assert(artifactorydev._listingcache.cachedir
+           == '/home/john/.cache/rpackutils')
+    assert(artifactorydev._listingcache.ttl == 3600)
+    assert(not artifactorydev.aql_enabled)
     # verify R-3.1.2
     r312 = reposconfig.renvironment_instance('R-3.1.2')
     assert(r312.baseurl == '/home/john/opt/R-3.1.2')
     assert(len(r312.repos) == 1)
     assert('lib64/R/library' in r312.repos)
+    assert(r312._installtimeout == 3600)
+    assert(r312._logdir is None)
+    assert(r312._ncpus is None)
+    assert(r312._makeflags is None)
+    # verify R-3.2.2
+    r322 = reposconfig.renvironment_instance('R-3.2.2')
+    assert(r322._ncpus == 4)
+    assert(r322._makeflags == '--output-sync=target')
     # verify R.3.2.5
     r325 = reposconfig.renvironment_instance('R-3.2.5')
     assert(r325.baseurl == '/home/john/opt/R-3.2.5')
     assert(len(r325.repos) == 1)
     assert('lib64/R/library' in r325.repos)
+    assert(r325._installtimeout == 1800)
+    assert(r325._logdir == '/home/john/RPackUtils/logs')
     # verify local
     local = reposconfig.local_instance('local')
     assert(local.baseurl == '/home/john/RPackUtils/repository')
     assert(len(local.repos) == 2)
     assert('local1' in local.repos)
     assert('local2' in local.repos)
+    # verify the CRAN-like repositories
+    assert(len(reposconfig.cranlike_instances) == 2)
+    ppm = reposconfig.cranlike_instance('ppm')
+    assert(ppm.repos == ['2023-01-03', 'latest'])
+    assert(ppm.contrib_url('latest') ==
+           'https://packagemanager.posit.co/cran/latest/src/contrib/')
+    assert(ppm.verify is True)
+    assert(ppm._listingcache.cachedir == '/home/john/.cache/rpackutils')
+    assert(ppm._listingcache.ttl == 86400)
+    cranmirror = reposconfig.cranlike_instance('cranmirror')
+    assert(cranmirror.repos == [])
+    assert(cranmirror.contrib_url() ==
+           'https://cran.example.org/src/contrib/')
+    assert(cranmirror.verify is False)
+    assert(cranmirror.poolsize == 20)
 
 
 @patch('os.path.exists')
@@ -134,6 +171,7 @@ def test_reposconfig_instance(mock_cran, mock_bioc, mock_arti, mock_exists):
     assert(reposconfig.instance('R-3.2.5').name == 'R-3.2.5')
     assert(reposconfig.instance('local') is not None)
     assert(reposconfig.instance('local').name == 'local')
+    assert(reposconfig.instance('ppm').name == 'ppm')
     # none existing repo
     assert(reposconfig.instance('thisreponamedoesnotexist') is None)
 
@@ -0,0 +1,42 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import shutil
+import tempfile
+
+from rpackutils.snapshotdb import SnapshotDB
+
+
+def test_snapshotdb():
+    tmpdir = tempfile.mkdtemp()
+    dbfilepath = os.path.join(tmpdir, 'db', 'snapshots.db')
+    db = SnapshotDB(dbfilepath)
+    assert(len(db) == 0)
+    assert(db.versions() == {})
+    db.record({'2014-08-18_0233': '3.1.1',
+               '2015-03-10': '3.1.3',
+               '2015-03-11': '3.1.3',
+               '2016-11-01': '3.3.2'})
+    assert(db.dates() == set(['2014-08-18_0233', '2015-03-10',
+                              '2015-03-11', '2016-11-01']))
+    assert(db.versions() == {'3.1.1': ['2014-08-18_0233'],
+                             '3.1.3': ['2015-03-10', '2015-03-11'],
+                             '3.3.2': ['2016-11-01']})
+    assert(db.versions('3.1.3') == {'3.1.3': ['2015-03-10', '2015-03-11']})
+    assert(db.versions('9.9.9') == {})
+    assert(db.versions(fromdate='2015-03-11') ==
+           {'3.1.3': ['2015-03-11'], '3.3.2': ['2016-11-01']})
+    # the end of the range is inclusive, whatever the time
+    assert(db.versions(fromdate='2014-08-18', todate='2014-08-18') ==
+           {'3.1.1': ['2014-08-18_0233']})
+    assert(db.versions('3.1.3', '2015-01-01', '2015-03-10') ==
+           {'3.1.3': ['2015-03-10']})
+    db.close()
+    # the records are kept by the next run
+    db = SnapshotDB(dbfilepath)
+    assert(len(db) == 4)
+    db.close()
+    shutil.rmtree(tmpdir)
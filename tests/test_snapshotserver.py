@@ -0,0 +1,121 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from rpackutils.packinfo import PackStatus
+from rpackutils.providers.cran import CRAN
+from tests.snapshotserver import SnapshotServer
+
+
+PACKAGES = [
+    {'Package': 'A3', 'Version': '1.0.0',
+     'Depends': 'R (>= 2.15.0), xtable, pbapply',
+     'License': 'GPL (>= 2)'},
+    {'Package': 'abc', 'Version': '2.1',
+     'Depends': 'R (>= 2.10), abc.data, nnet, quantreg, MASS, locfit',
+     'License': 'GPL (>= 3)'},
+    {'Package': 'abc.data', 'Version': '1.0',
+     'License': 'GPL (>= 3)'},
+]
+
+
+def create_fixtures():
+    root = tempfile.mkdtemp()
+    SnapshotServer.add_snapshot(root, '2018-02-27', '3.4.3', PACKAGES)
+    SnapshotServer.add_snapshot(root, '2018-02-28', '3.4.3', PACKAGES[1:])
+    SnapshotServer.add_snapshot(root, '2018-04-23', '3.4.4', PACKAGES)
+    return root
+
+
+def test_snapshotserver():
+    root = create_fixtures()
+    dest = tempfile.mkdtemp()
+    with SnapshotServer(root) as server:
+        for usepackagesindex in [True, False]:
+            mran = CRAN(baseurl=server.baseurl, cachedir=None,
+                        usepackagesindex=usepackagesindex)
+            assert(sorted(mran.ls('2018-02-27')) == ['A3_1.0.0.tar.gz',
+                                                     'abc.data_1.0.tar.gz',
+                                                     'abc_2.1.tar.gz'])
+            assert(sorted(mran.find('abc*', '2018-02-28')) ==
+                   ['abc.data_1.0.tar.gz', 'abc_2.1.tar.gz'])
+            assert(mran.find('A3_*.tar.gz', '2018-02-28') == [])
+            packinfo = mran.packinfo('abc', '2018-02-27')
+            assert(packinfo.version == '2.1')
+            assert(packinfo.license == 'GPL (>= 3)')
+            assert('abc.data' in packinfo.depends)
+            retVals = mran.download_multiple('2018-02-27', ['A3', 'abc'],
+                                             dest, procs=2)
+            assert(retVals == [PackStatus.DOWNLOADED] * 2)
+            assert(sorted(os.listdir(dest)) == ['A3_1.0.0.tar.gz',
+                                                'abc_2.1.tar.gz'])
+            assert(mran.download_single('2018-02-27', 'zzz', dest) ==
+                   PackStatus.DOWNLOAD_FAILED)
+            for filename in os.listdir(dest):
+                os.remove(os.path.join(dest, filename))
+        # nothing is cached on disk unless asked for
+        mran = CRAN(baseurl=server.baseurl, timeout=30)
+        assert(mran._listingcache.cachedir is None)
+        # the requests go through the pooled session, with a timeout
+        assert(mran._http.timeout == 30)
+        assert(mran.ls_snapshots(procs=2) ==
+               {'3.4.3': ['2018-02-27', '2018-02-28'],
+                '3.4.4': ['2018-04-23']})
+        assert(mran.bisect_snapshots('3.4.4') == {'3.4.4': ['2018-04-23']})
+        assert(mran.delta('2018-02-28', '2018-04-23') ==
+               (['A3_1.0.0.tar.gz'], []))
+    shutil.rmtree(dest)
+    shutil.rmtree(root)
+
+
+def test_download_tarballs_fetches_index_once():
+    root = tempfile.mkdtemp()
+    packages = [{'Package': 'pkg{0}'.format(i), 'Version': '1.0',
+                 'License': 'GPL-2'} for i in range(30)]
+    SnapshotServer.add_snapshot(root, '2018-02-27', '3.4.3', packages)
+    dest = tempfile.mkdtemp()
+    tarballs = ['{0}_{1}.tar.gz'.format(x['Package'], x['Version'])
+                for x in packages]
+    with SnapshotServer(root) as server:
+        mran = CRAN(baseurl=server.baseurl, cachedir=None)
+        with patch.object(CRAN, '_fetch_packages_index', autospec=True,
+                          side_effect=CRAN._fetch_packages_index) as fetch:
+            retVals = mran.download_tarballs('2018-02-27', tarballs,
+                                             dest, procs=20)
+        assert(retVals == [PackStatus.DOWNLOADED] * 30)
+        assert(fetch.call_count == 1)
+    assert(sorted(os.listdir(dest)) == sorted(tarballs))
+    shutil.rmtree(dest)
+    shutil.rmtree(root)
+
+
+def test_stop_not_started():
+    root = tempfile.mkdtemp()
+    SnapshotServer(root).stop()
+    shutil.rmtree(root)
+
+
+def test_download_server_down():
+    root = create_fixtures()
+    dest = tempfile.mkdtemp()
+    with SnapshotServer(root) as server:
+        mran = CRAN(baseurl=server.baseurl, cachedir=None)
+        mran.ls('2018-02-27')
+        # the circuit breaker is open: each package fails on its own
+        with patch.object(CRAN, '_ensure_connection',
+                          side_effect=FileNotFoundError(server.baseurl)):
+            retVals = mran.download_tarballs(
+                '2018-02-27', ['A3_1.0.0.tar.gz', 'abc_2.1.tar.gz'], dest)
+            assert(retVals == [PackStatus.DOWNLOAD_FAILED] * 2)
+            retVals = mran.download_multiple('2018-02-27', ['A3', 'abc'],
+                                             dest)
+            assert(retVals == [PackStatus.DOWNLOAD_FAILED] * 2)
+    assert(os.listdir(dest) == [])
+    shutil.rmtree(dest)
+    shutil.rmtree(root)
@@ -0,0 +1,102 @@
+#######################################
+# Copyright 2019 PMP SA.              #
+# SPDX-License-Identifier: Apache-2.0 #
+#######################################
+
+import io
+import time
+import threading
+
+from rpackutils import transfer
+from rpackutils.transfer import BandwidthLimiter
+from rpackutils.transfer import TransferEngine
+
+
+def test_run():
+    engine = TransferEngine(workers=4)
+    done = []
+    results = engine.run(lambda x, y: x * y,
+                         [(i, 2) for i in range(0, 20)],
+                         callback=lambda i, result: done.append(i))
+    # the results keep the order of the arguments
+    assert(results == [i * 2 for i in range(0, 20)])
+    assert(sorted(done) == list(range(0, 20)))
+    assert(engine.run(lambda x: x, []) == [])
+
+
+def test_shared_pool():
+    engine = TransferEngine(workers=4)
+    lock = threading.Lock()
+    counts = {'running': 0, 'peak': 0}
+
+    def task(x):
+        with lock:
+            counts['running'] += 1
+            counts['peak'] = max(counts['peak'], counts['running'])
+        time.sleep(0.02)
+        with lock:
+            counts['running'] -= 1
+        return x
+
+    # a single call runs at most its number of workers at once
+    assert(engine.run(task, [(i,) for i in range(0, 10)], workers=2)
+           == list(range(0, 10)))
+    assert(counts['peak'] == 2)
+    # concurrent calls share the threads of the engine
+    counts['peak'] = 0
+    callers = [threading.Thread(
+        target=engine.run,
+        args=(task, [(i,) for i in range(0, 8)]))
+        for _ in range(0, 3)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    assert(counts['peak'] == 4)
+    executor = engine._executor
+    engine.run(task, [(1,)])
+    assert(engine._executor is executor)
+    # a transfer running transfers of its own does not dead lock
+    assert(engine.run(lambda x: engine.run(task, [(x,), (x,)]),
+                      [(i,) for i in range(0, 8)])
+           == [[i, i] for i in range(0, 8)])
+    engine.shutdown()
+    assert(engine._executor is None)
+
+
+def test_host_limit():
+    engine = TransferEngine(workers=8, hostlimit=2)
+    lock = threading.Lock()
+    running = {'a': 0, 'b': 0}
+    peaks = {'a': 0, 'b': 0}
+
+    def task(host):
+        with lock:
+            running[host] += 1
+            peaks[host] = max(peaks[host], running[host])
+        time.sleep(0.02)
+        with lock:
+            running[host] -= 1
+
+    hosts = ['a', 'b'] * 8
+    engine.run(task, [(h,) for h in hosts], hosts=hosts)
+    assert(peaks == {'a': 2, 'b': 2})
+    assert(TransferEngine.host('https://cran.r-project.org/src/contrib/')
+           == 'cran.r-project.org')
+
+
+def test_bandwidth():
+    limiter = BandwidthLimiter(1000)
+    start = time.monotonic()
+    # the first second worth of bytes goes through at once
+    limiter.consume(1000)
+    limiter.consume(200)
+    assert(time.monotonic() - start >= 0.15)
+    # the limit applies to the transfers run by the engine only
+    engine = TransferEngine(workers=2, bandwidth=1000)
+    assert(engine.bandwidth == 1000)
+    f = io.BytesIO(b'x' * 10)
+    assert(transfer.throttled(f, 10) is f)
+    readers = engine.run(transfer.throttled, [(f, 10)])
+    assert(len(readers[0]) == 10)
+    assert(readers[0].read() == b'x' * 10)